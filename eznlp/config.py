@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 from typing import List, Mapping
 from collections import OrderedDict
+import itertools
 import logging
 import torch
 
 logger = logging.getLogger(__name__)
 
+# The global counter of config versions, so that a version is never reused (unlike `id`)
+_version_counter = itertools.count(1)
+
 
 def _add_indents(config_str: str, num_spaces: int=2):
     lines = config_str.split('\n')
@@ -26,6 +30,8 @@ class Config(object):
     """
     
     _name_sep = '-'
+    # The latest version of all configs
+    _latest_version = 0
     
     def __init__(self, **kwargs):
         if len(kwargs) > 0:
@@ -34,6 +40,32 @@ class Config(object):
             for key, attr in kwargs.items():
                 setattr(self, key, attr)
                 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if not name.startswith('_'):
+            self._bump_version()
+        
+    def _bump_version(self):
+        version = next(_version_counter)
+        super().__setattr__('_version', version)
+        Config._latest_version = version
+        
+    def _sub_configs(self):
+        for attr in self.__dict__.values():
+            if isinstance(attr, Config):
+                yield attr
+            elif isinstance(attr, (list, tuple)):
+                yield from (x for x in attr if isinstance(x, Config))
+            elif isinstance(attr, dict):
+                yield from (x for x in attr.values() if isinstance(x, Config))
+        
+    @property
+    def version(self):
+        """The latest version of this config and its sub-configs, which increases once any (nested) attribute is 
+        re-assigned (e.g., a vocabulary is re-built). Derived states (e.g., cached examples) can be checked against it. 
+        """
+        return max([self.__dict__.get('_version', 0)] + [c.version for c in self._sub_configs()])
+        
     @property
     def valid(self):
         for name, attr in self.__dict__.items():
@@ -52,13 +84,13 @@ class Config(object):
         
     def _repr_non_config_attrs(self, attr_dict: dict):
         main_str = self.__class__.__name__ + '('
-        main_str += ', '.join(f"{key}={attr}" for key, attr in attr_dict.items())
+        main_str += ', '.join(f"{key}={attr}" for key, attr in attr_dict.items() if not str(key).startswith('_'))
         main_str += ')'
         return main_str
         
     def _repr_config_attrs(self, attr_dict: dict):
         main_str = self.__class__.__name__ + '(\n'
-        main_str += '\n'.join(f"  ({key}): {_add_indents(repr(attr))}" for key, attr in attr_dict.items())
+        main_str += '\n'.join(f"  ({key}): {_add_indents(repr(attr))}" for key, attr in attr_dict.items() if not str(key).startswith('_'))
         main_str += '\n)'
         return main_str
         
@@ -97,10 +129,12 @@ class ConfigList(Config):
     def __setitem__(self, i, c: Config):
         assert isinstance(c, Config)
         self.config_list[i] = c
+        self._bump_version()
     
     def append(self, c: Config):
         assert isinstance(c, Config)
         self.config_list.append(c)
+        self._bump_version()
     
     @property
     def out_dim(self):
@@ -152,6 +186,7 @@ class ConfigDict(Config):
     def __setitem__(self, key, c: Config):
         assert isinstance(c, Config)
         self.config_dict[key] = c
+        self._bump_version()
     
     @property
     def out_dim(self):
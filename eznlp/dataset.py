@@ -1,16 +1,42 @@
 # -*- coding: utf-8 -*-
-from typing import List, Any
+from typing import List, Any, Callable, Iterable
+from collections import OrderedDict
+import sys
+import itertools
 import random
+import numpy
 import torch
 
+from .utils import map_in_forked_workers
 from .nn.functional import seq_lens2mask
 from .wrapper import Batch
+from .config import Config
 from .model.model import ModelConfigBase
 from .plm import PreTrainingConfig
 
 
+def _nbytes(obj, depth: int=0):
+    """Roughly estimate the memory usage of an example. 
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.element_size() * obj.nelement() + sys.getsizeof(obj)
+    elif isinstance(obj, numpy.ndarray):
+        return obj.nbytes + sys.getsizeof(obj)
+    elif depth >= 10:
+        return sys.getsizeof(obj)
+    elif isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_nbytes(x, depth+1) for x in obj)
+    elif isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(_nbytes(x, depth+1) for x in obj.values())
+    elif hasattr(obj, '__dict__'):
+        return sys.getsizeof(obj) + _nbytes(obj.__dict__, depth+1)
+    else:
+        return sys.getsizeof(obj)
+
+
+
 class Dataset(torch.utils.data.Dataset):
-    def __init__(self, data: List[dict], config: ModelConfigBase, training: bool=True):
+    def __init__(self, data: List[dict], config: ModelConfigBase, training: bool=True, max_cache_bytes: int=None):
         """
         Parameters
         ----------
@@ -21,11 +47,25 @@ class Dataset(torch.utils.data.Dataset):
                   (2) each `chunk` follows the format of (chunk_type, chunk_start, chunk_end). 
                   (3) each `relation` follows the format of (relation_type, head_chunk, tail_chunk), 
                       i.e., (relation_type, (head_type, head_start, head_end), (tail_type, tail_start, tail_end)). 
+        max_cache_bytes : int
+            If specified, the examples are cached in a LRU manner, within a memory budget of `max_cache_bytes`. 
+            Only available for `training=False`, where the examples are deterministic. The cache is invalidated 
+            if the config changes (e.g., any vocabulary is re-built). 
         """
         super().__init__()
         self.data = data
         self.config = config
         self.training = training
+        if max_cache_bytes is not None and training:
+            raise ValueError("The exemplify cache is only available for `training=False`")
+        self.max_cache_bytes = max_cache_bytes
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._precomputed = None
+        self._precomputing_done = False
+        # The config version by which the cache and precomputed parts are built
+        self._config_version = None
+        self._checked_latest_version = None
         
     def __len__(self):
         return len(self.data)
@@ -68,19 +108,110 @@ class Dataset(torch.utils.data.Dataset):
         return "\n".join(summary)
         
         
-    def build_vocabs_and_dims(self, *others):
-        self.config.build_vocabs_and_dims(self.data, *others)
+    def build_vocabs_and_dims(self, *others, **kwargs):
+        # `kwargs` (e.g., `num_workers` for counting tokens) are passed to the config
+        self.config.build_vocabs_and_dims(self.data, *others, **kwargs)
+        
+    def precompute(self):
+        """Precompute the example parts which never change over epochs (e.g., the vocabulary ids of one-hot, 
+        multi-hot and nested embedders, and the sub-token ids of BERT-like embedders with fast tokenizers), 
+        so that `__getitem__` only slices them. 
+        
+        This is invoked lazily by the first `__getitem__`, and again once the config changes (e.g., any vocabulary is 
+        re-built). With multi-process data loading, invoke it before creating the workers, so that they share the 
+        results instead of each precomputing its own copy. 
+        """
+        self._check_config()
+        self._precomputed = self.config.precompute(self.data)
+        self._precomputing_done = True
+        
+    def _maybe_precompute(self):
+        if not self._precomputing_done and self.config.valid:
+            self.precompute()
         
     def _get_entry(self, i):
-        return self.data[i]
+        """Return the index of the `i`-th example in `data` (by which the precomputed parts are indexed), and the entry. 
+        """
+        return i, self.data[i]
         
-    def __getitem__(self, i):
-        entry = self._get_entry(i)
+    def _exemplify(self, i):
+        self._maybe_precompute()
+        data_idx, entry = self._get_entry(i)
         example = {}
         if 'tokens' in self.data[0]:
             example['tokenized_text'] = entry['tokens'].text
         
-        example.update(self.config.exemplify(entry, training=self.training))
+        if self._precomputed is not None:
+            precomputed = {name: {f: values[data_idx] for f, values in name_values.items()} if isinstance(name_values, dict) else name_values[data_idx] 
+                               for name, name_values in self._precomputed.items()}
+            example.update(self.config.exemplify(entry, training=self.training, precomputed=precomputed))
+        else:
+            example.update(self.config.exemplify(entry, training=self.training))
+        return example
+        
+    def _check_config(self):
+        """Discard the cached examples and precomputed parts if the config has changed since they were built. 
+        
+        The config is walked (see `Config.version`) only if any config has changed since the last check. 
+        """
+        if Config._latest_version == self._checked_latest_version:
+            return
+        self._checked_latest_version = Config._latest_version
+        
+        config_version = self.config.version
+        if config_version != self._config_version:
+            self._config_version = config_version
+            self.clear_cache()
+            self._precomputed = None
+            self._precomputing_done = False
+        
+    def _exemplify_range(self, bounds: tuple):
+        return [self._exemplify(i) for i in range(*bounds)]
+        
+    def _add_to_cache(self, i, example):
+        nbytes = _nbytes(example)
+        if nbytes > self.max_cache_bytes:
+            return
+        # Evict the least recently used examples
+        while self._cache_bytes + nbytes > self.max_cache_bytes:
+            _, (_, evicted_nbytes) = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted_nbytes
+        self._cache[i] = (example, nbytes)
+        self._cache_bytes += nbytes
+        
+    def clear_cache(self):
+        self._cache.clear()
+        self._cache_bytes = 0
+        
+    def build_cache(self, num_workers: int=0, shard_size: int=1000):
+        """Fill the exemplify cache for all the entries (until the memory budget is reached). 
+        
+        If `num_workers` is positive, the examples are built in parallel by forked processes, which inherit the 
+        dataset instead of receiving it pickled. Build the cache before creating `DataLoader`s with worker processes, 
+        since the examples cached by the workers are discarded with them. 
+        """
+        if self.max_cache_bytes is None:
+            raise RuntimeError("The exemplify cache is disabled since `max_cache_bytes` is not specified")
+        self._check_config()
+        # Precompute before forking, so that the workers share the results
+        self._maybe_precompute()
+        
+        shards = [(start, min(start+shard_size, len(self))) for start in range(0, len(self), shard_size)]
+        for (start, end), examples in zip(shards, map_in_forked_workers(self._exemplify_range, shards, num_workers=num_workers)):
+            for i, example in zip(range(start, end), examples):
+                self._add_to_cache(i, example)
+        
+    def __getitem__(self, i):
+        self._check_config()
+        if self.max_cache_bytes is None:
+            return self._exemplify(i)
+        
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i][0]
+        
+        example = self._exemplify(i)
+        self._add_to_cache(i, example)
         return example
         
         
@@ -127,9 +258,247 @@ class GenerationDataset(Dataset):
             entry = self.data[src_idx]
             # `trg_tokens` is a cache field
             entry['trg_tokens'] = entry['full_trg_tokens'][trg_idx]
-            return entry
+            return src_idx, entry
         else:
-            return self.data[i]
+            return i, self.data[i]
+
+
+
+class StreamingData(object):
+    """A re-iterable view of lazily read entries. 
+    
+    Parameters
+    ----------
+    data_source: Callable[[], Iterable[dict]]
+        A callable returning a fresh iterator over the entries every time it is called, e.g., 
+        `functools.partial(io.iter_read, file_path)`. 
+    
+    Notes
+    -----
+    Every pass re-reads the source, so entries are never held in memory all together. 
+    Indexing is supported for compatibility (e.g., peeking the first entry), but costs a sequential scan. 
+    """
+    def __init__(self, data_source: Callable[[], Iterable[dict]]):
+        self.data_source = data_source
+    
+    def __iter__(self):
+        return iter(self.data_source())
+    
+    def __getitem__(self, i: int):
+        if i < 0:
+            raise IndexError(f"Negative index {i} is not supported for {self.__class__.__name__}")
+        try:
+            return next(itertools.islice(self, i, None))
+        except StopIteration:
+            raise IndexError(f"Index {i} out of range")
+
+
+
+class StreamingDataset(torch.utils.data.IterableDataset):
+    """An iterable-style counterpart of `Dataset`, which streams entries from the source and 
+    shuffles them within a bounded buffer. 
+    
+    Parameters
+    ----------
+    data_source: Callable[[], Iterable[dict]]
+        A callable returning a fresh iterator over the entries, e.g., `functools.partial(io.iter_read, file_path)`. 
+    buffer_size: int
+        The size of the shuffle buffer. The peak memory is bounded by `buffer_size` entries rather than the file size. 
+    shuffle: bool
+        Whether to shuffle the entries within the buffer. Defaults to `training`. 
+    seed: int
+        If specified, the shuffling in the main process is reproducible across runs (but still varies over epochs). 
+        In worker processes, the shuffling follows the worker seeds assigned by PyTorch. 
+    
+    Notes
+    -----
+    When loaded by multiple workers, the entries are sharded in a round-robin manner, so that each 
+    entry is yielded by exactly one worker. 
+    """
+    def __init__(self, data_source: Callable[[], Iterable[dict]], config: ModelConfigBase, training: bool=True, 
+                 buffer_size: int=10000, shuffle: bool=None, seed: int=None):
+        super().__init__()
+        self.data = data_source if isinstance(data_source, StreamingData) else StreamingData(data_source)
+        self.config = config
+        self.training = training
+        self.buffer_size = buffer_size
+        self.shuffle = training if shuffle is None else shuffle
+        self.seed = seed
+        self._epoch = 0
+    
+    @property
+    def summary(self):
+        num_seqs, sum_len, max_len = 0, 0, 0
+        for entry in self.data:
+            num_seqs += 1
+            if 'tokens' in entry:
+                sum_len += len(entry['tokens'])
+                max_len = max(max_len, len(entry['tokens']))
+        
+        summary = [f"The dataset consists {num_seqs:,} sequences"]
+        if max_len > 0:
+            summary.extend([f"The average `tokens` length is {sum_len/num_seqs:,.1f}", 
+                            f"The maximum `tokens` length is {max_len:,}"])
+        return "\n".join(summary)
+    
+    
+    def build_vocabs_and_dims(self, *others, **kwargs):
+        self.config.build_vocabs_and_dims(self.data, *others, **kwargs)
+    
+    def _iter_entries(self):
+        entries = iter(self.data)
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is not None and worker_info.num_workers > 1:
+            entries = itertools.islice(entries, worker_info.id, None, worker_info.num_workers)
+        
+        if not self.shuffle:
+            yield from entries
+            return
+        
+        if worker_info is not None:
+            # PyTorch re-seeds `random` in every worker by `torch.initial_seed`, which varies over epochs
+            rng = random.Random(worker_info.seed)
+        elif self.seed is not None:
+            rng = random.Random(f"{self.seed}-{self._epoch}")
+        else:
+            rng = random.Random()
+        
+        buffer = []
+        for entry in entries:
+            if len(buffer) < self.buffer_size:
+                buffer.append(entry)
+            else:
+                # Yield a random entry from the buffer and put the incoming entry in its place
+                k = rng.randrange(self.buffer_size)
+                yield buffer[k]
+                buffer[k] = entry
+        
+        rng.shuffle(buffer)
+        yield from buffer
+    
+    
+    def __iter__(self):
+        for entry in self._iter_entries():
+            example = {}
+            if 'tokens' in entry:
+                example['tokenized_text'] = entry['tokens'].text
+            
+            example.update(self.config.exemplify(entry, training=self.training))
+            yield example
+        self._epoch += 1
+    
+    
+    def collate(self, batch_examples: List[dict]):
+        batch = {}
+        if 'tokenized_text' in batch_examples[0]:
+            batch['tokenized_text'] = [ex['tokenized_text'] for ex in batch_examples]
+            batch['seq_lens'] = torch.tensor([len(tokenized_text) for tokenized_text in batch['tokenized_text']])
+            batch['mask'] = seq_lens2mask(batch['seq_lens'])
+        
+        batch.update(self.config.batchify(batch_examples))
+        return Batch(**batch)
+
+
+
+class BucketBatchSampler(torch.utils.data.Sampler):
+    """A batch sampler grouping sequences of similar lengths, to reduce the padding. 
+    
+    In each epoch, the indexes are shuffled and split into pools of `pool_size`; each pool is sorted by length and 
+    cut into batches, and the batches are then shuffled altogether. Hence, the sequences in a batch have similar 
+    lengths, while the batches are still randomized over epochs and across buckets. 
+    
+    Parameters
+    ----------
+    seq_lens: List[int]
+        The sequence lengths, e.g., `[len(entry['tokens']) for entry in data]`. 
+    batch_size: int
+        The maximum number of sequences in a batch. 
+    max_tokens: int
+        If specified, the batches are cut by a budget instead, i.e., the padded cost of a batch, 
+        `num_seqs * cost(max_len)`, does not exceed `max_tokens`. A sequence exceeding the budget forms a batch alone. 
+    quadratic: bool
+        If True, the cost of a sequence of length `L` is `L**2` instead of `L`. This suits span-based decoders 
+        (e.g., `BoundarySelectionDecoder`), whose score tensors grow with the square of the padded length. 
+    pool_size: int
+        The number of sequences sorted together; defaults to 100 batches (or the whole data with `max_tokens`). 
+    shuffle: bool
+        Whether to shuffle the sequences and batches. If False, the batches follow the sorted order of each pool. 
+    seed: int
+        If specified, the shuffling is reproducible across runs (but still varies over epochs). 
+    
+    Notes
+    -----
+    Use it with `torch.utils.data.DataLoader(dataset, batch_sampler=sampler, collate_fn=dataset.collate)`. 
+    """
+    def __init__(self, seq_lens: List[int], batch_size: int=None, max_tokens: int=None, quadratic: bool=False, 
+                 pool_size: int=None, shuffle: bool=True, seed: int=None):
+        if batch_size is None and max_tokens is None:
+            raise ValueError("At least one of `batch_size` and `max_tokens` should be specified")
+        self.seq_lens = list(seq_lens)
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.quadratic = quadratic
+        if pool_size is None:
+            pool_size = batch_size*100 if batch_size is not None else len(self.seq_lens)
+        self.pool_size = max(pool_size, 1)
+        self.shuffle = shuffle
+        self.seed = seed
+        self._epoch = 0
+        self._batches = None
+        self._batches_epoch = None
+        
+    def cost(self, seq_len):
+        """The cost of sequences of length `seq_len` (an integer or a tensor of lengths). 
+        """
+        return seq_len**2 if self.quadratic else seq_len
+        
+    def _build_batches(self, rng: random.Random):
+        indexes = list(range(len(self.seq_lens)))
+        if self.shuffle:
+            rng.shuffle(indexes)
+        
+        batches = []
+        for start in range(0, len(indexes), self.pool_size):
+            batch = []
+            # The pool is sorted in ascending order, so the incoming sequence is always the longest
+            for idx in sorted(indexes[start:start+self.pool_size], key=self.seq_lens.__getitem__):
+                if len(batch) > 0 and ((self.batch_size is not None and len(batch) >= self.batch_size) or 
+                                       (self.max_tokens is not None and (len(batch)+1)*self.cost(self.seq_lens[idx]) > self.max_tokens)):
+                    batches.append(batch)
+                    batch = []
+                batch.append(idx)
+            if len(batch) > 0:
+                batches.append(batch)
+        
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+        
+    @property
+    def batches(self):
+        """The batches of the current epoch. 
+        """
+        if self._batches_epoch != self._epoch:
+            rng = random.Random() if self.seed is None else random.Random(f"{self.seed}-{self._epoch}")
+            self._batches = self._build_batches(rng)
+            self._batches_epoch = self._epoch
+        return self._batches
+        
+    def __len__(self):
+        # With `max_tokens`, the number of batches may slightly vary over epochs
+        return len(self.batches)
+        
+    def __iter__(self):
+        yield from self.batches
+        self._epoch += 1
+        
+    def padding_efficiency(self, batches: List[List[int]]=None):
+        """The ratio of the real cost to the padded cost of `batches` (defaults to the batches of the current epoch). 
+        """
+        batches = self.batches if batches is None else batches
+        real_cost = sum(self.cost(self.seq_lens[idx]) for batch in batches for idx in batch)
+        padded_cost = sum(len(batch) * max(self.cost(self.seq_lens[idx]) for idx in batch) for batch in batches)
+        return real_cost / max(padded_cost, 1)
 
 
 
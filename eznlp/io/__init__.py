@@ -6,5 +6,6 @@ from .brat import BratIO
 from .json import JsonIO, SQuADIO, KarpathyIO, TextClsIO
 from .chip import ChipIO
 from .src2trg import Src2TrgIO
-from .raw_text import RawTextIO
+from .raw_text import RawTextIO, IndexedRawText
 from .processing import PostIO
+from .cache import DatasetCache
@@ -1,29 +1,83 @@
 # -*- coding: utf-8 -*-
 from typing import Union, List
+import gc
+import contextlib
 
-from ..token import TokenSequence
+from ..token import TokenSequence, ColumnarTokenSequence
 
 
 class IO(object):
     """An IO interface. 
     
+    Parameters
+    ----------
+    columnar: bool
+        If True, build `ColumnarTokenSequence` instead of `TokenSequence`, which is more memory-efficient for large corpora. 
+    cache_dir: str, optional
+        If specified, the parsed datasets are cached in `cache_dir` (see `DatasetCache`). 
     """
-    def __init__(self, is_tokenized: bool, tokenize_callback=None, encoding=None, verbose: bool=True, **token_kwargs):
+    def __init__(self, is_tokenized: bool, tokenize_callback=None, encoding=None, verbose: bool=True, columnar: bool=False, cache_dir: str=None, **token_kwargs):
         self.is_tokenized = is_tokenized
         self.tokenize_callback = tokenize_callback
         assert not self.is_tokenized or self.tokenize_callback is None
         
         self.encoding = encoding
         self.verbose = verbose
+        self.columnar = columnar
+        self.cache_dir = cache_dir
         self.token_kwargs = token_kwargs
         
+    @property
+    def _token_seq_cls(self):
+        return ColumnarTokenSequence if self.columnar else TokenSequence
+        
         
     def _build_tokens(self, text: Union[str, List[str]], **kwargs):
         if self.is_tokenized:
-            return TokenSequence.from_tokenized_text(text, **kwargs, **self.token_kwargs)
+            return self._token_seq_cls.from_tokenized_text(text, **kwargs, **self.token_kwargs)
+        else:
+            return self._token_seq_cls.from_raw_text(text, self.tokenize_callback, **kwargs, **self.token_kwargs)
+        
+    def _build_tokens_batch(self, texts: List[Union[str, List[str]]]):
+        if self.is_tokenized:
+            return [self._build_tokens(text) for text in texts]
         else:
-            return TokenSequence.from_raw_text(text, self.tokenize_callback, **kwargs, **self.token_kwargs)
+            return self._token_seq_cls.from_raw_texts(texts, self.tokenize_callback, **self.token_kwargs)
         
         
     def read(self, file_path):
         raise NotImplementedError("Not Implemented `read`")
+
+
+
+@contextlib.contextmanager
+def _gc_disabled():
+    """Disable the garbage collection within the context. 
+    
+    The garbage collection is triggered by the number of allocated objects, hence frequently by creating (or unpickling) 
+    massive token objects, which would dominate the reading time. These objects are acyclic and never collected 
+    by the garbage collection anyway. 
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+
+# In multiprocessing reading, the IO is passed to each worker once by the pool initializer, 
+# instead of being pickled with every task
+_worker_io = None
+
+def _init_worker_io(io: IO):
+    global _worker_io
+    _worker_io = io
+    # The objects inherited from the parent process (e.g., imported modules) are never freed in the worker, 
+    # so exclude them from garbage collection, which would otherwise be repeatedly scanned
+    gc.freeze()
+
+def _call_worker_io(method_name: str, *args, **kwargs):
+    return getattr(_worker_io, method_name)(*args, **kwargs)
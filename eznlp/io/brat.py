@@ -4,11 +4,14 @@ import os
 import glob
 import re
 import logging
+import functools
+import multiprocessing
 import numpy
 
 from ..utils.segmentation import segment_text_with_hierarchical_seps, segment_text_uniformly
-from ..utils import TextChunksTranslator
-from .base import IO
+from ..utils import TextChunksTranslator, assign_intervals_to_spans
+from .base import IO, _init_worker_io, _call_worker_io, _gc_disabled
+from .cache import cached_read
 
 logger = logging.getLogger(__name__)
 
@@ -162,40 +165,57 @@ class BratIO(IO):
         if self.parse_relations:
             text_relations = [self._parse_relation_ann(ann) for ann in anns if ann.startswith('R')]
         
+        # Assign chunks to spans by an interval index, and group attributes/relations accordingly
+        spans = [(start, end) for start, end in self._segment_text(text) if len(text[start:end].strip()) > 0]
+        idx2chunk_id = list(text_chunks.keys())
+        chunk_intervals = [(chunk_start_in_text, chunk_end_in_text) for chunk_type, chunk_start_in_text, chunk_end_in_text, chunk_text in text_chunks.values()]
+        span_chunk_ids = [[idx2chunk_id[idx] for idx in curr_idxes] for curr_idxes in assign_intervals_to_spans(chunk_intervals, spans)]
+        chunk_id2span_idx = {chunk_id: k for k, curr_chunk_ids in enumerate(span_chunk_ids) for chunk_id in curr_chunk_ids}
+        
+        if self.parse_attrs:
+            span_attrs = [[] for _ in spans]
+            for attr_id, chunk_id, attr_name in text_attrs:
+                if chunk_id in chunk_id2span_idx:
+                    span_attrs[chunk_id2span_idx[chunk_id]].append((attr_id, chunk_id, attr_name))
+            
+        if self.parse_relations:
+            span_relations = [[] for _ in spans]
+            for rel_id, head_id, tail_id, rel_type in text_relations:
+                if head_id in chunk_id2span_idx and chunk_id2span_idx.get(tail_id) == chunk_id2span_idx[head_id]:
+                    span_relations[chunk_id2span_idx[head_id]].append((rel_id, head_id, tail_id, rel_type))
+        
         data = []
         errors, mismatches = [], []
-        for span_start_in_text, span_end_in_text in self._segment_text(text):
+        for k, (span_start_in_text, span_end_in_text) in enumerate(spans):
             curr_text = text[span_start_in_text:span_end_in_text]
             
-            if len(curr_text.strip()) > 0:
-                tokens = self._build_tokens(curr_text)
-                curr_text_chunks = {chunk_id: (chunk_type, chunk_start_in_text-span_start_in_text, chunk_end_in_text-span_start_in_text, chunk_text) 
-                                        for chunk_id, (chunk_type, chunk_start_in_text, chunk_end_in_text, chunk_text) in text_chunks.items() 
-                                        if span_start_in_text <= chunk_start_in_text and chunk_end_in_text <= span_end_in_text}
-                
-                curr_idx2chunk_id = list(curr_text_chunks.keys())
-                curr_chunk_id2idx = {chunk_id: idx for idx, chunk_id in enumerate(curr_idx2chunk_id)}
-                
-                curr_chunks, curr_errors, curr_mismatches = self.text_translator.text_chunks2chunks([curr_text_chunks[chunk_id] for chunk_id in curr_idx2chunk_id], 
-                                                                                                    tokens, curr_text, place_none_for_errors=True)
-                assert len(curr_chunks) == len(curr_text_chunks)
-                errors.extend(curr_errors)
-                mismatches.extend(curr_mismatches)
-                data_entry = {'tokens': tokens, 'chunks': [ck for ck in curr_chunks if ck is not None]}
-                
-                if self.parse_attrs:
-                    curr_attrs = [(attr_name, curr_chunks[curr_chunk_id2idx[chunk_id]]) 
-                                      for attr_id, chunk_id, attr_name in text_attrs 
-                                      if chunk_id in curr_idx2chunk_id]
-                    data_entry.update({'attributes': [(attr_name, ck) for attr_name, ck in curr_attrs if ck is not None]})
-                    
-                if self.parse_relations:
-                    relations = [(rel_type, curr_chunks[curr_chunk_id2idx[head_id]],curr_chunks[curr_chunk_id2idx[tail_id]]) 
-                                     for rel_id, head_id, tail_id, rel_type in text_relations 
-                                     if head_id in curr_idx2chunk_id and tail_id in curr_idx2chunk_id]
-                    data_entry.update({'relations': [(rel_type, head, tail) for rel_type, head, tail in relations if head is not None and tail is not None]})
+            tokens = self._build_tokens(curr_text)
+            curr_text_chunks = {}
+            for chunk_id in span_chunk_ids[k]:
+                chunk_type, chunk_start_in_text, chunk_end_in_text, chunk_text = text_chunks[chunk_id]
+                curr_text_chunks[chunk_id] = (chunk_type, chunk_start_in_text-span_start_in_text, chunk_end_in_text-span_start_in_text, chunk_text)
+            
+            curr_idx2chunk_id = list(curr_text_chunks.keys())
+            curr_chunk_id2idx = {chunk_id: idx for idx, chunk_id in enumerate(curr_idx2chunk_id)}
+            
+            curr_chunks, curr_errors, curr_mismatches = self.text_translator.text_chunks2chunks([curr_text_chunks[chunk_id] for chunk_id in curr_idx2chunk_id], 
+                                                                                                tokens, curr_text, place_none_for_errors=True)
+            assert len(curr_chunks) == len(curr_text_chunks)
+            errors.extend(curr_errors)
+            mismatches.extend(curr_mismatches)
+            data_entry = {'tokens': tokens, 'chunks': [ck for ck in curr_chunks if ck is not None]}
+            
+            if self.parse_attrs:
+                curr_attrs = [(attr_name, curr_chunks[curr_chunk_id2idx[chunk_id]]) 
+                                  for attr_id, chunk_id, attr_name in span_attrs[k]]
+                data_entry.update({'attributes': [(attr_name, ck) for attr_name, ck in curr_attrs if ck is not None]})
                 
-                data.append(data_entry)
+            if self.parse_relations:
+                relations = [(rel_type, curr_chunks[curr_chunk_id2idx[head_id]],curr_chunks[curr_chunk_id2idx[tail_id]]) 
+                                 for rel_id, head_id, tail_id, rel_type in span_relations[k]]
+                data_entry.update({'relations': [(rel_type, head, tail) for rel_type, head, tail in relations if head is not None and tail is not None]})
+            
+            data.append(data_entry)
                 
         if len(errors) > 0 or len(mismatches) > 0:
             logger.warning(f"{len(errors)} errors and {len(mismatches)} mismatches detected during parsing {file_path}")
@@ -206,11 +226,30 @@ class BratIO(IO):
             return data
         
         
-    def read_files(self, file_paths, return_errors: bool=False):
+    def read_files(self, file_paths, return_errors: bool=False, num_workers: int=0, chunksize: int=None):
+        """Read a list of brat-format files. 
+        
+        Parameters
+        ----------
+        num_workers: int
+            If positive, the files are parsed by a pool of `num_workers` processes. 
+            The output (including the errors and mismatches) follows the order of `file_paths` regardless of `num_workers`. 
+        chunksize: int, optional
+            The number of files sent to a worker at a time. Defaults to splitting the files into about four chunks per worker. 
+        """
+        file_paths = list(file_paths)
+        if num_workers > 0 and len(file_paths) > 1:
+            if chunksize is None:
+                chunksize = max(1, len(file_paths) // (num_workers*4))
+            # The token objects are unpickled in the main process, which would be the bottleneck of parallel reading
+            with _gc_disabled(), multiprocessing.Pool(num_workers, initializer=_init_worker_io, initargs=(self, )) as pool:
+                results = list(pool.imap(functools.partial(_call_worker_io, 'read', return_errors=True), file_paths, chunksize=chunksize))
+        else:
+            results = (self.read(file_path, return_errors=True) for file_path in file_paths)
+        
         data = []
         errors, mismatches = [], []
-        for file_path in file_paths:
-            curr_data, curr_errors, curr_mismatches = self.read(file_path, return_errors=True)
+        for curr_data, curr_errors, curr_mismatches in results:
             data.extend(curr_data)
             errors.extend(curr_errors)
             mismatches.extend(curr_mismatches)
@@ -221,9 +260,10 @@ class BratIO(IO):
             return data
         
         
-    def read_folder(self, folder_path, return_errors: bool=False):
+    @cached_read
+    def read_folder(self, folder_path, return_errors: bool=False, num_workers: int=0):
         file_paths = [file_path for file_path in glob.iglob(f"{folder_path}/*.txt") if os.path.exists(file_path.replace('.txt', '.ann'))]
-        return self.read_files(file_paths, return_errors=return_errors)
+        return self.read_files(file_paths, return_errors=return_errors, num_workers=num_workers)
         
         
     def write(self, data: List[dict], file_path):
@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+from typing import List
+import os
+import re
+import glob
+import shutil
+import types
+import threading
+import functools
+import hashlib
+import pickle
+import logging
+import numpy
+
+from ..token import Token, TokenSequence, ColumnarTokenSequence, _StringColumn
+from .base import _gc_disabled
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_path(path: str, hasher):
+    """Update `hasher` with the contents of a file, or of all files in a folder.
+    """
+    if os.path.isdir(path):
+        for sub_path in sorted(glob.iglob(f"{path}/**", recursive=True)):
+            if os.path.isfile(sub_path):
+                hasher.update(os.path.relpath(sub_path, path).encode('utf-8'))
+                _hash_path(sub_path, hasher)
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(functools.partial(f.read, 2**20), b''):
+                hasher.update(block)
+
+
+_LOCK_TYPES = (type(threading.Lock()), type(threading.RLock()))
+
+
+def _fingerprint(obj, _path: set=None):
+    """A deterministic string describing `obj`, which is stable across processes (unlike `repr` of functions).
+    
+    Functions are described by their code, defaults and closures, and bound methods additionally by the bound objects. 
+    Other objects (including callable ones, e.g., spaCy pipelines and tokenizers) are described by their states, or by 
+    their pickled bytes if the states are not accessible. A reference back to an object being described is replaced by 
+    a placeholder, so that cyclic objects are fully covered. 
+    
+    Raises
+    ------
+    TypeError
+        If `obj` contains an object whose state is neither accessible nor picklable. 
+    """
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        return repr(obj)
+    elif isinstance(obj, types.ModuleType):
+        return f"module({obj.__name__})"
+    elif isinstance(obj, type):
+        return f"type({obj.__module__}.{obj.__qualname__})"
+    elif isinstance(obj, numpy.ndarray):
+        return f"ndarray({obj.dtype}, {obj.shape}, {hashlib.sha1(numpy.ascontiguousarray(obj).tobytes()).hexdigest()})"
+    elif isinstance(obj, re.Pattern):
+        return f"re({obj.pattern!r}, {obj.flags})"
+    elif isinstance(obj, _LOCK_TYPES):
+        # Locks (e.g., of jieba tokenizers) do not affect the results
+        return type(obj).__qualname__
+    
+    if _path is None:
+        try:
+            return _fingerprint(obj, set())
+        except RecursionError:
+            raise TypeError(f"Object of {type(obj)} is too deeply nested to fingerprint")
+    elif id(obj) in _path:
+        return f"<cycle {type(obj).__qualname__}>"
+    
+    _path.add(id(obj))
+    try:
+        if isinstance(obj, (list, tuple)):
+            return "[" + ", ".join(_fingerprint(x, _path) for x in obj) + "]"
+        elif isinstance(obj, (set, frozenset)):
+            return "{" + ", ".join(sorted(_fingerprint(x, _path) for x in obj)) + "}"
+        elif isinstance(obj, dict):
+            return "{" + ", ".join(sorted(f"{_fingerprint(k, _path)}: {_fingerprint(v, _path)}" for k, v in obj.items())) + "}"
+        elif isinstance(obj, types.CodeType):
+            return f"code({obj.co_code.hex()}, {_fingerprint(obj.co_consts, _path)}, {_fingerprint(obj.co_names, _path)})"
+        elif isinstance(obj, types.FunctionType):
+            # Functions (including lambdas): identified by the bytecode, constants, defaults and closure variables
+            closure = [cell.cell_contents for cell in obj.__closure__ or () if cell.cell_contents is not obj]
+            return (f"{obj.__module__}.{obj.__qualname__}({_fingerprint(obj.__code__, _path)}, {_fingerprint(obj.__defaults__, _path)}, "
+                    f"{_fingerprint(obj.__kwdefaults__, _path)}, {_fingerprint(closure, _path)})")
+        elif isinstance(obj, types.MethodType):
+            # Bound methods (e.g., `LexiconTokenizer.tokenize`, `jieba.cut`): identified also by the bound object
+            return f"method({_fingerprint(obj.__func__, _path)}, {_fingerprint(obj.__self__, _path)})"
+        elif isinstance(obj, types.BuiltinMethodType):
+            bound = obj.__self__ if not isinstance(obj.__self__, types.ModuleType) else None
+            return f"builtin({getattr(obj, '__module__', None) or ''}.{obj.__qualname__}, {_fingerprint(bound, _path)})"
+        elif isinstance(obj, functools.partial):
+            return f"partial({_fingerprint(obj.func, _path)}, {_fingerprint(obj.args, _path)}, {_fingerprint(obj.keywords, _path)})"
+        elif getattr(type(obj), '__getstate__', None) not in (None, getattr(object, '__getstate__', None)):
+            # NOTE: A customized `__getstate__` excludes the derived attributes (e.g., the trie of `LexiconTokenizer`)
+            return f"{type(obj).__module__}.{type(obj).__qualname__}({_fingerprint(obj.__getstate__(), _path)})"
+        elif hasattr(obj, '__dict__'):
+            return f"{type(obj).__module__}.{type(obj).__qualname__}({_fingerprint(vars(obj), _path)})"
+        else:
+            try:
+                return f"{type(obj).__module__}.{type(obj).__qualname__}({hashlib.sha1(pickle.dumps(obj)).hexdigest()})"
+            except Exception:
+                raise TypeError(f"Object of {type(obj)} is neither accessible nor picklable to fingerprint")
+    finally:
+        _path.discard(id(obj))
+
+
+
+class DatasetCache(object):
+    """An on-disk cache of parsed datasets, in a compact columnar binary format.
+    
+    Each cached dataset is a folder named by the IO class, the source paths, an options hash and a content hash. The 
+    options hash covers the IO attributes (i.e., the constructor arguments) and the reading arguments, and the content 
+    hash covers the source file contents, so the cache invalidates automatically if any of them changes. Caches of the 
+    same source with other options coexist, while the stale caches with the same options (i.e., built from older 
+    source contents) are removed on saving. 
+    
+    In each folder, `TokenSequence` fields are stored column-wise, across the whole dataset:
+        * string columns: a UTF-8 byte buffer, plus the token lengths;
+        * integer columns: an int64 array;
+        * other columns: pickled lists.
+    The buffers and arrays are memory-mapped on loading, and each buffer is decoded in one go. The other fields of 
+    data entries (e.g., `chunks`, `attributes`, `relations`) are pickled together.
+    
+    Parameters
+    ----------
+    cache_dir: str
+        The folder of caches.
+    """
+    _format_version = 1
+    _ignored_kwargs = ('num_workers', )
+    
+    def __init__(self, cache_dir: str, verbose: bool=True):
+        self.cache_dir = cache_dir
+        self.verbose = verbose
+    
+    
+    def build_key(self, io, method_name: str, args: tuple, kwargs: dict):
+        """Build the folder name of a cached dataset.
+        """
+        path_hasher = hashlib.sha1(f"{io.__class__.__name__}.{method_name}".encode('utf-8'))
+        options_hasher = hashlib.sha1(f"v{self._format_version}".encode('utf-8'))
+        content_hasher = hashlib.sha1()
+        for arg in args:
+            if isinstance(arg, str) and os.path.exists(arg):
+                path_hasher.update(os.path.abspath(arg).encode('utf-8'))
+                _hash_path(arg, content_hasher)
+            else:
+                options_hasher.update(_fingerprint(arg).encode('utf-8'))
+        
+        io_state = {name: attr for name, attr in io.__dict__.items() if name not in ('verbose', 'cache_dir', '_reading_with_cache')}
+        options_hasher.update(_fingerprint(io_state).encode('utf-8'))
+        # Arguments that do not affect the results (e.g., `num_workers`) are excluded
+        kwargs = {name: arg for name, arg in kwargs.items() if name not in self._ignored_kwargs}
+        options_hasher.update(_fingerprint(kwargs).encode('utf-8'))
+        return f"{io.__class__.__name__}-{path_hasher.hexdigest()[:10]}-{options_hasher.hexdigest()[:10]}-{content_hasher.hexdigest()[:16]}"
+        
+        
+    def _remove_stale(self, key: str):
+        """Remove the caches built with the same source paths and options as `key`, but from other source contents. 
+        
+        A stale folder is first renamed atomically, so that no process can start loading it; a process in the middle 
+        of loading it treats the missing files as a cache miss. 
+        """
+        prefix = key.rsplit('-', 1)[0]
+        for stale_folder in glob.glob(f"{self.cache_dir}/{glob.escape(prefix)}-*"):
+            # Skip the temporary folders being written by other processes
+            if os.path.basename(stale_folder) == key or not re.fullmatch(r"[0-9a-f]{16}", os.path.basename(stale_folder)[len(prefix)+1:]):
+                continue
+            removed_folder = f"{stale_folder}.removed{os.getpid()}"
+            try:
+                os.replace(stale_folder, removed_folder)
+            except OSError:
+                continue
+            shutil.rmtree(removed_folder, ignore_errors=True)
+    
+    
+    def _save_token_group(self, folder: str, name: str, tokens_list: List[TokenSequence]):
+        # Sequences with different attributes (e.g., with and without additional tags) are saved as separate subgroups
+        subgroup_indexes = {}
+        for k, tokens in enumerate(tokens_list):
+            subgroup_indexes.setdefault(tuple(tokens.token_attr_names), []).append(k)
+        if len(subgroup_indexes) > 1:
+            return {'subgroups': [(indexes, self._save_token_group(folder, f"{name}.{g}", [tokens_list[k] for k in indexes])) 
+                                      for g, indexes in enumerate(subgroup_indexes.values())]}
+        
+        seq_lens = [len(tokens) for tokens in tokens_list]
+        token_offsets = numpy.zeros(len(tokens_list)+1, dtype=numpy.int64)
+        numpy.cumsum(seq_lens, out=token_offsets[1:])
+        numpy.save(f"{folder}/{name}.token_offsets.npy", token_offsets)
+        
+        attr_names = tokens_list[0].token_attr_names if len(tokens_list) > 0 else []
+        
+        columns_meta = {}
+        for attr_name in attr_names:
+            if attr_name == 'text' and all(tokens.text == tokens.raw_text for tokens in tokens_list):
+                # Typically, `text` is identical to `raw_text` if no normalization applied
+                columns_meta[attr_name] = 'raw_text'
+                continue
+            
+            values_list = [getattr(tokens, attr_name) if len(tokens) > 0 else [] for tokens in tokens_list]
+            if all(isinstance(v, str) for values in values_list for v in values):
+                with open(f"{folder}/{name}.{attr_name}.buf", 'wb') as f:
+                    f.write("".join("".join(values) for values in values_list).encode('utf-8'))
+                numpy.save(f"{folder}/{name}.{attr_name}.lengths.npy", numpy.array([len(v) for values in values_list for v in values], dtype=numpy.int32))
+                columns_meta[attr_name] = 'str'
+                
+            elif all(isinstance(v, (int, numpy.integer)) and not isinstance(v, (bool, numpy.bool_)) for values in values_list for v in values):
+                numpy.save(f"{folder}/{name}.{attr_name}.npy", numpy.array([v for values in values_list for v in values], dtype=numpy.int64))
+                columns_meta[attr_name] = 'int'
+                
+            else:
+                columns_meta[attr_name] = values_list
+        
+        return {'attr_names': attr_names, 
+                'columns': columns_meta, 
+                'seq_kwargs': [(tokens.token_sep, tokens.pad_token, tokens.none_token) for tokens in tokens_list], 
+                'columnar': len(tokens_list) > 0 and isinstance(tokens_list[0], ColumnarTokenSequence)}
+        
+        
+    def _load_column(self, folder: str, name: str, attr_name: str, column_meta, columnar: bool):
+        """Load a column, returning `(kind, payload)`, where `kind` is one of 
+            * `per_seq`: a list of value lists, one for each sequence; 
+            * `flat`: a flat list of values of all tokens; 
+            * `array`: an array of values of all tokens; 
+            * `str`: a string of all tokens, plus the character offsets. 
+        """
+        if isinstance(column_meta, list):
+            return ('per_seq', column_meta)
+        
+        elif column_meta == 'int':
+            # NOTE: Viewing as `numpy.ndarray` avoids the overhead of slicing `numpy.memmap`
+            values = numpy.load(f"{folder}/{name}.{attr_name}.npy", mmap_mode='r').view(numpy.ndarray)
+            return ('array', values) if columnar else ('flat', values.tolist())
+        
+        else:
+            tok_lens = numpy.load(f"{folder}/{name}.{attr_name}.lengths.npy", mmap_mode='r')
+            char_offsets = numpy.zeros(len(tok_lens)+1, dtype=numpy.int64)
+            numpy.cumsum(tok_lens, out=char_offsets[1:])
+            if os.path.getsize(f"{folder}/{name}.{attr_name}.buf") > 0:
+                joined = numpy.memmap(f"{folder}/{name}.{attr_name}.buf", dtype=numpy.uint8, mode='r').tobytes().decode('utf-8')
+            else:
+                joined = ""
+            
+            if columnar:
+                return ('str', (joined, char_offsets))
+            else:
+                char_offsets = char_offsets.tolist()
+                return ('flat', [joined[s:e] for s, e in zip(char_offsets[:-1], char_offsets[1:])])
+        
+        
+    def _load_token_group(self, folder: str, name: str, group_meta: dict):
+        if 'subgroups' in group_meta:
+            tokens_list = [None] * sum(len(indexes) for indexes, _ in group_meta['subgroups'])
+            for g, (indexes, subgroup_meta) in enumerate(group_meta['subgroups']):
+                for k, tokens in zip(indexes, self._load_token_group(folder, f"{name}.{g}", subgroup_meta)):
+                    tokens_list[k] = tokens
+            return tokens_list
+        
+        token_offsets = numpy.load(f"{folder}/{name}.token_offsets.npy", mmap_mode='r').tolist()
+        columnar = group_meta['columnar']
+        
+        columns = {}
+        for attr_name, column_meta in group_meta['columns'].items():
+            if not isinstance(column_meta, str) or column_meta != 'raw_text':
+                columns[attr_name] = self._load_column(folder, name, attr_name, column_meta, columnar)
+        # `ColumnarTokenSequence` falls back `text` to `raw_text`
+        if not columnar:
+            columns = {attr_name: columns.get(attr_name, columns.get('raw_text')) for attr_name in group_meta['attr_names']}
+        
+        tokens_list = []
+        for k, (token_sep, pad_token, none_token) in enumerate(group_meta['seq_kwargs']):
+            tok_start, tok_end = token_offsets[k], token_offsets[k+1]
+            
+            seq_columns = {}
+            for attr_name, (kind, payload) in columns.items():
+                if kind == 'per_seq':
+                    seq_columns[attr_name] = payload[k]
+                elif kind == 'flat':
+                    seq_columns[attr_name] = payload[tok_start:tok_end]
+                elif kind == 'array':
+                    seq_columns[attr_name] = numpy.array(payload[tok_start:tok_end])
+                else:
+                    joined, char_offsets = payload
+                    seq_offsets = char_offsets[tok_start:tok_end+1]
+                    seq_columns[attr_name] = _StringColumn(joined[seq_offsets[0]:seq_offsets[-1]], (seq_offsets - seq_offsets[0]).astype(numpy.int32))
+            
+            if columnar:
+                tokens = ColumnarTokenSequence(seq_columns, token_sep=token_sep, pad_token=pad_token, none_token=none_token)
+            else:
+                token_list = []
+                for values in zip(*seq_columns.values()):
+                    tok = Token.__new__(Token)
+                    tok.__dict__ = dict(zip(seq_columns.keys(), values))
+                    token_list.append(tok)
+                tokens = TokenSequence(token_list, token_sep=token_sep, pad_token=pad_token, none_token=none_token)
+            tokens_list.append(tokens)
+        
+        return tokens_list
+        
+        
+    def save(self, key: str, result):
+        if isinstance(result, tuple):
+            data, extras = result[0], result[1:]
+        else:
+            data, extras = result, None
+        
+        folder = f"{self.cache_dir}/{key}"
+        tmp_folder = f"{folder}.tmp{os.getpid()}"
+        os.makedirs(tmp_folder, exist_ok=True)
+        
+        token_keys = [k for k, v in data[0].items() if isinstance(v, TokenSequence)] if len(data) > 0 else []
+        groups_meta = {}
+        for k in token_keys:
+            groups_meta[k] = self._save_token_group(tmp_folder, k, [entry[k] for entry in data])
+        entries = [{k: v for k, v in entry.items() if k not in token_keys} for entry in data]
+        
+        with open(f"{tmp_folder}/meta.pkl", 'wb') as f:
+            pickle.dump({'groups': groups_meta, 'entries': entries, 'extras': extras}, f)
+        
+        self._remove_stale(key)
+        try:
+            os.replace(tmp_folder, folder)
+        except OSError:
+            # Another process has just saved the same dataset
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+        if self.verbose:
+            logger.info(f"Dataset cached in {folder}")
+    
+    
+    def load(self, key: str):
+        folder = f"{self.cache_dir}/{key}"
+        if not os.path.exists(f"{folder}/meta.pkl"):
+            return None
+        
+        try:
+            with _gc_disabled():
+                with open(f"{folder}/meta.pkl", 'rb') as f:
+                    meta = pickle.load(f)
+                data = meta['entries']
+                for k, group_meta in meta['groups'].items():
+                    for entry, tokens in zip(data, self._load_token_group(folder, k, group_meta)):
+                        entry[k] = tokens
+        except FileNotFoundError:
+            # The folder has been removed as stale by another process
+            return None
+        
+        if self.verbose:
+            logger.info(f"Dataset loaded from cache {folder}")
+        if meta['extras'] is None:
+            return data
+        else:
+            return (data, *meta['extras'])
+
+
+
+def cached_read(read):
+    """Decorate a reading method of `IO`, so that the results are cached in `io.cache_dir`, if it is not None.
+    """
+    @functools.wraps(read)
+    def wrapped_read(self, *args, **kwargs):
+        if getattr(self, 'cache_dir', None) is None or getattr(self, '_reading_with_cache', False):
+            return read(self, *args, **kwargs)
+        
+        cache = DatasetCache(self.cache_dir, verbose=self.verbose)
+        try:
+            key = cache.build_key(self, read.__name__, args, kwargs)
+        except TypeError as err:
+            # The options cannot be reliably identified, so a cache may be confused with that of other options
+            logger.warning(f"Reading without cache: {err}")
+            return read(self, *args, **kwargs)
+        result = cache.load(key)
+        if result is None:
+            # Nested reading methods (e.g., `read_folder` -> `read`) are not cached separately
+            self._reading_with_cache = True
+            try:
+                result = read(self, *args, **kwargs)
+            finally:
+                self._reading_with_cache = False
+            cache.save(key, result)
+        return result
+    
+    return wrapped_read
@@ -4,6 +4,7 @@ import tqdm
 import glob
 
 from .base import IO
+from .cache import cached_read
 
 
 class CategoryFolderIO(IO):
@@ -22,6 +23,7 @@ class CategoryFolderIO(IO):
         super().__init__(is_tokenized=False, tokenize_callback=tokenize_callback, encoding=encoding, verbose=verbose, **token_kwargs)
         
         
+    @cached_read
     def read(self, folder_path):
         data = []
         for label in self.categories:
@@ -3,6 +3,7 @@ import logging
 
 from ..utils import TextChunksTranslator
 from .base import IO
+from .cache import cached_read
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +24,7 @@ class ChipIO(IO):
         self.text_translator = TextChunksTranslator()
 
         
+    @cached_read
     def read(self, file_path, return_errors: bool=False):
         with open(file_path, 'r', encoding=self.encoding) as f:
             raw_lines = [line for line in f if len(line.strip()) > 0]
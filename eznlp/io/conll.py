@@ -3,6 +3,7 @@ import numpy
 
 from ..utils import ChunksTagsTranslator
 from .base import IO
+from .cache import cached_read
 
 
 class ConllIO(IO):
@@ -53,8 +54,18 @@ class ConllIO(IO):
         super().__init__(is_tokenized=True, encoding=encoding, verbose=verbose, **token_kwargs)
         
         
-    def read(self, file_path):
-        data = []
+    def _build_entry(self, text: list, tags: list, additional: dict):
+        additional_tags = {self.additional_col_id2name[col_id]: atags for col_id, atags in additional.items()}
+        tokens = self._build_tokens(text, additional_tags=additional_tags)
+        chunks = self.tags_translator.tags2chunks(tags)
+        return {'tokens': tokens, 'chunks': chunks}
+        
+        
+    def iter_read(self, file_path):
+        """Lazily read a CoNLL-format file, yielding one entry (i.e., a sentence, or a document if `document_level` is True) at a time. 
+        
+        Only the lines of the current entry are held in memory, so large files can be streamed through, e.g., `StreamingDataset`. 
+        """
         with open(file_path, 'r', encoding=self.encoding) as f:
             text, tags = [], []
             additional = {col_id: [] for col_id in self.additional_col_id2name.keys()}
@@ -65,10 +76,7 @@ class ConllIO(IO):
                 
                 if self._is_breaking(line):
                     if len(text) > 0:
-                        additional_tags = {self.additional_col_id2name[col_id]: atags for col_id, atags in additional.items()}
-                        tokens = self._build_tokens(text, additional_tags=additional_tags)
-                        chunks = self.tags_translator.tags2chunks(tags)
-                        data.append({'tokens': tokens, 'chunks': chunks})
+                        yield self._build_entry(text, tags, additional)
                         
                         text, tags = [], []
                         additional = {col_id: [] for col_id in self.additional_col_id2name.keys()}
@@ -91,12 +99,12 @@ class ConllIO(IO):
                     _is_skipping_last = False
                         
             if len(text) > 0:
-                additional_tags = {self.additional_col_id2name[col_id]: atags for col_id, atags in additional.items()}
-                tokens = self._build_tokens(text, additional_tags=additional_tags)
-                chunks = self.tags_translator.tags2chunks(tags)
-                data.append({'tokens': tokens, 'chunks': chunks})
-            
-        return data
+                yield self._build_entry(text, tags, additional)
+        
+        
+    @cached_read
+    def read(self, file_path):
+        return list(self.iter_read(file_path))
     
     
     def _is_sentence_seperator(self, line: str):
@@ -125,7 +133,7 @@ class ConllIO(IO):
 
 
     def flatten_to_characters(self, data: list):
-        additional_keys = [key for key in data[0]['tokens'][0].__dict__.keys() if key not in ('text', 'raw_text')]
+        additional_keys = [key for key in data[0]['tokens'].token_attr_names if key not in ('text', 'raw_text')]
         
         new_data = []
         for entry in data:
@@ -1,15 +1,77 @@
 # -*- coding: utf-8 -*-
 from typing import List
 import os
+import itertools
+import collections
 import logging
+import multiprocessing
 import json
 
 from ..utils import TextChunksTranslator
-from .base import IO
+from .base import IO, _init_worker_io, _call_worker_io, _gc_disabled
+from .cache import cached_read
 
 logger = logging.getLogger(__name__)
 
 
+def _iter_json_array(f, buffer_size: int=2**20):
+    """Incrementally parse a file of a JSON array, yielding one element at a time. 
+    
+    Only the current element (and a read buffer) is held in memory. 
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    
+    def _skip(chars: str):
+        nonlocal buffer, pos, eof
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            buffer, pos = f.read(buffer_size), 0
+            eof = (len(buffer) == 0)
+    
+    _skip(" \t\r\n")
+    if eof or buffer[pos] != '[':
+        raise ValueError("The file is not a JSON array")
+    pos += 1
+    
+    while True:
+        _skip(" \t\r\n")
+        if eof:
+            raise ValueError("Unexpected end of the JSON array")
+        if buffer[pos] == ']':
+            return
+        
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A decoded element must be followed by at least one character (`,` or `]`); 
+            # otherwise, it may be truncated by the buffer boundary (e.g., a number). 
+            if end is not None and (end < len(buffer) or eof):
+                break
+            if eof:
+                raise ValueError("Invalid or truncated JSON array")
+            # Read geometrically more, so that a large element is parsed in amortized linear time
+            more = f.read(max(buffer_size, len(buffer)-pos))
+            eof = (len(more) == 0)
+            buffer, pos = buffer[pos:] + more, 0
+        
+        yield element
+        pos = end
+        _skip(" \t\r\n")
+        if eof:
+            raise ValueError("Unexpected end of the JSON array")
+        if buffer[pos] == ',':
+            pos += 1
+        elif buffer[pos] != ']':
+            raise ValueError(f"Expecting ',' or ']' in the JSON array, but got {buffer[pos]!r}")
+
+
+
 def _filter_duplicated(tuples: List[tuple]):
     filtered_tuples = []
     for tp in tuples:
@@ -76,53 +138,102 @@ class JsonIO(IO):
             self.text_translator = TextChunksTranslator()
         
         
-    def read(self, file_path, return_errors: bool=False):
+    def _iter_raw_entries(self, file_path):
         with open(file_path, 'r', encoding=self.encoding) as f:
             if self.is_whole_piece:
-                raw_data = json.load(f)
+                yield from _iter_json_array(f)
             else:
-                raw_data = [json.loads(line) for line in f if len(line.strip()) > 0]
+                for line in f:
+                    if len(line.strip()) > 0:
+                        yield json.loads(line)
+        
+        
+    def _build_entry(self, raw_entry: dict):
+        tokens = self._build_tokens(raw_entry[self.text_key])
+        chunks = [(chunk[self.chunk_type_key], 
+                   chunk[self.chunk_start_key],
+                   chunk[self.chunk_end_key]) for chunk in raw_entry[self.chunk_key]]
         
-        data = []
         errors, mismatches = [], []
-        for raw_entry in raw_data:
-            tokens = self._build_tokens(raw_entry[self.text_key])
-            chunks = [(chunk[self.chunk_type_key], 
-                       chunk[self.chunk_start_key],
-                       chunk[self.chunk_end_key]) for chunk in raw_entry[self.chunk_key]]
-            
-            if not self.is_tokenized:
-                if self.chunk_text_key is not None:
-                    chunks = [(*ck, chunk[self.chunk_text_key]) for ck, chunk in zip(chunks, raw_entry[self.chunk_key])]
-                
-                chunks, curr_errors, curr_mismatches = self.text_translator.text_chunks2chunks(chunks, tokens, raw_entry[self.text_key], place_none_for_errors=True)
-                errors.extend(curr_errors)
-                mismatches.extend(curr_mismatches)
+        if not self.is_tokenized:
+            if self.chunk_text_key is not None:
+                chunks = [(*ck, chunk[self.chunk_text_key]) for ck, chunk in zip(chunks, raw_entry[self.chunk_key])]
             
-            entry = {'tokens': tokens, 'chunks': [ck for ck in chunks if ck is not None]}
+            chunks, errors, mismatches = self.text_translator.text_chunks2chunks(chunks, tokens, raw_entry[self.text_key], place_none_for_errors=True)
+        
+        entry = {'tokens': tokens, 'chunks': [ck for ck in chunks if ck is not None]}
+        
+        if self.attribute_key is not None:
+            attributes = [(attr[self.attribute_type_key], 
+                           chunks[attr[self.attribute_chunk_key]]) for attr in raw_entry[self.attribute_key]]
+            entry.update({'attributes': [(attr_type, ck) for attr_type, ck in attributes if ck is not None]})
+        
+        if self.relation_key is not None:
+            relations = [(rel[self.relation_type_key], 
+                          chunks[rel[self.relation_head_key]], 
+                          chunks[rel[self.relation_tail_key]]) for rel in raw_entry[self.relation_key]]
+            entry.update({'relations': [(rel_type, head, tail) for rel_type, head, tail in relations if head is not None and tail is not None]})
             
+        if self.drop_duplicated:
+            entry['chunks'] = _filter_duplicated(entry['chunks'])
             if self.attribute_key is not None:
-                attributes = [(attr[self.attribute_type_key], 
-                               chunks[attr[self.attribute_chunk_key]]) for attr in raw_entry[self.attribute_key]]
-                entry.update({'attributes': [(attr_type, ck) for attr_type, ck in attributes if ck is not None]})
-            
+                entry['attributes'] = _filter_duplicated(entry['attributes'])
             if self.relation_key is not None:
-                relations = [(rel[self.relation_type_key], 
-                              chunks[rel[self.relation_head_key]], 
-                              chunks[rel[self.relation_tail_key]]) for rel in raw_entry[self.relation_key]]
-                entry.update({'relations': [(rel_type, head, tail) for rel_type, head, tail in relations if head is not None and tail is not None]})
-                
-            if self.drop_duplicated:
-                entry['chunks'] = _filter_duplicated(entry['chunks'])
-                if self.attribute_key is not None:
-                    entry['attributes'] = _filter_duplicated(entry['attributes'])
-                if self.relation_key is not None:
-                    entry['relations'] = _filter_duplicated(entry['relations'])
-            
-            if self.retain_meta:
-                entry.update({k:v for k, v in raw_entry.items() if k not in (self.text_key, self.chunk_key, self.attribute_key, self.relation_key)})
-            
-            data.append(entry)
+                entry['relations'] = _filter_duplicated(entry['relations'])
+        
+        if self.retain_meta:
+            entry.update({k:v for k, v in raw_entry.items() if k not in (self.text_key, self.chunk_key, self.attribute_key, self.relation_key)})
+        
+        return entry, errors, mismatches
+        
+    def _build_entries(self, raw_entries: List[dict]):
+        return [self._build_entry(raw_entry) for raw_entry in raw_entries]
+        
+        
+    def iter_read(self, file_path, return_errors: bool=False, num_workers: int=0, chunksize: int=64):
+        """Lazily read a Json file, parsing and converting one record at a time. 
+        
+        Both the Json-lines format and the whole-piece Json array (i.e., `is_whole_piece` being True) are parsed incrementally, 
+        so the memory is bounded regardless of the file size. 
+        
+        Parameters
+        ----------
+        return_errors: bool
+            If True, yield tuples of (entry, errors, mismatches). 
+        num_workers: int
+            If positive, the records are converted (i.e., tokenization and chunk matching) by a pool of `num_workers` processes. 
+            The entries are yielded in the original order. 
+        chunksize: int
+            The number of records sent to a worker at a time. At most `2*num_workers` chunks are pending at a time. 
+        """
+        raw_entries = self._iter_raw_entries(file_path)
+        if num_workers > 0:
+            with multiprocessing.Pool(num_workers, initializer=_init_worker_io, initargs=(self, )) as pool:
+                pending = collections.deque()
+                for raw_batch in iter(lambda: list(itertools.islice(raw_entries, chunksize)), []):
+                    pending.append(pool.apply_async(_call_worker_io, ('_build_entries', raw_batch)))
+                    while len(pending) >= 2*num_workers:
+                        yield from self._unpack_results(pending.popleft().get(), return_errors)
+                while len(pending) > 0:
+                    yield from self._unpack_results(pending.popleft().get(), return_errors)
+        else:
+            for raw_entry in raw_entries:
+                yield from self._unpack_results([self._build_entry(raw_entry)], return_errors)
+        
+    def _unpack_results(self, results: List[tuple], return_errors: bool):
+        for entry, errors, mismatches in results:
+            yield (entry, errors, mismatches) if return_errors else entry
+        
+        
+    @cached_read
+    def read(self, file_path, return_errors: bool=False, num_workers: int=0):
+        data = []
+        errors, mismatches = [], []
+        with _gc_disabled():
+            for entry, curr_errors, curr_mismatches in self.iter_read(file_path, return_errors=True, num_workers=num_workers):
+                data.append(entry)
+                errors.extend(curr_errors)
+                mismatches.extend(curr_mismatches)
             
         if len(errors) > 0 or len(mismatches) > 0:
             logger.warning(f"{len(errors)} errors and {len(mismatches)} mismatches detected during parsing {file_path}")
@@ -174,6 +285,7 @@ class SQuADIO(IO):
         self.text_translator = TextChunksTranslator()
         
         
+    @cached_read
     def read(self, file_path, return_errors: bool=False):
         with open(file_path, 'r', encoding=self.encoding) as f:
             raw_data = json.load(f)
@@ -222,6 +334,7 @@ class KarpathyIO(IO):
         self.check_img_path = check_img_path
         super().__init__(is_tokenized=True, tokenize_callback=None, encoding=encoding, verbose=verbose, **token_kwargs)
         
+    @cached_read
     def read(self, file_path):
         with open(file_path, 'r', encoding=self.encoding) as f:
             raw_data = json.load(f)
@@ -271,6 +384,7 @@ class TextClsIO(IO):
         super().__init__(is_tokenized=is_tokenized, tokenize_callback=tokenize_callback, encoding=encoding, verbose=verbose, **token_kwargs)
         
         
+    @cached_read
     def read(self, file_path):
         with open(file_path, 'r', encoding=self.encoding) as f:
             if self.is_whole_piece:
@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
-from typing import List
+from typing import List, Iterable
+import os
+import shutil
+import array
 import logging
 import tqdm
 import json
+import hashlib
+import numpy
 
 from .base import IO
+from .cache import _fingerprint
 from ..utils.transition import ChunksTagsTranslator, _token2wwm_tag
 from ..utils.segmentation import segment_text_uniformly
 
@@ -74,9 +80,7 @@ class RawTextIO(IO):
         return wwm_cuts
         
         
-    def _parse_raw(self, byte_lines: List[bytes]):
-        data = []
-        
+    def _parse_raw(self, byte_lines: Iterable[bytes]):
         tokenized_doc = []
         for byte_line in tqdm.tqdm(byte_lines, disable=not self.verbose, ncols=100, desc="Loading raw text data"):
             line = byte_line.decode(self.encoding)
@@ -85,8 +89,8 @@ class RawTextIO(IO):
                 if len(tokenized_doc) >= self.min_len:
                     for start, end in segment_text_uniformly(tokenized_doc, max_span_size=self.max_len):
                         tokenized_text = tokenized_doc[start:end]
-                        data.append({'rejoined_text': " ".join(tokenized_text), 
-                                     'wwm_cuts': self._detect_wwm_cuts(tokenized_text)})
+                        yield {'rejoined_text': " ".join(tokenized_text), 
+                               'wwm_cuts': self._detect_wwm_cuts(tokenized_text)}
                 tokenized_doc = []
                 
             elif self.tokenize_callback is None:
@@ -97,29 +101,115 @@ class RawTextIO(IO):
         if len(tokenized_doc) >= self.min_len:
             for start, end in segment_text_uniformly(tokenized_doc, max_span_size=self.max_len):
                 tokenized_text = tokenized_doc[start:end]
-                data.append({'rejoined_text': " ".join(tokenized_text), 
-                             'wwm_cuts': self._detect_wwm_cuts(tokenized_text)})
-        
-        return data
+                yield {'rejoined_text': " ".join(tokenized_text), 
+                       'wwm_cuts': self._detect_wwm_cuts(tokenized_text)}
         
         
-    def _parse_json(self, byte_lines: List[bytes]):
-        data = []
+    def _parse_json(self, byte_lines: Iterable[bytes]):
         for byte_line in tqdm.tqdm(byte_lines, disable=not self.verbose, ncols=100, desc="Loading raw text data"):
             # `tokenize_callback` must be None
-            entry = json.loads(byte_line.decode(self.encoding))
-            data.append(entry)
-        return data
+            yield json.loads(byte_line.decode(self.encoding))
         
         
-    def read(self, file_path):
+    def iter_read(self, file_path):
+        """Lazily read a raw text file (or a file of parsed entries if `tokenize_callback` is None), yielding one entry at a time. 
+        """
         with open(file_path, 'rb') as f:
-            byte_lines = [line for line in f if len(line.rstrip()) > 0]
+            byte_lines = (line for line in f if len(line.rstrip()) > 0)
+            if self.tokenize_callback is None:
+                yield from self._parse_json(byte_lines)
+            else:
+                yield from self._parse_raw(byte_lines)
+    
+    def read(self, file_path):
+        return list(self.iter_read(file_path))
         
-        if self.tokenize_callback is None:
-            return self._parse_json(byte_lines)
-        else:
-            return self._parse_raw(byte_lines)
+    
+    def _index_sources(self, file_paths: List[str]):
+        """The sources of an index, i.e., the files (with their sizes and modification times) and the IO options. 
+        
+        The IO options are None if they cannot be fingerprinted (see `_fingerprint`), in which case the index is never 
+        regarded as up to date. 
+        """
+        io_state = {name: attr for name, attr in self.__dict__.items() if name not in ('verbose', 'cache_dir', '_reading_with_cache')}
+        try:
+            io_options = hashlib.sha1(_fingerprint(io_state).encode('utf-8')).hexdigest()
+        except TypeError as err:
+            logger.warning(f"The index sources cannot be verified: {err}")
+            io_options = None
+        return {'file_paths': [os.path.abspath(file_path) for file_path in file_paths], 
+                'file_stats': [[os.path.getsize(file_path), os.stat(file_path).st_mtime_ns] for file_path in file_paths], 
+                'io_options': io_options}
+        
+        
+    def is_index_up_to_date(self, file_paths: List[str], index_path: str):
+        """Check whether the index at `index_path` has been built by `build_index` with the same files 
+        (unmodified since then) and the same IO options. 
+        """
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        if not os.path.exists(f"{index_path}/meta.json"):
+            return False
+        with open(f"{index_path}/meta.json") as f:
+            meta = json.load(f)
+        
+        sources = self._index_sources(file_paths)
+        if sources['io_options'] is None:
+            return False
+        return meta['format_version'] == IndexedRawText._format_version and all(meta.get(k) == v for k, v in sources.items())
+        
+        
+    def build_index(self, file_paths: List[str], index_path: str):
+        """Parse the files once, and write the entries to a memory-mapped index at `index_path`. 
+        
+        The resulting index can be opened by `IndexedRawText`, which provides random access to the entries 
+        without loading the corpus into memory. 
+        
+        Parameters
+        ----------
+        file_paths: List[str]
+            The files to parse, which are concatenated in order. 
+        index_path: str
+            The folder to save the index. 
+        """
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        sources = self._index_sources(file_paths)
+        
+        tmp_path = f"{index_path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        # The offsets of entries into the flat arrays
+        text_offsets, cut_offsets = array.array('q', [0]), array.array('q', [0])
+        try:
+            with open(f"{tmp_path}/text.bin", 'wb') as text_f, open(f"{tmp_path}/wwm_cuts.bin", 'wb') as cut_f:
+                for file_path in file_paths:
+                    for entry in self.iter_read(file_path):
+                        text_bytes = entry['rejoined_text'].encode('utf-8')
+                        text_f.write(text_bytes)
+                        text_offsets.append(text_offsets[-1] + len(text_bytes))
+                        
+                        wwm_cuts = numpy.asarray(entry['wwm_cuts'], dtype=IndexedRawText._cut_dtype)
+                        cut_f.write(wwm_cuts.tobytes())
+                        cut_offsets.append(cut_offsets[-1] + len(wwm_cuts))
+            
+            numpy.save(f"{tmp_path}/text_offsets.npy", numpy.frombuffer(text_offsets, dtype=numpy.int64))
+            numpy.save(f"{tmp_path}/wwm_cuts_offsets.npy", numpy.frombuffer(cut_offsets, dtype=numpy.int64))
+            with open(f"{tmp_path}/meta.json", 'w') as f:
+                json.dump({'format_version': IndexedRawText._format_version, 
+                           'num_entries': len(text_offsets) - 1, 
+                           'num_tokens': int(cut_offsets[-1]) - (len(cut_offsets) - 1), 
+                           **sources}, f, indent=4)
+            
+            if os.path.exists(index_path):
+                shutil.rmtree(index_path)
+            os.replace(tmp_path, index_path)
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+        
+        if self.verbose:
+            logger.info(f"Raw text index built at {index_path}")
+        return IndexedRawText(index_path)
         
         
     def setup_data_with_tokens(self, data: List[dict]):
@@ -145,3 +235,66 @@ class RawTextIO(IO):
             for line in data:
                 f.write(json.dumps(line, ensure_ascii=False))
                 f.write("\n")
+
+
+
+class IndexedRawText(object):
+    """A memory-mapped, randomly accessible sequence of pre-training entries, built by `RawTextIO.build_index`. 
+    
+    The `rejoined_text` of all entries are stored as a flat UTF-8 byte array, and the `wwm_cuts` as a flat integer array, 
+    both with offset indexes. Entries are decoded on access, so the corpus size is not limited by the memory. 
+    
+    Parameters
+    ----------
+    index_path: str
+        The folder of the index. 
+    """
+    _format_version = 1
+    _cut_dtype = numpy.int32
+    
+    def __init__(self, index_path: str):
+        with open(f"{index_path}/meta.json") as f:
+            self.meta = json.load(f)
+        if self.meta['format_version'] != self._format_version:
+            raise ValueError(f"Incompatible index format version {self.meta['format_version']} at {index_path}")
+        
+        self.index_path = index_path
+        self._open()
+    
+    def _open(self):
+        # Viewing as `numpy.ndarray` avoids the overhead of slicing `numpy.memmap`, while the mapping is retained by the view
+        self.text_offsets = numpy.load(f"{self.index_path}/text_offsets.npy", mmap_mode='r').view(numpy.ndarray)
+        self.wwm_cuts_offsets = numpy.load(f"{self.index_path}/wwm_cuts_offsets.npy", mmap_mode='r').view(numpy.ndarray)
+        # `numpy.memmap` fails to map empty files
+        if self.text_offsets[-1] > 0:
+            self.text = numpy.memmap(f"{self.index_path}/text.bin", dtype=numpy.uint8, mode='r').view(numpy.ndarray)
+        else:
+            self.text = numpy.zeros(0, dtype=numpy.uint8)
+        if self.wwm_cuts_offsets[-1] > 0:
+            self.wwm_cuts = numpy.memmap(f"{self.index_path}/wwm_cuts.bin", dtype=self._cut_dtype, mode='r').view(numpy.ndarray)
+        else:
+            self.wwm_cuts = numpy.zeros(0, dtype=self._cut_dtype)
+    
+    def __getstate__(self):
+        # Re-open the memory maps instead of pickling the arrays (e.g., in multi-process data loading)
+        return {'meta': self.meta, 'index_path': self.index_path}
+    
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._open()
+    
+    def __len__(self):
+        return self.meta['num_entries']
+    
+    def __getitem__(self, i: int):
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"Entry index {i} out of range")
+        i = i % len(self)
+        text_start, text_end = self.text_offsets[i:i+2]
+        cut_start, cut_end = self.wwm_cuts_offsets[i:i+2]
+        return {'rejoined_text': self.text[text_start:text_end].tobytes().decode('utf-8'), 
+                'wwm_cuts': self.wwm_cuts[cut_start:cut_end].tolist()}
+    
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -3,8 +3,8 @@ from typing import Union, List
 import tqdm
 import re
 
-from ..token import TokenSequence
 from .base import IO
+from .cache import cached_read
 
 
 class Src2TrgIO(IO):
@@ -23,11 +23,12 @@ class Src2TrgIO(IO):
         
     def _build_trg_tokens(self, text: Union[str, List[str]], **kwargs):
         if self.is_tokenized:
-            return TokenSequence.from_tokenized_text(text, **kwargs, **self.token_kwargs)
+            return self._token_seq_cls.from_tokenized_text(text, **kwargs, **self.token_kwargs)
         else:
-            return TokenSequence.from_raw_text(text, self.trg_tokenize_callback, **kwargs, **self.token_kwargs)
+            return self._token_seq_cls.from_raw_text(text, self.trg_tokenize_callback, **kwargs, **self.token_kwargs)
         
         
+    @cached_read
     def read(self, src_path, trg_path):
         data = []
         with open(src_path, 'r', encoding=self.encoding) as f:
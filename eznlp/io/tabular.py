@@ -2,7 +2,8 @@
 import tqdm
 import pandas
 
-from .base import IO
+from .base import IO, _gc_disabled
+from .cache import cached_read
 
 
 class TabularIO(IO):
@@ -28,16 +29,28 @@ class TabularIO(IO):
         super().__init__(is_tokenized=False, tokenize_callback=tokenize_callback, encoding=encoding, verbose=verbose, **token_kwargs)
         
         
-    def read(self, file_path):
-        df = pandas.read_csv(file_path, encoding=self.encoding, sep=self.sep, header=self.header, dtype=str, na_filter=False, engine=self.engine)
+    def iter_chunks(self, file_path, chunksize: int=10000):
+        """Lazily read a tabular file, yielding lists of (at most `chunksize`) entries. 
         
-        data = []
-        for _, line in tqdm.tqdm(df.iterrows(), total=df.shape[0], disable=not self.verbose, ncols=100, desc="Loading tabular data"):
-            raw_text, label = line.iloc[self.text_col_id].strip(), line.iloc[self.label_col_id].strip()
-            for pattern, repl in self.mapping.items():
-                raw_text = raw_text.replace(pattern, repl)
+        The file is parsed by `pandas.read_csv` chunk by chunk, and the stripping and `mapping` replacements 
+        are applied column-wise, before the tokens are built for the whole chunk. 
+        """
+        df_chunks = pandas.read_csv(file_path, encoding=self.encoding, sep=self.sep, header=self.header, dtype=str, na_filter=False, engine=self.engine, chunksize=chunksize)
+        with tqdm.tqdm(disable=not self.verbose, ncols=100, desc="Loading tabular data") as pbar:
+            for df in df_chunks:
+                raw_texts = df.iloc[:, self.text_col_id].str.strip()
+                for pattern, repl in self.mapping.items():
+                    raw_texts = raw_texts.str.replace(pattern, repl, regex=False)
+                labels = df.iloc[:, self.label_col_id].str.strip()
                 
-            tokens = self._build_tokens(raw_text)
-            data.append({'tokens': tokens, 'label': label})
-            
+                yield [{'tokens': tokens, 'label': label} for tokens, label in zip(self._build_tokens_batch(raw_texts.tolist()), labels.tolist())]
+                pbar.update(df.shape[0])
+        
+        
+    @cached_read
+    def read(self, file_path):
+        data = []
+        with _gc_disabled():
+            for chunk in self.iter_chunks(file_path):
+                data.extend(chunk)
         return data
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from typing import List
+from collections import OrderedDict
 import logging
 import re
 import tqdm
@@ -17,6 +18,7 @@ from ..config import Config
 logger = logging.getLogger(__name__)
 
 
+
 class BertLikeConfig(Config):
     def __init__(self, **kwargs):
         self.tokenizer: transformers.PreTrainedTokenizer = kwargs.pop('tokenizer')
@@ -34,6 +36,17 @@ class BertLikeConfig(Config):
         self.agg_mode = kwargs.pop('agg_mode', 'mean')
         self.mix_layers = kwargs.pop('mix_layers', 'top')
         self.use_gamma = kwargs.pop('use_gamma', False)
+        # The maximum length (including `[CLS]` and `[SEP]`) that the model accepts
+        self.max_len = _max_len_of(self.tokenizer, self.bert_like)
+        # Encode sequences longer than `max_len` by strided sliding windows
+        self.sliding_window = kwargs.pop('sliding_window', False)
+        self.window_stride = kwargs.pop('window_stride', (self.max_len - 2) // 2)
+        if self.sliding_window and not 0 < self.window_stride <= self.max_len - 2:
+            raise ValueError(f"`window_stride` should be in (0, {self.max_len - 2}], but got {self.window_stride}")
+        # Pack several sequences into one row of at most `max_len` sub-tokens
+        self.packing = kwargs.pop('packing', False)
+        assert not (self.sliding_window and self.packing)
+        self.sub_tok_cache = SubTokenCache(self.tokenizer, max_size=kwargs.pop('sub_tok_cache_size', 100000))
         
         super().__init__(**kwargs)
         
@@ -47,6 +60,18 @@ class BertLikeConfig(Config):
         state['bert_like'] = None
         return state
         
+    def __setstate__(self, state: dict):
+        # Configs pickled without the sub-token cache, sliding windows or packing
+        if 'sub_tok_cache' not in state:
+            state['sub_tok_cache'] = SubTokenCache(state['tokenizer'])
+        if 'max_len' not in state:
+            state['max_len'] = state['tokenizer'].model_max_length
+        if 'sliding_window' not in state:
+            state.update(sliding_window=False, window_stride=(state['max_len'] - 2) // 2)
+        if 'packing' not in state:
+            state['packing'] = False
+        self.__dict__.update(state)
+        
     @property
     def sentence_A_id(self):
         # token_type_ids: 
@@ -74,8 +99,8 @@ class BertLikeConfig(Config):
             A 1D tensor of sub-token indexes.
         """
         sub_tokens = self.tokenizer.tokenize(raw_text)
-        # Sequence longer than maximum length should be pre-processed
-        assert len(sub_tokens) <= self.tokenizer.model_max_length - 2
+        # Sequence longer than maximum length should be pre-processed, unless encoded by sliding windows
+        assert self.sliding_window or len(sub_tokens) <= self.max_len - 2
         
         sub_tok_ids = [self.tokenizer.cls_token_id] + self.tokenizer.convert_tokens_to_ids(sub_tokens) + [self.tokenizer.sep_token_id]
         
@@ -106,25 +131,56 @@ class BertLikeConfig(Config):
         ori_indexes: torch.LongTensor
             A 1D tensor indicating each sub-token's original index in `tokenized_raw_text`.
         """
-        nested_sub_tokens = _tokenized2nested(tokenized_raw_text, self.tokenizer)
-        sub_tokens = [sub_tok for i, tok in enumerate(nested_sub_tokens) for sub_tok in tok]
-        ori_indexes = [i for i, tok in enumerate(nested_sub_tokens) for sub_tok in tok]
-        # Sequence longer than maximum length should be pre-processed
-        assert len(sub_tokens) <= self.tokenizer.model_max_length - 2
-        
-        sub_tok_ids = [self.tokenizer.cls_token_id] + self.tokenizer.convert_tokens_to_ids(sub_tokens) + [self.tokenizer.sep_token_id]
+        nested_sub_tok_ids = self.sub_tok_cache(tokenized_raw_text)
+        sub_tokens = [sub_tok for i, tok in enumerate(nested_sub_tok_ids) for sub_tok in tok]
+        ori_indexes = [i for i, tok in enumerate(nested_sub_tok_ids) for sub_tok in tok]
+        # Sequence longer than maximum length should be pre-processed, unless encoded by sliding windows
+        assert self.sliding_window or len(sub_tokens) <= self.max_len - 2
         
-        if self.paired_inputs:
-            # NOTE: `[SEP]` will be retained by tokenizer, instead of being tokenized
-            sep_loc = sub_tokens.index(self.tokenizer.sep_token)
-            sub_tok_type_ids = [self.sentence_A_id] * (sep_loc+1 +1) + [self.sentence_B_id] * (len(sub_tokens)-sep_loc-1 +1)  # `[CLS]` and `[SEP]` at the ends
-        else:
-            sub_tok_type_ids = None
+        sub_tok_ids = [self.tokenizer.cls_token_id] + sub_tokens + [self.tokenizer.sep_token_id]
+        # NOTE: `[SEP]` will be retained by tokenizer, instead of being tokenized
+        sub_tok_type_ids = self._sub_tok_type_ids_from_ids(sub_tokens)
         
         # (step+2, ), (step+2, ), (step, )
         return sub_tok_ids, sub_tok_type_ids, ori_indexes
         
         
+    def _batch_token_ids_from_tokenized(self, tokenized_raw_text_list: List[List[str]]):
+        """
+        Batch version of `_token_ids_from_tokenized`, running the fast tokenizer over all the sentences at once. 
+        """
+        outputs = []
+        for sub_tokens, ori_indexes in _batch_tokenized2flat(tokenized_raw_text_list, self.tokenizer):
+            # Sequence longer than maximum length should be pre-processed, unless encoded by sliding windows
+            assert self.sliding_window or len(sub_tokens) <= self.max_len - 2
+            sub_tok_ids = [self.tokenizer.cls_token_id] + sub_tokens + [self.tokenizer.sep_token_id]
+            outputs.append((sub_tok_ids, self._sub_tok_type_ids_from_ids(sub_tokens), ori_indexes))
+        return outputs
+        
+        
+    def _batch_token_ids_from_string(self, raw_text_list: List[str]):
+        """
+        Batch version of `_token_ids_from_string`, running the fast tokenizer over all the sentences at once. 
+        """
+        encodings = self.tokenizer.backend_tokenizer.encode_batch(raw_text_list, add_special_tokens=False)
+        outputs = []
+        for enc in encodings:
+            sub_tokens = enc.ids
+            # Sequence longer than maximum length should be pre-processed, unless encoded by sliding windows
+            assert self.sliding_window or len(sub_tokens) <= self.max_len - 2
+            sub_tok_ids = [self.tokenizer.cls_token_id] + sub_tokens + [self.tokenizer.sep_token_id]
+            outputs.append((sub_tok_ids, self._sub_tok_type_ids_from_ids(sub_tokens)))
+        return outputs
+        
+        
+    def _sub_tok_type_ids_from_ids(self, sub_tokens: List[int]):
+        if self.paired_inputs:
+            sep_loc = sub_tokens.index(self.tokenizer.sep_token_id)
+            return [self.sentence_A_id] * (sep_loc+1 +1) + [self.sentence_B_id] * (len(sub_tokens)-sep_loc-1 +1)  # `[CLS]` and `[SEP]` at the ends
+        else:
+            return None
+        
+        
     def exemplify(self, tokens: TokenSequence):
         tokenized_raw_text = tokens.raw_text
         if self.use_truecase:
@@ -144,6 +200,36 @@ class BertLikeConfig(Config):
         return example
         
         
+    def precompute(self, tokens_list: List[TokenSequence]):
+        """Exemplify all the token sequences in one pass of a fast tokenizer; the `i`-th output equals `exemplify(tokens_list[i])`. 
+        
+        Return `None` if the tokenizer is not a fast one, or its backend has truncation/padding enabled. 
+        """
+        backend = getattr(self.tokenizer, 'backend_tokenizer', None)
+        if backend is None or backend.truncation is not None or backend.padding is not None:
+            return None
+        
+        tokenized_raw_text_list = [tokens.raw_text for tokens in tokens_list]
+        if self.use_truecase:
+            tokenized_raw_text_list = [_truecase(tokenized_raw_text) for tokenized_raw_text in tokenized_raw_text_list]
+        
+        examples = []
+        if self.from_tokenized:
+            for sub_tok_ids, sub_tok_type_ids, ori_indexes in self._batch_token_ids_from_tokenized(tokenized_raw_text_list):
+                examples.append({'sub_tok_ids': torch.tensor(sub_tok_ids), 
+                                 'ori_indexes': torch.tensor(ori_indexes)})
+                if self.paired_inputs:
+                    examples[-1].update({'sub_tok_type_ids': torch.tensor(sub_tok_type_ids)})
+        else:
+            # AD-HOC: Use rejoined tokenized raw text here
+            raw_text_list = [" ".join(tokenized_raw_text) for tokenized_raw_text in tokenized_raw_text_list]
+            for sub_tok_ids, sub_tok_type_ids in self._batch_token_ids_from_string(raw_text_list):
+                examples.append({'sub_tok_ids': torch.tensor(sub_tok_ids)})
+                if self.paired_inputs:
+                    examples[-1].update({'sub_tok_type_ids': torch.tensor(sub_tok_type_ids)})
+        return examples
+        
+        
     def batchify(self, batch_ex: List[dict]):
         batch_sub_tok_ids = [ex['sub_tok_ids'] for ex in batch_ex]
         sub_tok_seq_lens = torch.tensor([sub_tok_ids.size(0) for sub_tok_ids in batch_sub_tok_ids])
@@ -168,9 +254,49 @@ class BertLikeConfig(Config):
                                                                      batch_first=True, 
                                                                      padding_value=self.sentence_A_id)
             batch.update({'sub_tok_type_ids': batch_sub_tok_type_ids})
+        
+        if self.packing:
+            batch.update(self._pack(batch_ex))
         return batch
         
         
+    def _pack(self, batch_ex: List[dict]):
+        """Pack the examples into rows of at most `max_len` sub-tokens, each example keeping its `[CLS]` and `[SEP]`. 
+        
+        The packed `sub_tok_ids` (and `sub_tok_type_ids`) replace the padded ones, while `sub_mask` is still the per-example mask. 
+        `segment_ids` indicates the example of each packed sub-token (-1 for padding), and `unpack_indexes` the index of 
+        each example's sub-token in the flattened packed hidden states (with `[CLS]` and `[SEP]` removed from each row). 
+        """
+        sub_tok_seq_lens = [ex['sub_tok_ids'].size(0) for ex in batch_ex]
+        rows = _pack_seq_lens(sub_tok_seq_lens, self.max_len)
+        row_step = max(sum(sub_tok_seq_lens[k] for k in row) for row in rows)
+        
+        packed_sub_tok_ids = torch.full((len(rows), row_step), self.tokenizer.pad_token_id, dtype=torch.long)
+        packed_sub_tok_type_ids = torch.full((len(rows), row_step), self.sentence_A_id, dtype=torch.long)
+        position_ids = torch.zeros(len(rows), row_step, dtype=torch.long)
+        segment_ids = torch.full((len(rows), row_step), -1, dtype=torch.long)
+        unpack_indexes = torch.zeros(len(batch_ex), max(sub_tok_seq_lens)-2, dtype=torch.long)
+        for r, row in enumerate(rows):
+            start = 0
+            for k in row:
+                end = start + sub_tok_seq_lens[k]
+                packed_sub_tok_ids[r, start:end] = batch_ex[k]['sub_tok_ids']
+                if self.paired_inputs:
+                    packed_sub_tok_type_ids[r, start:end] = batch_ex[k]['sub_tok_type_ids']
+                position_ids[r, start:end] = torch.arange(sub_tok_seq_lens[k])
+                segment_ids[r, start:end] = k
+                unpack_indexes[k, :sub_tok_seq_lens[k]-2] = r*(row_step-2) + start + torch.arange(sub_tok_seq_lens[k]-2)
+                start = end
+        
+        packed = {'sub_tok_ids': packed_sub_tok_ids, 
+                  'position_ids': position_ids, 
+                  'segment_ids': segment_ids, 
+                  'unpack_indexes': unpack_indexes}
+        if self.paired_inputs:
+            packed.update({'sub_tok_type_ids': packed_sub_tok_type_ids})
+        return packed
+        
+        
     def instantiate(self):
         return BertLikeEmbedder(self)
 
@@ -194,6 +320,16 @@ class BertLikeEmbedder(torch.nn.Module):
         self.mix_layers = config.mix_layers
         self.use_gamma = config.use_gamma
         
+        self.sliding_window = config.sliding_window
+        if self.sliding_window:
+            self.max_len = config.max_len
+            self.window_stride = config.window_stride
+            self.pad_id = config.tokenizer.pad_token_id
+            assert 0 < self.window_stride <= self.max_len - 2
+        
+        # The position ids of RoBERTa-like models start after the padding index
+        self.position_offset = getattr(getattr(self.bert_like, 'embeddings', None), 'padding_idx', -1) + 1
+        
         if self.from_tokenized:
             self.group_aggregating = SequenceGroupAggregating(mode=config.agg_mode)
         if self.mix_layers.lower() == 'trainable':
@@ -211,17 +347,22 @@ class BertLikeEmbedder(torch.nn.Module):
         self.bert_like.requires_grad_(not freeze)
         
         
-    def forward(self, 
-                sub_tok_ids: torch.LongTensor, 
-                sub_mask: torch.BoolTensor, 
-                sub_tok_type_ids: torch.BoolTensor=None, 
-                ori_indexes: torch.LongTensor=None):
+    def _forward_hidden(self, 
+                        sub_tok_ids: torch.LongTensor, 
+                        sub_mask: torch.BoolTensor, 
+                        sub_tok_type_ids: torch.BoolTensor=None, 
+                        attention_mask: torch.Tensor=None, 
+                        position_ids: torch.LongTensor=None):
+        if attention_mask is None:
+            attention_mask = (~sub_mask).long()
+        
         # last_hidden: (batch, sub_tok_step+2, hid_dim)
         # pooler_output: (batch, hid_dim)
         # hidden: a tuple of (batch, sub_tok_step+2, hid_dim)
         bert_outs = self.bert_like(input_ids=sub_tok_ids, 
-                                   attention_mask=(~sub_mask).long(), 
+                                   attention_mask=attention_mask, 
                                    token_type_ids=sub_tok_type_ids, 
+                                   position_ids=position_ids, 
                                    output_hidden_states=True)
         bert_hidden = bert_outs['hidden_states']
         
@@ -237,8 +378,99 @@ class BertLikeEmbedder(torch.nn.Module):
             bert_hidden = self.gamma * bert_hidden
         
         # Remove the `[CLS]` and `[SEP]` positions. 
-        bert_hidden = bert_hidden[:, 1:-1]
-        sub_mask = sub_mask[:, 2:]
+        return bert_hidden[:, 1:-1]
+        
+        
+    def _forward_sliding_windows(self, 
+                                 sub_tok_ids: torch.LongTensor, 
+                                 sub_mask: torch.BoolTensor, 
+                                 sub_tok_type_ids: torch.BoolTensor=None):
+        """Encode overlong sequences by strided sliding windows in one forward pass, and merge the windows back, 
+        by choosing for each sub-token the window where it has the most context (i.e., the farthest from either end). 
+        """
+        window_size = self.max_len - 2
+        num_sub_tokens = ((~sub_mask).sum(dim=1) - 2).tolist()
+        
+        windows, windows_type_ids, spans = [], [], []
+        for k, curr_len in enumerate(num_sub_tokens):
+            last_start = max(curr_len - window_size, 0)
+            for start in list(range(0, last_start, self.window_stride)) + [last_start]:
+                end = min(start + window_size, curr_len)
+                # `[CLS]`, the sub-tokens inside the window, `[SEP]`
+                window_indexes = torch.tensor([0] + list(range(start+1, end+1)) + [curr_len+1], device=sub_tok_ids.device)
+                windows.append(sub_tok_ids[k, window_indexes])
+                if sub_tok_type_ids is not None:
+                    windows_type_ids.append(sub_tok_type_ids[k, window_indexes])
+                spans.append((k, start, end))
+        
+        window_seq_lens = torch.tensor([window.size(0) for window in windows], device=sub_tok_ids.device)
+        windows = torch.nn.utils.rnn.pad_sequence(windows, batch_first=True, padding_value=self.pad_id)
+        if sub_tok_type_ids is not None:
+            windows_type_ids = torch.nn.utils.rnn.pad_sequence(windows_type_ids, batch_first=True, padding_value=0)
+        else:
+            windows_type_ids = None
+        
+        # window_hidden: (num_windows, window_step, hid_dim)
+        window_hidden = self._forward_hidden(windows, seq_lens2mask(window_seq_lens), windows_type_ids)
+        num_windows, window_step, hid_dim = window_hidden.size()
+        
+        # Index of each sub-token in the flattened `window_hidden`
+        flat_indexes = torch.zeros(sub_tok_ids.size(0), sub_tok_ids.size(1)-2, dtype=torch.long)
+        best_context = torch.full_like(flat_indexes, -1)
+        for i, (k, start, end) in enumerate(spans):
+            positions = torch.arange(end - start)
+            context = torch.min(positions, end - start - 1 - positions)
+            is_better = context > best_context[k, start:end]
+            best_context[k, start:end] = torch.where(is_better, context, best_context[k, start:end])
+            flat_indexes[k, start:end] = torch.where(is_better, i*window_step + positions, flat_indexes[k, start:end])
+        
+        # bert_hidden: (batch, sub_tok_step, hid_dim)
+        return window_hidden.reshape(num_windows*window_step, hid_dim)[flat_indexes.to(window_hidden.device)]
+        
+        
+    def _forward_packed(self, 
+                        sub_tok_ids: torch.LongTensor, 
+                        position_ids: torch.LongTensor, 
+                        segment_ids: torch.LongTensor, 
+                        unpack_indexes: torch.LongTensor, 
+                        sub_tok_type_ids: torch.BoolTensor=None):
+        """Encode the sequences packed by `BertLikeConfig.batchify`, and unpack the hidden states to each sequence. 
+        """
+        # Block-diagonal attention: a sub-token only attends to the sub-tokens of the same sequence. 
+        # The padding positions attend to each other, to avoid fully masked (NaN) rows. 
+        # attention_mask: (num_rows, row_step, row_step)
+        attention_mask = (segment_ids.unsqueeze(2) == segment_ids.unsqueeze(1))
+        if hasattr(self.bert_like, 'get_extended_attention_mask'):
+            # `transformers` 4.x broadcasts 3D masks over heads in `get_extended_attention_mask`
+            attention_mask = attention_mask.long()
+        else:
+            # `transformers` v5 takes 4D masks of (batch, heads, query, key)
+            attention_mask = attention_mask.unsqueeze(1)
+        
+        # packed_hidden: (num_rows, row_step, hid_dim)
+        packed_hidden = self._forward_hidden(sub_tok_ids, None, sub_tok_type_ids, 
+                                             attention_mask=attention_mask, 
+                                             position_ids=position_ids+self.position_offset)
+        num_rows, row_step, hid_dim = packed_hidden.size()
+        
+        # bert_hidden: (batch, sub_tok_step, hid_dim)
+        return packed_hidden.reshape(num_rows*row_step, hid_dim)[unpack_indexes]
+        
+        
+    def forward(self, 
+                sub_tok_ids: torch.LongTensor, 
+                sub_mask: torch.BoolTensor, 
+                sub_tok_type_ids: torch.BoolTensor=None, 
+                ori_indexes: torch.LongTensor=None, 
+                position_ids: torch.LongTensor=None, 
+                segment_ids: torch.LongTensor=None, 
+                unpack_indexes: torch.LongTensor=None):
+        if segment_ids is not None:
+            bert_hidden = self._forward_packed(sub_tok_ids, position_ids, segment_ids, unpack_indexes, sub_tok_type_ids)
+        elif self.sliding_window and sub_tok_ids.size(1) > self.max_len:
+            bert_hidden = self._forward_sliding_windows(sub_tok_ids, sub_mask, sub_tok_type_ids)
+        else:
+            bert_hidden = self._forward_hidden(sub_tok_ids, sub_mask, sub_tok_type_ids)
         
         if self.from_tokenized:
             # bert_hidden: (batch, tok_step, hid_dim)
@@ -248,6 +480,21 @@ class BertLikeEmbedder(torch.nn.Module):
 
 
 
+def _max_len_of(tokenizer: transformers.PreTrainedTokenizer, bert_like: transformers.PreTrainedModel):
+    """The maximum sequence length (including `[CLS]` and `[SEP]`), i.e., `model_max_length` of the tokenizer, 
+    clamped by the position embeddings of the model. 
+    
+    `model_max_length` is a huge sentinel (`VERY_LARGE_INTEGER`) if the tokenizer is not configured with a real limit. 
+    """
+    max_len = tokenizer.model_max_length
+    max_positions = getattr(bert_like.config, 'max_position_embeddings', None)
+    if max_positions is not None:
+        # The position ids of RoBERTa-like models start after the padding index
+        position_offset = getattr(getattr(bert_like, 'embeddings', None), 'padding_idx', -1) + 1
+        max_len = min(max_len, max_positions - position_offset)
+    return max_len
+
+
 def _truecase(tokenized_raw_text: List[str]):
     """
     Get the truecased text. 
@@ -293,6 +540,121 @@ def _tokenized2nested(tokenized_raw_text: List[str], tokenizer: transformers.Pre
 
 
 
+class SubTokenCache(object):
+    """A size-bounded LRU cache mapping words to sub-token ids, bound to a tokenizer. 
+    
+    Each word is tokenized as in `_tokenized2nested`, i.e., a space-like word is mapped to the unknown token, 
+    and a very long word is truncated to `max_len` sub-tokens. 
+    
+    The cached entries are not pickled, so the cache is rebuilt in each (spawned) `DataLoader` worker. 
+    """
+    def __init__(self, tokenizer: transformers.PreTrainedTokenizer, max_size: int=100000, max_len: int=5):
+        self.tokenizer = tokenizer
+        self.max_size = max_size
+        self.max_len = max_len
+        self.clear()
+        
+    def clear(self):
+        self._cache = OrderedDict()
+        self.num_hits = 0
+        self.num_misses = 0
+        
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_cache=OrderedDict(), num_hits=0, num_misses=0)
+        return state
+        
+    def __len__(self):
+        return len(self._cache)
+        
+    def __repr__(self):
+        return f"{self.__class__.__name__}(size={len(self):,}, max_size={self.max_size:,}, hit_rate={self.hit_rate*100:.2f}%)"
+        
+    @property
+    def hit_rate(self):
+        num_lookups = self.num_hits + self.num_misses
+        return self.num_hits / num_lookups if num_lookups > 0 else 0.0
+        
+    def lookup(self, word: str):
+        sub_tok_ids = self._cache.get(word)
+        if sub_tok_ids is not None:
+            self.num_hits += 1
+            self._cache.move_to_end(word)
+            return sub_tok_ids
+        
+        self.num_misses += 1
+        sub_tok_ids = self.tokenizer.convert_tokens_to_ids(_tokenized2nested([word], self.tokenizer, max_len=self.max_len)[0])
+        if self.max_size > 0:
+            if len(self._cache) >= self.max_size:
+                self._cache.popitem(last=False)
+            self._cache[word] = sub_tok_ids
+        return sub_tok_ids
+        
+    def __call__(self, tokenized_raw_text: List[str]):
+        return [self.lookup(word) for word in tokenized_raw_text]
+
+
+
+def _batch_tokenized2flat(tokenized_raw_text_list: List[List[str]], tokenizer: transformers.PreTrainedTokenizerFast, max_len: int=5):
+    """Batch version of `_tokenized2nested`, returning the flattened sub-token ids and their original word indexes. 
+    
+    The backend tokenizer encodes the pre-tokenized words separately, which is equivalent to tokenizing word by word. 
+    The backend is used directly, since the `is_split_into_words` option of some wrappers (e.g., RoBERTa) requires 
+    `add_prefix_space=True`, which changes the sub-tokens. 
+    """
+    encodings = tokenizer.backend_tokenizer.encode_batch(tokenized_raw_text_list, is_pretokenized=True, add_special_tokens=False)
+    outputs = []
+    for tokenized_raw_text, enc in zip(tokenized_raw_text_list, encodings):
+        sub_tokens, word_ids = enc.ids, enc.word_ids
+        num_sub_tokens = numpy.bincount(numpy.array(word_ids, dtype=int), minlength=len(tokenized_raw_text))
+        if len(tokenized_raw_text) > 0 and (num_sub_tokens.min() == 0 or num_sub_tokens.max() > max_len):
+            nested_sub_tokens = [[] for _ in tokenized_raw_text]
+            for sub_tok, i in zip(sub_tokens, word_ids):
+                nested_sub_tokens[i].append(sub_tok)
+            # Space-like words are replaced by the unknown token; very long words (e.g., urls) are truncated
+            nested_sub_tokens = [tok[:max_len] if len(tok) > 0 else [tokenizer.unk_token_id] for tok in nested_sub_tokens]
+            sub_tokens = [sub_tok for i, tok in enumerate(nested_sub_tokens) for sub_tok in tok]
+            word_ids = [i for i, tok in enumerate(nested_sub_tokens) for sub_tok in tok]
+        outputs.append((sub_tokens, word_ids))
+    
+    return outputs
+
+
+
+def _pack_seq_lens(seq_lens: List[int], max_len: int):
+    """Pack sequences into rows of at most `max_len` by first-fit decreasing, returning the sequence indexes in each row. 
+    
+    The row capacity is chosen from `max_len` and the longest length times powers of two, to minimize the padded size 
+    (i.e., number of rows times the longest row), since a few long rows may be padded more than many short rows. 
+    """
+    capacities = [max_len]
+    capacity = max(seq_lens)
+    while capacity < max_len:
+        capacities.append(capacity)
+        capacity *= 2
+    
+    order = sorted(range(len(seq_lens)), key=lambda k: seq_lens[k], reverse=True)
+    best_size, best_rows = None, None
+    for capacity in capacities:
+        rows, row_lens = [], []
+        for k in order:
+            for r, row_len in enumerate(row_lens):
+                if row_len + seq_lens[k] <= capacity:
+                    rows[r].append(k)
+                    row_lens[r] += seq_lens[k]
+                    break
+            else:
+                rows.append([k])
+                row_lens.append(seq_lens[k])
+        
+        size = len(rows) * max(row_lens)
+        if best_size is None or size < best_size:
+            best_size, best_rows = size, rows
+    
+    return best_rows
+
+
+
 def _truncate_tokens(tokens: TokenSequence, sub_tok_seq_lens: List[int], max_len: int, mode: str='head+tail'):
     if mode.lower() == 'head-only':
         head_len, tail_len = max_len, 0
@@ -328,7 +690,9 @@ def _truncate_tokens(tokens: TokenSequence, sub_tok_seq_lens: List[int], max_len
 def truncate_for_bert_like(data: list, 
                            tokenizer: transformers.PreTrainedTokenizer, 
                            mode: str='head+tail', 
-                           verbose=True):
+                           verbose=True, 
+                           sub_tok_cache: SubTokenCache=None, 
+                           max_len: int=None):
     """Truncate overlong tokens in `data`, typically for text classification. 
     
     Truncation methods:
@@ -336,63 +700,78 @@ def truncate_for_bert_like(data: list,
         2. tail-only: keep the last 510 tokens;
         3. head+tail: empirically select the first 128 and the last 382 tokens.
     
+    `sub_tok_cache` (e.g., `BertLikeConfig.sub_tok_cache`) is shared with the other preprocessing steps if specified. 
+    `max_len` (e.g., `BertLikeConfig.max_len`) includes the special tokens, and defaults to `model_max_length` of the tokenizer. 
+    
     References
     ----------
     [1] Sun et al. 2019. How to fine-tune BERT for text classification? CCL 2019. 
     """
+    if sub_tok_cache is None:
+        sub_tok_cache = SubTokenCache(tokenizer)
+    assert sub_tok_cache.tokenizer is tokenizer
+    if max_len is None:
+        max_len = tokenizer.model_max_length
+    
     num_truncated = 0
     for entry in tqdm.tqdm(data, disable=not verbose, ncols=100, desc="Truncating data"):
         tokens = entry['tokens']
-        nested_sub_tokens = _tokenized2nested(tokens.raw_text, tokenizer)
+        nested_sub_tokens = sub_tok_cache(tokens.raw_text)
         sub_tok_seq_lens = [len(tok) for tok in nested_sub_tokens]
         
         if 'paired_tokens' not in entry:
             # Case for single sentence 
-            max_len = tokenizer.model_max_length - 2
-            if sum(sub_tok_seq_lens) > max_len:
-                entry['tokens'] = _truncate_tokens(tokens, sub_tok_seq_lens, max_len, mode=mode)
+            if sum(sub_tok_seq_lens) > max_len - 2:
+                entry['tokens'] = _truncate_tokens(tokens, sub_tok_seq_lens, max_len - 2, mode=mode)
                 num_truncated += 1
         
         else:
             # Case for paired sentences
             p_tokens = entry['paired_tokens']
-            p_nested_sub_tokens = _tokenized2nested(p_tokens.raw_text, tokenizer)
+            p_nested_sub_tokens = sub_tok_cache(p_tokens.raw_text)
             p_sub_tok_seq_lens = [len(tok) for tok in p_nested_sub_tokens]
             
-            max_len = tokenizer.model_max_length - 3
+            max_pair_len = max_len - 3
             num_sub_toks, num_p_sub_toks = sum(sub_tok_seq_lens), sum(p_sub_tok_seq_lens)
             
-            if num_sub_toks + num_p_sub_toks > max_len:
+            if num_sub_toks + num_p_sub_toks > max_pair_len:
                 # AD-HOC: Other ratio?
-                max_len1 = max_len // 2
+                max_len1 = max_pair_len // 2
                 if num_sub_toks <= max_len1:
-                    entry['paired_tokens'] = _truncate_tokens(p_tokens, p_sub_tok_seq_lens, max_len-num_sub_toks, mode=mode)
-                elif num_p_sub_toks <= max_len-max_len1:
-                    entry['tokens'] = _truncate_tokens(tokens, sub_tok_seq_lens, max_len-num_p_sub_toks, mode=mode)
+                    entry['paired_tokens'] = _truncate_tokens(p_tokens, p_sub_tok_seq_lens, max_pair_len-num_sub_toks, mode=mode)
+                elif num_p_sub_toks <= max_pair_len-max_len1:
+                    entry['tokens'] = _truncate_tokens(tokens, sub_tok_seq_lens, max_pair_len-num_p_sub_toks, mode=mode)
                 else:
                     entry['tokens'] = _truncate_tokens(tokens, sub_tok_seq_lens, max_len1, mode=mode)
-                    entry['paired_tokens'] = _truncate_tokens(p_tokens, p_sub_tok_seq_lens, max_len-max_len1, mode=mode)
+                    entry['paired_tokens'] = _truncate_tokens(p_tokens, p_sub_tok_seq_lens, max_pair_len-max_len1, mode=mode)
                 num_truncated += 1
     
     logger.info(f"Truncated sequences: {num_truncated} ({num_truncated/len(data)*100:.2f}%)")
+    logger.info(f"Sub-token cache: {sub_tok_cache}")
     return data
 
 
 
-def segment_uniformly_for_bert_like(data: list, tokenizer: transformers.PreTrainedTokenizer, update_raw_idx: bool=False, verbose=True):
+def segment_uniformly_for_bert_like(data: list, tokenizer: transformers.PreTrainedTokenizer, update_raw_idx: bool=False, verbose=True, sub_tok_cache: SubTokenCache=None, max_len: int=None):
     """Segment overlong tokens in `data`. 
     
+    `sub_tok_cache` (e.g., `BertLikeConfig.sub_tok_cache`) is shared with the other preprocessing steps if specified. 
+    `max_len` (e.g., `BertLikeConfig.max_len`) includes the special tokens, and defaults to `model_max_length` of the tokenizer. 
+    
     Notes: Currently only supports entity recognition. 
     """
     assert 'relations' not in data[0]
     assert 'attributes' not in data[0]
+    if sub_tok_cache is None:
+        sub_tok_cache = SubTokenCache(tokenizer)
+    assert sub_tok_cache.tokenizer is tokenizer
     
-    max_len = tokenizer.model_max_length - 2
+    max_len = (tokenizer.model_max_length if max_len is None else max_len) - 2
     new_data = []
     num_segmented = 0
     for raw_idx, entry in enumerate(tqdm.tqdm(data, disable=not verbose, ncols=100, desc="Segmenting data")):
         tokens, chunks = entry['tokens'], entry['chunks']
-        nested_sub_tokens = _tokenized2nested(tokens.raw_text, tokenizer)
+        nested_sub_tokens = sub_tok_cache(tokens.raw_text)
         sub_tok_seq_lens = [len(tok) for tok in nested_sub_tokens]
         
         num_sub_tokens = sum(sub_tok_seq_lens)
@@ -439,4 +818,5 @@ def segment_uniformly_for_bert_like(data: list, tokenizer: transformers.PreTrain
         new_data.extend(new_entries)
     
     logger.info(f"Segmented sequences: {num_segmented} ({num_segmented/len(data)*100:.2f}%)")
+    logger.info(f"Sub-token cache: {sub_tok_cache}")
     return new_data
@@ -1,20 +1,88 @@
 # -*- coding: utf-8 -*-
 from typing import List
-from collections import Counter
 import logging
+import numpy
 import torch
 
 from ..token import TokenSequence
 from ..nn import SinusoidPositionalEncoding
 from ..nn.init import reinit_embedding_, reinit_embedding_by_pretrained_, reinit_layer_
 from ..config import Config
-from ..vocab import Vocab
+from ..vocab import Vocab, count_tokens
 from ..vectors import Vectors
 
 logger = logging.getLogger(__name__)
 
 
 
+class FlatSequences(object):
+    """A list of variable-length tensors, stored compactly as a flat tensor with offsets. 
+    
+    The `i`-th tensor is `values[offsets[i]:offsets[i+1]]`, so indexing is a pure slice (returning a view). 
+    """
+    def __init__(self, values: torch.Tensor, offsets: numpy.ndarray):
+        self.values = values
+        self.offsets = offsets
+        
+    def __len__(self):
+        return len(self.offsets) - 1
+        
+    def __getitem__(self, i: int):
+        return self.values[int(self.offsets[i]):int(self.offsets[i+1])]
+
+
+
+class SparseFlatSequences(object):
+    """A list of variable-length 2D tensors, stored compactly as the column indices (and values) of non-zero elements. 
+    
+    The `i`-th tensor consists of rows from `offsets[i]` to `offsets[i+1]`, where the non-zero elements of the `j`-th 
+    row are at `indices[indptr[j]:indptr[j+1]]`, with values of `values[indptr[j]:indptr[j+1]]` (or ones if `values` 
+    is None). Indexing restores the dense tensor of one sequence. 
+    """
+    def __init__(self, indices: torch.LongTensor, values: torch.Tensor, indptr: numpy.ndarray, offsets: numpy.ndarray, dim: int):
+        self.indices = indices
+        self.values = values
+        self.indptr = indptr
+        self.offsets = offsets
+        self.dim = dim
+        
+    def __len__(self):
+        return len(self.offsets) - 1
+        
+    def __getitem__(self, i: int):
+        start, end = int(self.offsets[i]), int(self.offsets[i+1])
+        nnz_start, nnz_end = int(self.indptr[start]), int(self.indptr[end])
+        rows = torch.from_numpy(numpy.repeat(numpy.arange(end-start), numpy.diff(self.indptr[start:end+1])))
+        dense = torch.zeros(end-start, self.dim)
+        dense[rows, self.indices[nnz_start:nnz_end]] = 1.0 if self.values is None else self.values[nnz_start:nnz_end]
+        return dense
+
+
+
+class NestedFlatSequences(object):
+    """A list of lists of variable-length tensors, stored compactly as flat tensors with offsets. 
+    
+    The `i`-th entry consists of the inner sequences from `outer_offsets[i]` to `outer_offsets[i+1]`. 
+    Multiple `values` (e.g., ids and frequencies) may share the same structure. 
+    """
+    def __init__(self, values: dict, inner_lens: numpy.ndarray, outer_offsets: numpy.ndarray):
+        self.values = values
+        self.inner_lens = inner_lens
+        self.inner_offsets = numpy.zeros(len(inner_lens)+1, dtype=numpy.int64)
+        numpy.cumsum(inner_lens, out=self.inner_offsets[1:])
+        self.outer_offsets = outer_offsets
+        
+    def __len__(self):
+        return len(self.outer_offsets) - 1
+        
+    def __getitem__(self, i: int):
+        start, end = self.outer_offsets[i], self.outer_offsets[i+1]
+        inner_lens = self.inner_lens[start:end].tolist()
+        start, end = int(self.inner_offsets[start]), int(self.inner_offsets[end])
+        return {name: list(values[start:end].split(inner_lens)) for name, values in self.values.items()}
+
+
+
 class VocabMixin(object):
     @property
     def voc_dim(self):
@@ -97,14 +165,14 @@ class OneHotConfig(Config, VocabMixin):
             x_list = x_list + ['<eos>']
         return x_list
         
-    def build_vocab(self, *partitions):
-        counter = Counter()
-        for data in partitions:
-            for entry in data:
-                field_seq = self._get_field(entry[self.tokens_key])
-                counter.update(field_seq)
-                if self.max_len is None or len(field_seq) > self.max_len:
-                    self.max_len = len(field_seq)
+    def _get_field_and_len(self, entry: dict):
+        field_seq = self._get_field(entry[self.tokens_key])
+        return field_seq, len(field_seq)
+        
+    def build_vocab(self, *partitions, num_workers: int=0):
+        counter, max_len = count_tokens(partitions, self._get_field_and_len, num_workers=num_workers)
+        if max_len is not None and (self.max_len is None or max_len > self.max_len):
+            self.max_len = max_len
         
         self.vocab = Vocab(counter, min_freq=self.min_freq, specials=self.specials, specials_first=True)
         
@@ -112,7 +180,13 @@ class OneHotConfig(Config, VocabMixin):
     def exemplify(self, tokens: TokenSequence):
         # It is generally recommended to return cpu tensors in multi-process loading. 
         # See https://pytorch.org/docs/stable/data.html#single-and-multi-process-data-loading
-        return torch.tensor([self.vocab[x] for x in self._get_field(tokens)], dtype=torch.long)
+        return torch.tensor(self.vocab.lookup_indices(self._get_field(tokens)), dtype=torch.long)
+        
+    def precompute(self, tokens_list: List[TokenSequence]):
+        """Exemplify all the token sequences in one pass; the `i`-th output equals `exemplify(tokens_list[i])`. 
+        """
+        ids, offsets = self.vocab.encode([self._get_field(tokens) for tokens in tokens_list])
+        return FlatSequences(torch.from_numpy(ids), offsets)
         
     def batchify(self, batch_ids: List[torch.LongTensor]):
         return torch.nn.utils.rnn.pad_sequence(batch_ids, batch_first=True, padding_value=self.pad_idx)
@@ -194,7 +268,36 @@ class MultiHotConfig(Config):
         self.in_dim = getattr(tokens, self.field)[0].shape[0]
         
     def exemplify(self, tokens: TokenSequence):
-        return torch.tensor(getattr(tokens, self.field), dtype=torch.float)
+        # NOTE: The features (e.g., `en_shape_features`) may be memoized read-only arrays shared across tokens; 
+        # stacking them in `numpy` first is much faster than building a tensor from a list of arrays. 
+        return torch.tensor(numpy.array(getattr(tokens, self.field)), dtype=torch.float)
+        
+    def precompute(self, tokens_list: List[TokenSequence]):
+        """Exemplify all the token sequences in one pass; the `i`-th output equals `exemplify(tokens_list[i])`. 
+        
+        Only the non-zero features are stored, since the multi-hot features are typically sparse. 
+        """
+        seq_lens = [len(tokens) for tokens in tokens_list]
+        offsets = numpy.zeros(len(seq_lens)+1, dtype=numpy.int64)
+        numpy.cumsum(seq_lens, out=offsets[1:])
+        
+        indices_list, values_list, row_nnz_list = [], [], []
+        for tokens, seq_len in zip(tokens_list, seq_lens):
+            # The dense features are materialized for one sequence at a time
+            seq_values = numpy.array(getattr(tokens, self.field), dtype=numpy.float32).reshape(seq_len, self.in_dim)
+            rows, indices = seq_values.nonzero()
+            indices_list.append(indices)
+            values_list.append(seq_values[rows, indices])
+            row_nnz_list.append(numpy.bincount(rows, minlength=seq_len))
+        
+        indices = numpy.concatenate(indices_list) if len(indices_list) > 0 else numpy.zeros(0, dtype=numpy.int64)
+        values = numpy.concatenate(values_list) if len(values_list) > 0 else numpy.zeros(0, dtype=numpy.float32)
+        indptr = numpy.zeros(offsets[-1]+1, dtype=numpy.int64)
+        if len(row_nnz_list) > 0:
+            numpy.cumsum(numpy.concatenate(row_nnz_list), out=indptr[1:])
+        # Binary features do not require the values
+        values = None if (values == 1).all() else torch.from_numpy(values)
+        return SparseFlatSequences(torch.from_numpy(indices.astype(numpy.int64)), values, indptr, offsets, self.in_dim)
         
     def batchify(self, batch_values: List[torch.FloatTensor]):
         return torch.nn.utils.rnn.pad_sequence(batch_values, batch_first=True, padding_value=0.0)
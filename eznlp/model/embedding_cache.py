@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+from typing import List
+import os
+import json
+import hashlib
+import numpy
+import torch
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+_storage_dtypes = {'float32': torch.float32, 'float16': torch.float16, 'bfloat16': torch.bfloat16}
+# `numpy` has no bfloat16, so bfloat16 outputs are saved as their int16 bit patterns
+_numpy_storage_dtypes = {'float32': numpy.float32, 'float16': numpy.float16, 'bfloat16': numpy.int16}
+
+
+def _tensor_bytes(x: torch.Tensor):
+    return x.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes()
+
+
+def _content_key(example: dict):
+    """The key of an example (i.e., the inputs of a pretrained embedder for one sentence). 
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    for name in sorted(example):
+        value = example[name]
+        hasher.update(name.encode('utf-8'))
+        if isinstance(value, torch.Tensor):
+            hasher.update(f"{value.dtype}{tuple(value.size())}".encode('utf-8'))
+            hasher.update(_tensor_bytes(value))
+        else:
+            hasher.update(repr(value).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+def _embedder_identity(embedder: torch.nn.Module):
+    """The identity of an embedder, which is stable across processes, and changes with any parameter or setting. 
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    for module_name, module in embedder.named_modules():
+        settings = {k: v for k, v in vars(module).items() if isinstance(v, (bool, int, float, str)) and k != 'training'}
+        hasher.update(f"{module_name}:{type(module).__qualname__}:{sorted(settings.items())}".encode('utf-8'))
+    for name, x in embedder.state_dict().items():
+        hasher.update(f"{name}:{x.dtype}{tuple(x.size())}".encode('utf-8'))
+        hasher.update(_tensor_bytes(x))
+    return f"{type(embedder).__name__}-{hasher.hexdigest()}"
+
+
+
+class EmbeddingCache(object):
+    """A cache of the outputs of a frozen pretrained embedder, keyed by the sentence contents. 
+    
+    The outputs are stored in RAM, or appended to a memory-mapped file in `cache_dir/identity.dtype` if `cache_dir`
+    is specified; the file cache can be shared across runs and processes. 
+    
+    Parameters
+    ----------
+    identity : str
+        The identity of the embedder (see `_embedder_identity`). 
+    cache_dir : str
+        The folder to store the outputs; stored in RAM if None. 
+    dtype : str
+        The storage dtype, `float32`, `float16` or `bfloat16`. 
+    """
+    def __init__(self, identity: str, cache_dir: str=None, dtype: str='float32'):
+        if dtype not in _storage_dtypes:
+            raise ValueError(f"Invalid storage dtype {dtype}")
+        self.identity = identity
+        self.cache_dir = cache_dir
+        self.dtype = dtype
+        self._open()
+        
+    def _open(self):
+        self._outputs = {}
+        self._index = {}
+        self._mmap = None
+        self.out_dim = None
+        if self.cache_dir is not None:
+            self.folder = f"{self.cache_dir}/{self.identity}.{self.dtype}"
+            os.makedirs(self.folder, exist_ok=True)
+            self._load_index()
+        
+    def __getstate__(self):
+        # The outputs in RAM are not pickled; the file cache is re-opened
+        state = self.__dict__.copy()
+        state.update(_outputs={}, _index={}, _mmap=None)
+        return state
+        
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._open()
+        
+    def __len__(self):
+        return len(self._outputs) if self.cache_dir is None else len(self._index)
+        
+    def __contains__(self, key: str):
+        return (key in self._outputs) if self.cache_dir is None else (key in self._index)
+        
+    def _load_index(self):
+        if os.path.exists(f"{self.folder}/meta.json"):
+            with open(f"{self.folder}/meta.json") as f:
+                self.out_dim = json.load(f)['out_dim']
+        if os.path.exists(f"{self.folder}/index.tsv"):
+            with open(f"{self.folder}/index.tsv", encoding='utf-8') as f:
+                for line in f:
+                    # Skip the line being written by another process
+                    if line.endswith("\n"):
+                        key, start, num_rows = line.split("\t")
+                        self._index[key] = (int(start), int(num_rows))
+        
+    def _read_rows(self, start: int, num_rows: int):
+        if self._mmap is None or start + num_rows > self._mmap.shape[0]:
+            total_rows = os.path.getsize(f"{self.folder}/data.bin") // (self.out_dim * numpy.dtype(_numpy_storage_dtypes[self.dtype]).itemsize)
+            self._mmap = numpy.memmap(f"{self.folder}/data.bin", dtype=_numpy_storage_dtypes[self.dtype], mode='r', shape=(total_rows, self.out_dim))
+        rows = torch.from_numpy(numpy.array(self._mmap[start:start+num_rows]))
+        return rows.view(torch.bfloat16) if self.dtype == 'bfloat16' else rows
+        
+    def get(self, key: str):
+        """Return the cached output of shape (step, out_dim) in the storage dtype, or None if not cached. 
+        """
+        if self.cache_dir is None:
+            return self._outputs.get(key)
+        elif key in self._index:
+            return self._read_rows(*self._index[key])
+        else:
+            return None
+        
+    def put_batch(self, keys: List[str], outputs: List[torch.Tensor]):
+        """Cache the outputs (each of shape (step, out_dim)) of the sentences not cached yet. 
+        """
+        new_items = [(key, x.detach().to(device='cpu', dtype=_storage_dtypes[self.dtype])) for key, x in zip(keys, outputs) if key not in self]
+        if self.cache_dir is None:
+            self._outputs.update(new_items)
+            return
+        if len(new_items) == 0:
+            return
+        
+        if self.out_dim is None:
+            self.out_dim = new_items[0][1].size(-1)
+            with open(f"{self.folder}/meta.json", 'w') as f:
+                json.dump({'identity': self.identity, 'dtype': self.dtype, 'out_dim': self.out_dim}, f)
+        
+        with open(f"{self.folder}/data.bin", 'ab') as data_f, open(f"{self.folder}/index.tsv", 'a', encoding='utf-8') as index_f:
+            if fcntl is not None:
+                fcntl.flock(data_f, fcntl.LOCK_EX)
+            try:
+                # Drop the incomplete row left by an interrupted writer
+                row_bytes = self.out_dim * numpy.dtype(_numpy_storage_dtypes[self.dtype]).itemsize
+                start = os.fstat(data_f.fileno()).st_size // row_bytes
+                data_f.truncate(start * row_bytes)
+                
+                # The data are flushed before the index, so that the indexed rows are always complete
+                index_lines = []
+                for key, x in new_items:
+                    data_f.write(_tensor_bytes(x))
+                    index_lines.append(f"{key}\t{start}\t{x.size(0)}\n")
+                    self._index[key] = (start, x.size(0))
+                    start += x.size(0)
+                data_f.flush()
+                index_f.write("".join(index_lines))
+                index_f.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(data_f, fcntl.LOCK_UN)
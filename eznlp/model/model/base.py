@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 from typing import List
+import logging
 import torch
 
 from ...wrapper import Batch
 from ...config import Config
+from ..embedding_cache import EmbeddingCache, _embedder_identity
+
+logger = logging.getLogger(__name__)
 
 
 class ModelConfigBase(Config):
@@ -15,6 +19,8 @@ class ModelConfigBase(Config):
       └─embedder
     """
     _all_names = []
+    # Whether `batchify` attaches the content keys of the pretrained inputs, which the embedding caches look up
+    _with_embedding_cache_keys = False
     
     @property
     def valid(self):
@@ -30,6 +36,12 @@ class ModelConfigBase(Config):
     def build_vocabs_and_dims(self, *partitions):
         raise NotImplementedError("Not Implemented `build_vocabs_and_dims`")
         
+    def precompute(self, data: List[dict]):
+        """Exemplify the parts that depend on the data entries only (e.g., vocabulary ids), for all entries at once. 
+        Return `None` if not supported. 
+        """
+        return None
+        
     def exemplify(self, entry: dict, training: bool=True):
         raise NotImplementedError("Not Implemented `exemplify`")
         
@@ -38,15 +50,74 @@ class ModelConfigBase(Config):
         
     def instantiate(self):
         raise NotImplementedError("Not Implemented `instantiate`")
+        
+    def enable_embedding_cache_keys(self):
+        """Attach the content keys of the pretrained inputs to each batch, as required by `ModelBase.enable_embedding_cache`. 
+        
+        The keys hash the inputs of every sentence, so they are not computed unless enabled. 
+        """
+        self._with_embedding_cache_keys = True
 
 
 
 class ModelBase(torch.nn.Module):
+    _pretrained_names = []
+    
     def __init__(self, config: ModelConfigBase):
         super().__init__()
         for name, c in config.__dict__.items():
-            if c is not None:
+            if c is not None and not name.startswith('_'):
                 setattr(self, name, c.instantiate())
+        self.embedding_caches = {}
+        
+    def enable_embedding_cache(self, cache_dir: str=None, dtype: str='float32'):
+        """Cache the outputs of the frozen pretrained embedders (i.e., without any trainable parameters), 
+        so that each sentence passes through them only once. 
+        
+        The outputs are computed in evaluation mode (i.e., without dropout), as in feature-based approaches. 
+        The cache of an embedder is dropped once any of its parameters becomes trainable. 
+        The batches should carry the content keys (see `ModelConfigBase.enable_embedding_cache_keys`). 
+        
+        Parameters
+        ----------
+        cache_dir : str
+            The folder to store the outputs in memory-mapped files, which can be shared across runs; stored in RAM if None. 
+        dtype : str
+            The storage dtype, `float32`, `float16` or `bfloat16`. 
+        """
+        for name in self._pretrained_names:
+            if hasattr(self, name) and name not in self.embedding_caches:
+                embedder = getattr(self, name)
+                if any(p.requires_grad for p in embedder.parameters()):
+                    logger.warning(f"The embedding cache is not enabled for `{name}`, which has trainable parameters")
+                else:
+                    self.embedding_caches[name] = EmbeddingCache(_embedder_identity(embedder), cache_dir=cache_dir, dtype=dtype)
+        
+    def _get_pretrained_hidden(self, name: str, batch: Batch):
+        embedder = getattr(self, name)
+        cache = self.__dict__.get('embedding_caches', {}).get(name)
+        if cache is not None and any(p.requires_grad for p in embedder.parameters()):
+            logger.warning(f"The embedding cache of `{name}` is dropped, since it has trainable parameters")
+            del self.embedding_caches[name]
+            cache = None
+        if cache is None:
+            return embedder(**getattr(batch, name))
+        
+        if not hasattr(batch, 'pretrained_keys'):
+            raise RuntimeError("The batch has no content keys for the embedding cache; "
+                               "invoke `enable_embedding_cache_keys` of the model config before batchifying")
+        keys = batch.pretrained_keys[name]
+        cached = [cache.get(key) for key in keys]
+        if all(x is not None for x in cached):
+            return torch.nn.utils.rnn.pad_sequence(cached, batch_first=True).to(device=batch.seq_lens.device, dtype=torch.float)
+        
+        training = embedder.training
+        embedder.eval()
+        with torch.no_grad():
+            hidden = embedder(**getattr(batch, name))
+        embedder.train(training)
+        cache.put_batch(keys, [x[:seq_len] for x, seq_len in zip(hidden, batch.seq_lens.tolist())])
+        return hidden
         
     def pretrained_parameters(self):
         raise NotImplementedError("Not Implemented `pretrained_parameters`")
@@ -9,6 +9,7 @@ from ..embedder import OneHotConfig
 from ..encoder import EncoderConfig
 from ..nested_embedder import SoftLexiconConfig
 from ..decoder import TextClassificationDecoderConfig
+from ..embedding_cache import _content_key
 from .base import ModelConfigBase, ModelBase
 
 
@@ -70,10 +71,10 @@ class ClassifierConfig(ModelConfigBase):
         full_hid_dim += sum(getattr(self, name).out_dim for name in self._pretrained_names if getattr(self, name) is not None)
         return full_hid_dim
         
-    def build_vocabs_and_dims(self, *partitions):
+    def build_vocabs_and_dims(self, *partitions, num_workers: int=0):
         if self.ohots is not None:
             for c in self.ohots.values():
-                c.build_vocab(*partitions)
+                c.build_vocab(*partitions, num_workers=num_workers)
         
         if self.mhots is not None:
             for c in self.mhots.values():
@@ -81,10 +82,10 @@ class ClassifierConfig(ModelConfigBase):
         
         if self.nested_ohots is not None:
             for c in self.nested_ohots.values():
-                c.build_vocab(*partitions)
+                c.build_vocab(*partitions, num_workers=num_workers)
                 if isinstance(c, SoftLexiconConfig):
                     # Skip the last split (assumed to be test set)
-                    c.build_freqs(*partitions[:-1])
+                    c.build_freqs(*partitions[:-1], num_workers=num_workers)
         
         if self.intermediate1 is not None:
             self.intermediate1.in_dim = self.full_emb_dim
@@ -98,21 +99,31 @@ class ClassifierConfig(ModelConfigBase):
         self.decoder.build_vocab(*partitions)
         
         
-    def exemplify(self, data_entry: dict, training: bool=True):
-        example = {}
+    def precompute(self, data: List[dict]):
+        tokens_list = [data_entry['tokens'] for data_entry in data]
+        # Embedder configs without `precompute` (e.g., user-defined ones) are exemplified on the fly
+        precomputed = {name: {f: c.precompute(tokens_list) for f, c in getattr(self, name).items() if hasattr(c, 'precompute')} 
+                           for name in self._embedder_names if getattr(self, name) is not None}
         
-        if self.ohots is not None:
-            example['ohots'] = {f: c.exemplify(data_entry['tokens']) for f, c in self.ohots.items()}
+        if self.bert_like is not None and hasattr(self.bert_like, 'precompute'):
+            bert_like_examples = self.bert_like.precompute(tokens_list)
+            if bert_like_examples is not None:
+                precomputed['bert_like'] = bert_like_examples
+        return precomputed
         
-        if self.mhots is not None:
-            example['mhots'] = {f: c.exemplify(data_entry['tokens']) for f, c in self.mhots.items()}
         
-        if self.nested_ohots is not None:
-            example['nested_ohots'] = {f: c.exemplify(data_entry['tokens']) for f, c in self.nested_ohots.items()}
+    def exemplify(self, data_entry: dict, training: bool=True, precomputed: dict=None):
+        precomputed = {} if precomputed is None else precomputed
+        example = {}
+        for name in self._embedder_names:
+            if getattr(self, name) is not None:
+                name_precomputed = precomputed.get(name, {})
+                example[name] = {f: name_precomputed[f] if f in name_precomputed else c.exemplify(data_entry['tokens']) 
+                                     for f, c in getattr(self, name).items()}
         
         for name in self._pretrained_names:
             if getattr(self, name) is not None:
-                example[name] = getattr(self, name).exemplify(data_entry['tokens'])
+                example[name] = precomputed[name] if name in precomputed else getattr(self, name).exemplify(data_entry['tokens'])
         
         example.update(self.decoder.exemplify(data_entry, training=training))
         return example
@@ -133,6 +144,9 @@ class ClassifierConfig(ModelConfigBase):
         for name in self._pretrained_names:
             if getattr(self, name) is not None:
                 batch[name] = getattr(self, name).batchify([ex[name] for ex in batch_examples])
+                if self._with_embedding_cache_keys:
+                    # The keys of the embedding cache
+                    batch.setdefault('pretrained_keys', {})[name] = [_content_key(ex[name]) for ex in batch_examples]
         
         # Replace mask/seq_lens if re-tokenization
         if self._is_re_tokenized:
@@ -151,6 +165,8 @@ class ClassifierConfig(ModelConfigBase):
 
 
 class Classifier(ModelBase):
+    _pretrained_names = ClassifierConfig._pretrained_names
+    
     def __init__(self, config: ClassifierConfig):
         super().__init__(config)
         
@@ -185,7 +201,7 @@ class Classifier(ModelBase):
         
         for name in ClassifierConfig._pretrained_names:
             if hasattr(self, name):
-                full_hidden.append(getattr(self, name)(**getattr(batch, name)))
+                full_hidden.append(self._get_pretrained_hidden(name, batch))
         
         full_hidden = torch.cat(full_hidden, dim=-1)
         
@@ -26,8 +26,8 @@ class Text2TextConfig(ModelConfigBase):
         self.decoder = kwargs.pop('decoder', GeneratorConfig(embedding=OneHotConfig(tokens_key='trg_tokens', field='text', has_sos=True, has_eos=True)))
         super().__init__(**kwargs)
         
-    def build_vocabs_and_dims(self, *partitions):
-        self.embedder.build_vocab(*partitions)
+    def build_vocabs_and_dims(self, *partitions, num_workers: int=0):
+        self.embedder.build_vocab(*partitions, num_workers=num_workers)
         self.decoder.build_vocab(*partitions)
         self.encoder.in_dim = self.embedder.out_dim
         self.decoder.in_dim = self.encoder.out_dim
@@ -1,13 +1,14 @@
 # -*- coding: utf-8 -*-
 from typing import List
-from collections import Counter
+import itertools
+import numpy
 import torch
 
-from ..token import TokenSequence
-from ..vocab import Vocab
+from ..token import TokenSequence, SoftLexicon
+from ..vocab import Vocab, count_tokens
 from ..nn.modules import SequencePooling
 from ..nn.functional import seq_lens2mask
-from .embedder import OneHotConfig, OneHotEmbedder
+from .embedder import OneHotConfig, OneHotEmbedder, NestedFlatSequences
 from .encoder import EncoderConfig, RNNEncoder
 
 
@@ -53,26 +54,56 @@ class NestedOneHotConfig(OneHotConfig):
             else:
                 yield from tok_field
         
+    def _flattened_inner_sequences(self, tokens: TokenSequence):
+        """Return the flattened inner sequences, and the lengths of the inner sequences. 
+        """
+        field = getattr(tokens, self.field)
+        if isinstance(field, SoftLexicon) and not self.squeeze:
+            # The CSR-style features are already flattened
+            return field.words, field.lengths.tolist()
+        
+        inner_seqs = list(self._inner_sequences(tokens))
+        return [x for inner_seq in inner_seqs for x in inner_seq], [len(inner_seq) for inner_seq in inner_seqs]
+        
+        
+    def _get_field_and_len(self, entry: dict):
+        flattened, inner_seq_lens = self._flattened_inner_sequences(entry[self.tokens_key])
+        return flattened, max(inner_seq_lens, default=None)
         
-    def build_vocab(self, *partitions):
-        counter = Counter()
-        for data in partitions:
-            for data_entry in data:
-                for inner_seq in self._inner_sequences(data_entry[self.tokens_key]):
-                    counter.update(inner_seq)
-                    if self.max_len is None or len(inner_seq) > self.max_len:
-                        self.max_len = len(inner_seq)
+        
+    def build_vocab(self, *partitions, num_workers: int=0):
+        counter, max_len = count_tokens(partitions, self._get_field_and_len, num_workers=num_workers)
+        if max_len is not None and (self.max_len is None or max_len > self.max_len):
+            self.max_len = max_len
         
         self.vocab = Vocab(counter, min_freq=self.min_freq, specials=self.specials, specials_first=True)
         
         
     def exemplify(self, tokens: TokenSequence):
-        inner_ids_list = []
-        for inner_seq in self._inner_sequences(tokens):
-            inner_ids_list.append(torch.tensor([self.vocab[x] for x in inner_seq]))
+        flattened, inner_seq_lens = self._flattened_inner_sequences(tokens)
+        inner_ids = torch.tensor(self.vocab.lookup_indices(flattened), dtype=torch.long)
         
         # inner_ids: (step*num_channels, inner_step)
-        return {'inner_ids': inner_ids_list}
+        return {'inner_ids': list(inner_ids.split(inner_seq_lens))}
+        
+    def _precompute_flattened(self, tokens_list: List[TokenSequence]):
+        flattened_list, inner_seq_lens_list = [], []
+        for tokens in tokens_list:
+            flattened, inner_seq_lens = self._flattened_inner_sequences(tokens)
+            flattened_list.append(flattened)
+            inner_seq_lens_list.append(inner_seq_lens)
+        
+        inner_lens = numpy.fromiter(itertools.chain.from_iterable(inner_seq_lens_list), dtype=numpy.int64)
+        outer_offsets = numpy.zeros(len(tokens_list)+1, dtype=numpy.int64)
+        numpy.cumsum([len(inner_seq_lens) for inner_seq_lens in inner_seq_lens_list], out=outer_offsets[1:])
+        return flattened_list, inner_lens, outer_offsets
+        
+    def precompute(self, tokens_list: List[TokenSequence]):
+        """Exemplify all the token sequences in one pass; the `i`-th output equals `exemplify(tokens_list[i])`. 
+        """
+        flattened_list, inner_lens, outer_offsets = self._precompute_flattened(tokens_list)
+        inner_ids, _ = self.vocab.encode(flattened_list)
+        return NestedFlatSequences({'inner_ids': torch.from_numpy(inner_ids)}, inner_lens, outer_offsets)
         
         
     def batchify(self, batch_ex: List[dict]):
@@ -160,17 +191,13 @@ class SoftLexiconConfig(NestedOneHotConfig):
         return self._repr_non_config_attrs(repr_attr_dict)
         
         
-    def build_freqs(self, *partitions):
+    def build_freqs(self, *partitions, num_workers: int=0):
         """Ma et al. (2020): The statistical data set is constructed from a combination 
         of *training* and *developing* data of the task. 
         In addition, note that the frequency of `w` does not increase if `w` is 
         covered by another sub-sequence that matches the lexicon
         """
-        counter = Counter()
-        for data in partitions:
-            for data_entry in data:
-                for inner_seq in self._inner_sequences(data_entry[self.tokens_key]):
-                    counter.update(inner_seq)
+        counter, _ = count_tokens(partitions, self._get_field_and_len, num_workers=num_workers)
         
         # NOTE: Set the minimum frequecy as 1, to avoid OOV tokens being ignored
         self.freqs = {tok: 1 for tok in self.vocab.itos}
@@ -181,13 +208,19 @@ class SoftLexiconConfig(NestedOneHotConfig):
     def exemplify(self, tokens: TokenSequence):
         example = super().exemplify(tokens)
         
-        inner_freqs_list = []
-        for inner_seq in self._inner_sequences(tokens):
-            inner_freqs_list.append(torch.tensor([self.freqs[x] for x in inner_seq]))
+        flattened, inner_seq_lens = self._flattened_inner_sequences(tokens)
+        inner_freqs = torch.tensor([self.freqs[x] for x in flattened], dtype=torch.long)
         
-        example['inner_freqs'] = inner_freqs_list
+        example['inner_freqs'] = list(inner_freqs.split(inner_seq_lens))
         return example
         
+    def precompute(self, tokens_list: List[TokenSequence]):
+        flattened_list, inner_lens, outer_offsets = self._precompute_flattened(tokens_list)
+        inner_ids, _ = self.vocab.encode(flattened_list)
+        inner_freqs = numpy.fromiter(map(self.freqs.__getitem__, itertools.chain.from_iterable(flattened_list)), dtype=numpy.int64, count=len(inner_ids))
+        return NestedFlatSequences({'inner_ids': torch.from_numpy(inner_ids), 
+                                    'inner_freqs': torch.from_numpy(inner_freqs)}, inner_lens, outer_offsets)
+        
         
     def batchify(self, batch_ex: List[dict]):
         batch = super().batchify(batch_ex)
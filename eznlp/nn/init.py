@@ -29,19 +29,17 @@ def reinit_embedding_by_pretrained_(embedding: torch.nn.Embedding,
     assert embedding.weight.size(1) == vectors.emb_dim
     uniform_range = (3 / embedding.weight.size(1)) ** 0.5
     
-    oov = []
-    acc_vec_abs = 0
-    for idx, tok in enumerate(itos):
-        pretrained_vec = vectors.lookup(tok)
-        if pretrained_vec is not None:
-            acc_vec_abs += pretrained_vec.abs().mean().item()
-            embedding.weight.data[idx].copy_(pretrained_vec)
-        else:
-            oov.append(tok)
-            if oov_init.lower() == 'zeros':
-                torch.nn.init.zeros_(embedding.weight.data[idx])
-            elif oov_init.lower() == 'uniform':
-                torch.nn.init.uniform_(embedding.weight.data[idx], -uniform_range, uniform_range)
+    # Align all the tokens at once, and fill in the (dequantized) pretrained vectors by a single gather
+    indexes, found = vectors.align(itos)
+    pretrained_vecs = vectors.get_rows(indexes[found])
+    embedding.weight.data[found] = pretrained_vecs.to(embedding.weight.dtype)
+    acc_vec_abs = pretrained_vecs.abs().mean(dim=1).sum().item()
+    
+    oov = [tok for tok, tok_found in zip(itos, found.tolist()) if not tok_found]
+    if oov_init.lower() == 'zeros':
+        embedding.weight.data[~found] = 0
+    elif oov_init.lower() == 'uniform':
+        embedding.weight.data[~found] = torch.empty(len(oov), embedding.weight.size(1)).uniform_(-uniform_range, uniform_range)
     
     if embedding.padding_idx is not None:
         torch.nn.init.zeros_(embedding.weight.data[embedding.padding_idx])
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from typing import List, Iterable
 from collections import OrderedDict
-from functools import cached_property
+from functools import cached_property, lru_cache
 import string
 import re
 # import hanziconv
@@ -186,45 +186,102 @@ def _pipeline(*normalizers):
     return pipeline_normalizer
 
 
-class Token(object):
-    """A token at the modeling level (e.g., word level for English text, or character level for Chinese text). 
-    
-    `Token` provides access to lower-level attributes (prefixes, suffixes). 
-    """
-    _en_shape_feature_names = list(en_shape2criterion.keys())
+@lru_cache(maxsize=None)
+def _build_text_normalizer(case_mode='None', number_mode='None', to_half=True):
+    return _pipeline(_case_normalizers[case_mode.lower()], 
+                     _number_normalizers[number_mode.lower()], 
+                     lambda x: Full2Half.full2half(x) if to_half else x)
+
+
+def _normalize_text(raw_text: str, case_mode='None', number_mode='None', to_half=True):
+    return _build_text_normalizer(case_mode, number_mode, to_half)(raw_text)
+
+
+def _text_to_en_pattern(text: str):
+    feature = upper_re.sub('A', text)
+    feature = lower_re.sub('a', feature)
+    feature = digit_re.sub('0', feature)
+    return feature
+
+
+def _en_pattern_to_sum(feature: str):
+    feature = re.sub('A+', 'A', feature)
+    feature = re.sub('a+', 'a', feature)
+    feature = re.sub('0+', '0', feature)
+    return feature
+
+
+def _text_to_en_shape_features(text: str):
+    features = numpy.array([criterion(text) for criterion in en_shape2criterion.values()])
+    # The array is shared by all identical tokens, hence read-only
+    features.setflags(write=False)
+    return features
+
+
+class TokenFeatureEngine(object):
+    """A memoized engine of token-level features. 
     
-    _basic_ohot_fields = ['text', 'num_mark', 
-                          'prefix_2', 'prefix_3', 'prefix_4', 'prefix_5', 
-                          'suffix_2', 'suffix_3', 'suffix_4', 'suffix_5', 
-                          'en_pattern', 'en_pattern_sum']
-    _basic_mhot_fields = ['en_shape_features']
+    Real corpora contain heavily repeated tokens, so the normalized text (keyed by `raw_text`, `case_mode`, 
+    `number_mode` and `to_half`) and the derived features (keyed by `raw_text`) are computed only once per 
+    unique key, and retained in bounded LRU caches. 
     
-    def __init__(self, raw_text: str, pre_text_normalizer=None, 
-                 case_mode='None', number_mode='None', to_half=True, to_zh_simplified=False, 
-                 post_text_normalizer=None, **kwargs):
-        self.raw_text = raw_text
-        if callable(pre_text_normalizer):
-            self.raw_text = pre_text_normalizer(self.raw_text)
-            
-        pipeline_normalizer = _pipeline(_case_normalizers[case_mode.lower()], 
-                                        _number_normalizers[number_mode.lower()], 
-                                        lambda x: Full2Half.full2half(x) if to_half else x)
-        self.text = pipeline_normalizer(self.raw_text)
-        if callable(post_text_normalizer):
-            self.text = post_text_normalizer(self.text)
+    Parameters
+    ----------
+    maxsize: int
+        The maximum number of entries of each cache. 
+    """
+    def __init__(self, maxsize: int=2**18):
+        self.resize(maxsize)
         
-        for k, v in kwargs.items():
-            setattr(self, k, v)
+    def resize(self, maxsize: int):
+        self.maxsize = maxsize
+        self._normalize = lru_cache(maxsize=maxsize)(_normalize_text)
+        self._num_mark = lru_cache(maxsize=maxsize)(_text_to_num_mark)
+        self._en_pattern = lru_cache(maxsize=maxsize)(_text_to_en_pattern)
+        self._en_pattern_sum = lru_cache(maxsize=maxsize)(_en_pattern_to_sum)
+        self._en_shape_features = lru_cache(maxsize=maxsize)(_text_to_en_shape_features)
         
-
-    def __eq__(self, other):
-        return isinstance(other, Token) and self.raw_text == other.raw_text and self.text == other.text
+    @property
+    def _caches(self):
+        return {'normalize': self._normalize, 
+                'num_mark': self._num_mark, 
+                'en_pattern': self._en_pattern, 
+                'en_pattern_sum': self._en_pattern_sum, 
+                'en_shape_features': self._en_shape_features}
         
-    def __len__(self):
-        return len(self.raw_text)
+    def cache_info(self):
+        return {name: cache.cache_info() for name, cache in self._caches.items()}
+        
+    def cache_clear(self):
+        for cache in self._caches.values():
+            cache.cache_clear()
+        
+        
+    def normalize(self, raw_text: str, case_mode='None', number_mode='None', to_half=True):
+        return self._normalize(raw_text, case_mode, number_mode, to_half)
+        
+    def num_mark(self, raw_text: str):
+        return self._num_mark(raw_text)
+        
+    def en_pattern(self, raw_text: str):
+        return self._en_pattern(raw_text)
+        
+    def en_pattern_sum(self, raw_text: str):
+        return self._en_pattern_sum(self._en_pattern(raw_text))
+        
+    def en_shape_features(self, raw_text: str):
+        return self._en_shape_features(raw_text)
+
+
+token_feature_engine = TokenFeatureEngine()
+
+
+class TokenFeatureMixin(object):
+    """Lower-level features (prefixes, suffixes, patterns, shapes) derived from `raw_text`. 
     
-    def __repr__(self):
-        return self.raw_text
+    Shared by `Token` and `TokenView`. 
+    """
+    __slots__ = ()
     
     @property    
     def prefix_2(self):
@@ -260,26 +317,19 @@ class Token(object):
     
     @property
     def num_mark(self):
-        return _text_to_num_mark(self.raw_text, return_nan_mark=True)
+        return token_feature_engine.num_mark(self.raw_text)
         
     @property
     def en_pattern(self):
-        feature = upper_re.sub('A', self.raw_text)
-        feature = lower_re.sub('a', feature)
-        feature = digit_re.sub('0', feature)
-        return feature
+        return token_feature_engine.en_pattern(self.raw_text)
     
     @property
     def en_pattern_sum(self):
-        feature = self.en_pattern
-        feature = re.sub('A+', 'A', feature)
-        feature = re.sub('a+', 'a', feature)
-        feature = re.sub('0+', '0', feature)
-        return feature
+        return token_feature_engine.en_pattern_sum(self.raw_text)
         
     @property
     def en_shape_features(self):
-        return numpy.array([criterion(self.raw_text) for criterion in en_shape2criterion.values()])
+        return token_feature_engine.en_shape_features(self.raw_text)
         
     @property
     def zh_shape_features(self):
@@ -287,6 +337,91 @@ class Token(object):
     
     
     
+class Token(TokenFeatureMixin):
+    """A token at the modeling level (e.g., word level for English text, or character level for Chinese text). 
+    
+    `Token` provides access to lower-level attributes (prefixes, suffixes). 
+    """
+    _en_shape_feature_names = list(en_shape2criterion.keys())
+    
+    _basic_ohot_fields = ['text', 'num_mark', 
+                          'prefix_2', 'prefix_3', 'prefix_4', 'prefix_5', 
+                          'suffix_2', 'suffix_3', 'suffix_4', 'suffix_5', 
+                          'en_pattern', 'en_pattern_sum']
+    _basic_mhot_fields = ['en_shape_features']
+    
+    def __init__(self, raw_text: str, pre_text_normalizer=None, 
+                 case_mode='None', number_mode='None', to_half=True, to_zh_simplified=False, 
+                 post_text_normalizer=None, **kwargs):
+        self.raw_text = raw_text
+        if callable(pre_text_normalizer):
+            self.raw_text = pre_text_normalizer(self.raw_text)
+            
+        self.text = token_feature_engine.normalize(self.raw_text, case_mode, number_mode, to_half)
+        if callable(post_text_normalizer):
+            self.text = post_text_normalizer(self.text)
+        
+        for k, v in kwargs.items():
+            setattr(self, k, v)
+        
+        
+    def __eq__(self, other):
+        return isinstance(other, (Token, TokenView)) and self.raw_text == other.raw_text and self.text == other.text
+        
+    def __len__(self):
+        return len(self.raw_text)
+    
+    def __repr__(self):
+        return self.raw_text
+    
+    
+    
+class SoftLexicon(object):
+    """Softlexicon features of a token sequence, stored in a CSR-style structure. 
+    
+    The word sets of all `(token, channel)` slots are flattened into `words`, and the word set of the `k`-th slot 
+    is `words[offsets[k]:offsets[k+1]]`, where `k = token_idx * num_channels + channel_idx`. 
+    
+    Parameters
+    ----------
+    words: List[str]
+        The flattened words. 
+    offsets: numpy.ndarray
+        The slot offsets, with shape `(seq_len*num_channels+1, )`. 
+    """
+    def __init__(self, words: List[str], offsets: numpy.ndarray, num_channels: int=4):
+        self.words = words
+        self.offsets = offsets
+        self.num_channels = num_channels
+        
+    @property
+    def lengths(self):
+        return numpy.diff(self.offsets)
+        
+    def __len__(self):
+        return (len(self.offsets) - 1) // self.num_channels
+        
+    def __getitem__(self, i: int):
+        slot_offsets = self.offsets[i*self.num_channels:(i+1)*self.num_channels+1].tolist()
+        return [self.words[s:e] for s, e in zip(slot_offsets[:-1], slot_offsets[1:])]
+        
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+        
+    def tolist(self):
+        return list(self)
+        
+    def __eq__(self, other):
+        if isinstance(other, SoftLexicon):
+            return self.words == other.words and numpy.array_equal(self.offsets, other.offsets) and self.num_channels == other.num_channels
+        return self.tolist() == other
+        
+    def __repr__(self):
+        return repr(self.tolist())
+
+
+
 class TokenSequence(object):
     """A wrapper of token list, providing sequential attribute access to all tokens. 
     
@@ -315,7 +450,9 @@ class TokenSequence(object):
         
         
     def __eq__(self, other):
-        return isinstance(other, TokenSequence) and self.__getstate__() == other.__getstate__()
+        return (isinstance(other, TokenSequence) and len(self) == len(other) and 
+                self.token_sep == other.token_sep and self.pad_token == other.pad_token and self.none_token == other.none_token and 
+                self.raw_text == other.raw_text and self.text == other.text)
     
     def __len__(self):
         return len(self.token_list)
@@ -324,14 +461,37 @@ class TokenSequence(object):
         return repr(self.token_list)
     
     def __getstate__(self):
-        return {'token_list': self.token_list, 
-                'token_sep': self.token_sep, 
-                'pad_token': self.pad_token, 
-                'none_token': self.none_token}
+        state = {'token_sep': self.token_sep, 
+                 'pad_token': self.pad_token, 
+                 'none_token': self.none_token}
+        # Pickle the tokens column-wise if they share the same attributes, which is much 
+        # faster and more compact than pickling `Token` objects one by one (e.g., in multiprocessing)
+        attr_names = self.token_attr_names
+        if all(tok.__dict__.keys() == self.token_list[0].__dict__.keys() for tok in self.token_list):
+            state['token_columns'] = {name: [tok.__dict__[name] for tok in self.token_list] for name in attr_names}
+        else:
+            state['token_list'] = self.token_list
+        return state
         
     def __setstate__(self, state: dict):
+        token_columns = state.pop('token_columns', None)
+        if token_columns is not None:
+            token_list = []
+            for values in zip(*token_columns.values()):
+                tok = Token.__new__(Token)
+                tok.__dict__ = dict(zip(token_columns.keys(), values))
+                token_list.append(tok)
+            state['token_list'] = token_list
         self.__dict__.update(state)
         
+    @property
+    def token_attr_names(self):
+        """Names of the attributes registered on each token, e.g., `raw_text`, `text` and additional tags. 
+        """
+        if len(self.token_list) == 0:
+            return []
+        return list(self.token_list[0].__dict__.keys())
+        
         
     def __getitem__(self, i):
         if isinstance(i, int):
@@ -371,42 +531,75 @@ class TokenSequence(object):
         assert tokenize_callback.__name__.startswith('tokenize')
         
         
-    def build_softwords(self, tokenize_callback, **kwargs):
+    def _softword_slots(self, tokenize_callback, **kwargs):
+        """Assign each matched word to the slots of `(token, tag)`, following the BMES scheme. 
+        
+        Returns
+        -------
+        word_texts: List[str]
+            The matched words. 
+        word_ids: numpy.ndarray
+            The indexes of matched words in `word_texts`, one for each slot. 
+        slot_ids: numpy.ndarray
+            The slot indexes, computed as `token_idx * num_tags + tag_idx`. 
+        """
         self._assert_for_softwords(tokenize_callback)
         
-        self.softword = [numpy.zeros(len(self._softword_idx2tag), dtype=bool) for tok in self.token_list]
+        tokenized = list(tokenize_callback(self.token_sep.join(self.raw_text), **kwargs))
+        word_texts = [word_text for word_text, *_ in tokenized]
+        word_starts = numpy.array([word_start for _, word_start, _ in tokenized], dtype=numpy.int64)
+        word_ends = numpy.array([word_end for *_, word_end in tokenized], dtype=numpy.int64)
+        word_lens = word_ends - word_starts
+        is_single = (word_lens == 1)
         
-        for word_text, word_start, word_end in tokenize_callback(self.token_sep.join(self.raw_text), **kwargs):
-            if word_end - word_start == 1:
-                self.softword[word_start][self._softword_tag2idx['S']] = True
-            else:
-                self.softword[word_start][self._softword_tag2idx['B']] = True
-                self.softword[word_end-1][self._softword_tag2idx['E']] = True
-                for k in range(word_start+1, word_end-1):
-                    self.softword[k][self._softword_tag2idx['M']] = True
-                    
-                    
-    def build_softlexicons(self, tokenize_callback, **kwargs):
-        self._assert_for_softwords(tokenize_callback)
+        # Tokens inside multi-token words are tagged as `M`
+        num_inner = numpy.clip(word_lens - 2, 0, None)
+        inner_word_ids = numpy.repeat(numpy.arange(len(tokenized)), num_inner)
+        inner_cum_lens = numpy.cumsum(num_inner) - num_inner
+        inner_tok_ids = word_starts[inner_word_ids] + 1 + numpy.arange(inner_word_ids.size) - inner_cum_lens[inner_word_ids]
         
-        self.softlexicon = [[[] for t in self._softword_idx2tag] for tok in self.token_list]
+        S, B, M, E = [self._softword_tag2idx[t] for t in 'SBME']
+        num_tags = len(self._softword_idx2tag)
+        word_ids = numpy.concatenate([numpy.flatnonzero(is_single), 
+                                      numpy.flatnonzero(~is_single), 
+                                      numpy.flatnonzero(~is_single), 
+                                      inner_word_ids])
+        slot_ids = numpy.concatenate([word_starts[is_single]*num_tags + S, 
+                                      word_starts[~is_single]*num_tags + B, 
+                                      (word_ends[~is_single]-1)*num_tags + E, 
+                                      inner_tok_ids*num_tags + M])
+        return word_texts, word_ids, slot_ids
+        
+        
+    def build_softwords(self, tokenize_callback, **kwargs):
+        """Build the softword features as a `(seq_len, 4)` boolean array. 
+        """
+        _, _, slot_ids = self._softword_slots(tokenize_callback, **kwargs)
+        
+        softword = numpy.zeros(len(self)*len(self._softword_idx2tag), dtype=bool)
+        softword[slot_ids] = True
+        self.softword = softword.reshape(len(self), len(self._softword_idx2tag))
+        
+        
+    def build_softlexicons(self, tokenize_callback, **kwargs):
+        """Build the softlexicon features as a `SoftLexicon` (a CSR-style structure). 
+        """
+        word_texts, word_ids, slot_ids = self._softword_slots(tokenize_callback, **kwargs)
+        num_slots = len(self) * len(self._softword_idx2tag)
         
-        for word_text, word_start, word_end in tokenize_callback(self.token_sep.join(self.raw_text), **kwargs):
-            if word_end - word_start == 1:
-                self.softlexicon[word_start][self._softword_tag2idx['S']].append(word_text)
-            else:
-                self.softlexicon[word_start][self._softword_tag2idx['B']].append(word_text)
-                self.softlexicon[word_end-1][self._softword_tag2idx['E']].append(word_text)
-                for k in range(word_start+1, word_end-1):
-                    self.softlexicon[k][self._softword_tag2idx['M']].append(word_text)
-                    
         # Add a special token to empty word sets
-        for word_sets in self.softlexicon:
-            for word_set in word_sets:
-                if len(word_set) == 0:
-                    word_set.append(self.none_token)
-                    
-                    
+        empty_slot_ids = numpy.flatnonzero(numpy.bincount(slot_ids, minlength=num_slots) == 0)
+        word_texts = word_texts + [self.none_token]
+        word_ids = numpy.concatenate([word_ids, numpy.full(empty_slot_ids.size, len(word_texts)-1)])
+        slot_ids = numpy.concatenate([slot_ids, empty_slot_ids])
+        
+        # Words in each slot remain in the order of matching
+        order = numpy.lexsort((word_ids, slot_ids))
+        offsets = numpy.zeros(num_slots+1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(slot_ids, minlength=num_slots), out=offsets[1:])
+        self.softlexicon = SoftLexicon([word_texts[k] for k in word_ids[order].tolist()], offsets, num_channels=len(self._softword_idx2tag))
+        
+        
     @cached_property
     def bigram(self):
         unigram = self.text
@@ -419,7 +612,8 @@ class TokenSequence(object):
         
     
     def spans_within_max_length(self, max_len: int):
-        total_len = len(self.token_list)
+        total_len = len(self)
+        text = self.text
         slice_start = 0
         
         while True:
@@ -428,10 +622,10 @@ class TokenSequence(object):
                 break
             else:
                 slice_end = slice_start + max_len
-                while not self.token_list[slice_end-1].text in ('.', '?', '!', ';'):
+                while not text[slice_end-1] in ('.', '?', '!', ';'):
                     slice_end -= 1
                     if slice_end <= slice_start:
-                        raise ValueError(f"Cannot find proper slices in {self.token_list[slice_start:slice_start+max_len]}")
+                        raise ValueError(f"Cannot find proper slices in {text[slice_start:slice_start+max_len]}")
                 yield slice(slice_start, slice_end)
                 slice_start = slice_end
                 
@@ -507,22 +701,516 @@ class TokenSequence(object):
         tokens = cls(token_list, token_sep=token_sep, pad_token=pad_token, none_token=none_token)
         tokens.attach_additional_tags(additional_tok2tags=additional_tok2tags)
         return tokens
+        
+        
+    @classmethod
+    def from_raw_texts(cls, raw_texts: List[str], tokenize_callback=None, additional_tok2tags=None, 
+                       token_sep=" ", pad_token="<pad>", none_token="<none>", **kwargs):
+        """Build a list of `TokenSequence` from a batch of raw text. 
+        
+        The output is identical to calling `from_raw_text` on each text, while each distinct token in the batch is 
+        normalized only once, and the `Token` objects are built without per-token argument handling. 
+        """
+        token_kwargs = {k: kwargs.pop(k) for k in ('case_mode', 'number_mode', 'to_half', 'to_zh_simplified') if k in kwargs}
+        is_space = tokenize_callback is None or (isinstance(tokenize_callback, str) and tokenize_callback.lower().startswith('space'))
+        is_char = isinstance(tokenize_callback, str) and tokenize_callback.lower().startswith('char')
+        if len(kwargs) > 0 or not (is_space or is_char):
+            # Fallback for text normalizers, additional token attributes, or other tokenizers
+            return [cls.from_raw_text(raw_text, tokenize_callback=tokenize_callback, additional_tok2tags=additional_tok2tags, 
+                                      token_sep=token_sep, pad_token=pad_token, none_token=none_token, **token_kwargs, **kwargs) 
+                        for raw_text in raw_texts]
+            
+        case_mode, number_mode, to_half = token_kwargs.get('case_mode', 'None'), token_kwargs.get('number_mode', 'None'), token_kwargs.get('to_half', True)
+        normalized = {}
+        tokens_list = []
+        for raw_text in raw_texts:
+            token_list = []
+            for k, tok_text in enumerate(raw_text.split() if is_space else raw_text):
+                text = normalized.get(tok_text)
+                if text is None:
+                    text = normalized[tok_text] = token_feature_engine.normalize(tok_text, case_mode, number_mode, to_half)
+                # NOTE: Setting attributes one by one (rather than assigning `__dict__`) keeps the memory-saving key-sharing dicts. 
+                tok = Token.__new__(Token)
+                tok.raw_text = tok_text
+                tok.text = text
+                if is_char:
+                    tok.start = k
+                    tok.end = k + 1
+                token_list.append(tok)
+                
+            tokens = cls(token_list, token_sep=token_sep, pad_token=pad_token, none_token=none_token)
+            tokens.attach_additional_tags(additional_tok2tags=additional_tok2tags)
+            tokens_list.append(tokens)
+        return tokens_list
+
+
+
+class _StringColumn(object):
+    """A compact column of strings, stored as a single concatenated buffer with offsets. 
+    """
+    __slots__ = ('buffer', 'offsets')
+    
+    def __init__(self, buffer: str, offsets: numpy.ndarray):
+        self.buffer = buffer
+        self.offsets = offsets
+        
+    @classmethod
+    def from_list(cls, values: List[str]):
+        offsets = numpy.zeros(len(values)+1, dtype=numpy.int32)
+        numpy.cumsum([len(v) for v in values], out=offsets[1:])
+        return cls("".join(values), offsets)
+        
+    def __len__(self):
+        return len(self.offsets) - 1
+        
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return _StringColumn.from_list(self.tolist()[i])
+            stop = max(start, stop)
+            buf_start, buf_end = self.offsets[start], self.offsets[stop]
+            return _StringColumn(self.buffer[buf_start:buf_end], self.offsets[start:stop+1] - buf_start)
+        else:
+            return self.buffer[self.offsets[i]:self.offsets[i+1]]
+        
+    def __add__(self, other):
+        offsets = numpy.concatenate([self.offsets, other.offsets[1:] + self.offsets[-1]])
+        return _StringColumn(self.buffer + other.buffer, offsets)
+        
+    def tolist(self):
+        buffer, offsets = self.buffer, self.offsets.tolist()
+        return [buffer[s:e] for s, e in zip(offsets[:-1], offsets[1:])]
+        
+    def lengths(self):
+        return numpy.diff(self.offsets)
+
+
+
+def _build_column(values: list):
+    if all(isinstance(v, str) for v in values):
+        return _StringColumn.from_list(values)
+    elif all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+        return numpy.array(values, dtype=numpy.int64)
+    else:
+        return list(values)
+
+
+def _pack_column(column):
+    # Arrays are pickled as raw bytes, which is much more compact than pickling `numpy.ndarray` objects
+    if isinstance(column, _StringColumn):
+        return ('str', column.buffer, column.offsets.dtype.str, column.offsets.tobytes())
+    elif isinstance(column, numpy.ndarray):
+        return ('array', column.dtype.str, column.tobytes())
+    else:
+        return ('list', column)
+
+
+def _unpack_column(packed: tuple):
+    kind, *payload = packed
+    if kind == 'str':
+        buffer, dtype, offsets = payload
+        return _StringColumn(buffer, numpy.frombuffer(offsets, dtype=dtype).copy())
+    elif kind == 'array':
+        dtype, values = payload
+        return numpy.frombuffer(values, dtype=dtype).copy()
+    else:
+        return payload[0]
+
+
+def _column_tolist(column):
+    if isinstance(column, list):
+        return column.copy()
+    else:
+        return column.tolist()
+
+
+def _column_value(column, i: int):
+    value = column[i]
+    return value.item() if isinstance(value, numpy.generic) else value
+
+
+def _columns_equal(column1, column2):
+    if isinstance(column1, _StringColumn) and isinstance(column2, _StringColumn):
+        return column1.buffer == column2.buffer and numpy.array_equal(column1.offsets, column2.offsets)
+    else:
+        return _column_tolist(column1) == _column_tolist(column2)
+
+
+def _concat_columns(column1, column2):
+    if isinstance(column1, _StringColumn) and isinstance(column2, _StringColumn):
+        return column1 + column2
+    elif isinstance(column1, numpy.ndarray) and isinstance(column2, numpy.ndarray):
+        return numpy.concatenate([column1, column2])
+    else:
+        return _build_column(_column_tolist(column1) + _column_tolist(column2))
+
+
+
+class TokenView(TokenFeatureMixin):
+    """A light-weight view of a token in `ColumnarTokenSequence`. 
+    
+    `TokenView` holds no data; attribute access is redirected to the corresponding columns of the sequence. 
+    """
+    __slots__ = ('_tokens', '_idx')
+    
+    def __init__(self, tokens, idx: int):
+        object.__setattr__(self, '_tokens', tokens)
+        object.__setattr__(self, '_idx', idx)
+        
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}")
+        return self._tokens._get_value(name, self._idx)
+        
+    def __setattr__(self, name, value):
+        self._tokens._set_value(name, self._idx, value)
+        
+    def __reduce__(self):
+        return (TokenView, (self._tokens, self._idx))
+        
+    def __eq__(self, other):
+        return isinstance(other, (Token, TokenView)) and self.raw_text == other.raw_text and self.text == other.text
+        
+    def __len__(self):
+        return len(self.raw_text)
+    
+    def __repr__(self):
+        return self.raw_text
+
+
+
+class ColumnarTokenSequence(TokenSequence):
+    """A token sequence storing each token attribute as a compact column, instead of a list of `Token` objects. 
+    
+    String attributes are stored as a concatenated buffer with offsets, integer attributes as a `numpy` array, 
+    and the others as a plain list. The `text` column is omitted if it is identical to `raw_text`. 
+    A column written token by token is turned into a plain list, and re-encoded lazily (e.g., on pickling). 
+    Indexing returns `TokenView`s, so `ColumnarTokenSequence` is a drop-in replacement of `TokenSequence`. 
+    
+    Parameters
+    ----------
+    columns: dict of lists
+        {attr_name: values, ...}, where `raw_text` is required. 
+    """
+    def __init__(self, columns: dict, token_sep=" ", pad_token="<pad>", none_token="<none>"):
+        assert 'raw_text' in columns
+        self._columns = {}
+        self._set_column('raw_text', columns['raw_text'])
+        for name, values in columns.items():
+            if name != 'raw_text':
+                self._set_column(name, values)
+        self.token_sep = token_sep
+        self.pad_token = pad_token
+        self.none_token = none_token
+        
+        
+    def _set_column(self, name: str, values):
+        if not isinstance(values, (_StringColumn, numpy.ndarray)):
+            values = _build_column(values)
+        
+        if name == 'text' and 'raw_text' in self._columns and _columns_equal(values, self._columns['raw_text']):
+            self._columns.pop('text', None)
+        else:
+            self._columns[name] = values
+        
+    def _get_column(self, name: str):
+        if name == 'text' and 'text' not in self._columns:
+            return self._columns['raw_text']
+        return self._columns[name]
+        
+    def _get_value(self, name: str, i: int):
+        if name in self._columns or name == 'text':
+            return _column_value(self._get_column(name), i)
+        else:
+            raise AttributeError(f"{TokenView.__name__} has no attribute {name}")
+        
+    def _set_value(self, name: str, i: int, value):
+        if name == 'raw_text' and 'text' not in self._columns:
+            # `text` no longer shares the column of `raw_text`
+            self._columns['text'] = _column_tolist(self._columns['raw_text'])
+        
+        column = self._columns.get(name)
+        if column is None:
+            column = _column_tolist(self._columns['raw_text']) if name == 'text' else [None] * len(self)
+            self._columns[name] = column
+        elif isinstance(column, numpy.ndarray) and isinstance(value, int) and not isinstance(value, bool):
+            column[i] = value
+            return
+        elif not isinstance(column, list):
+            column = _column_tolist(column)
+            self._columns[name] = column
+        column[i] = value
+        
+    def _compact(self):
+        """Re-encode the columns turned into plain lists by per-token writes. 
+        """
+        for name, column in list(self._columns.items()):
+            if isinstance(column, list):
+                self._set_column(name, column)
+        
+        
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}")
+        elif name in self._columns or name == 'text':
+            return _column_tolist(self._get_column(name))
+        elif len(self) == 0:
+            # Unable to check attribute existence, return an empty list anyway
+            return []
+        elif hasattr(TokenFeatureMixin, name):
+            return [getattr(tok, name) for tok in self.token_list]
+        else:
+            raise AttributeError(f"{self.__class__.__name__} has no attribute {name}")
+        
+    def __len__(self):
+        return len(self._columns['raw_text'])
+    
+    def __repr__(self):
+        return repr(self.token_list)
+    
+    def __getstate__(self):
+        self._compact()
+        return {'_packed_columns': {name: _pack_column(column) for name, column in self._columns.items()}, 
+                'token_sep': self.token_sep, 
+                'pad_token': self.pad_token, 
+                'none_token': self.none_token}
+        
+    def __setstate__(self, state: dict):
+        packed_columns = state.pop('_packed_columns', None)
+        if packed_columns is not None:
+            state['_columns'] = {name: _unpack_column(packed) for name, packed in packed_columns.items()}
+        self.__dict__.update(state)
+        
+    @property
+    def token_list(self):
+        return [TokenView(self, i) for i in range(len(self))]
+        
+    @property
+    def token_attr_names(self):
+        attr_names = list(self._columns.keys())
+        if 'text' not in self._columns:
+            attr_names.insert(1, 'text')
+        return attr_names
+        
+        
+    def _new_with_columns(self, columns: dict):
+        tokens = self.__class__.__new__(self.__class__)
+        tokens.__setstate__({'_columns': columns, 
+                             'token_sep': self.token_sep, 
+                             'pad_token': self.pad_token, 
+                             'none_token': self.none_token})
+        return tokens
+        
+    def __getitem__(self, i):
+        if isinstance(i, int):
+            if not -len(self) <= i < len(self):
+                raise IndexError(f"Token index {i} out of range")
+            return TokenView(self, i % len(self))
+        elif isinstance(i, slice):
+            return self._new_with_columns({name: column[i] for name, column in self._columns.items()})
+        else:
+            raise TypeError(f"Invalid subscript type of {i}")
+        
+    def __add__(self, other):
+        assert isinstance(other, TokenSequence)
+        assert other.token_sep == self.token_sep
+        assert other.pad_token == self.pad_token
+        assert other.none_token == self.none_token
+        if not isinstance(other, ColumnarTokenSequence):
+            other = ColumnarTokenSequence.from_token_list(other.token_list, 
+                                                          token_sep=other.token_sep, 
+                                                          pad_token=other.pad_token, 
+                                                          none_token=other.none_token)
+        
+        columns = {}
+        for name in self._columns.keys() | other._columns.keys() | {'text'}:
+            column1 = self._get_column(name) if (name in self._columns or name == 'text') else [None] * len(self)
+            column2 = other._get_column(name) if (name in other._columns or name == 'text') else [None] * len(other)
+            columns[name] = _concat_columns(column1, column2)
+        
+        tokens = self._new_with_columns({'raw_text': columns.pop('raw_text')})
+        for name, column in columns.items():
+            tokens._set_column(name, column)
+        return tokens
+        
+        
+    def build_pseudo_boundaries(self, sep_width: int=None):
+        if sep_width is None:
+            sep_width = len(self.token_sep)
+        
+        self._compact()
+        token_lens = self._columns['raw_text'].lengths()
+        self.end = numpy.cumsum(token_lens + sep_width) - sep_width
+        self.start = self.end - token_lens
+        
+        
+    def attach_additional_tags(self, additional_tags: dict=None, additional_tok2tags: list=None):
+        if additional_tags is not None:
+            for tag_name, tags in additional_tags.items():
+                assert len(tags) == len(self)
+                self._set_column(tag_name, tags)
+                
+        if additional_tok2tags is not None:
+            for tag_name, tok2tag in additional_tok2tags:
+                self._set_column(tag_name, [tok2tag.get(text, tok2tag['<unk>']) for text in self.text])
+                
+        return self
+        
+        
+    @classmethod
+    def from_token_list(cls, token_list: List[Token], token_sep=" ", pad_token="<pad>", none_token="<none>"):
+        """Build `ColumnarTokenSequence` from a list of `Token` objects. 
+        """
+        attr_names = list(token_list[0].__dict__.keys()) if len(token_list) > 0 else ['raw_text', 'text']
+        columns = {name: [getattr(tok, name) for tok in token_list] for name in attr_names}
+        return cls(columns, token_sep=token_sep, pad_token=pad_token, none_token=none_token)
+        
+        
+    @classmethod
+    def from_tokenized_text(cls, tokenized_text: List[str], additional_tags=None, additional_tok2tags=None, 
+                            token_sep=" ", pad_token="<pad>", none_token="<none>", 
+                            pre_text_normalizer=None, case_mode='None', number_mode='None', to_half=True, to_zh_simplified=False, 
+                            post_text_normalizer=None, **kwargs):
+        """Build `ColumnarTokenSequence` from tokenized text. 
+        
+        The normalizing arguments are identical to those of `Token`. 
+        """
+        raw_text = list(tokenized_text)
+        if callable(pre_text_normalizer):
+            raw_text = [pre_text_normalizer(x) for x in raw_text]
+        
+        text = [token_feature_engine.normalize(x, case_mode, number_mode, to_half) for x in raw_text]
+        if callable(post_text_normalizer):
+            text = [post_text_normalizer(x) for x in text]
+        
+        columns = {'raw_text': raw_text, 'text': text}
+        columns.update({k: [v] * len(raw_text) for k, v in kwargs.items()})
+        tokens = cls(columns, token_sep=token_sep, pad_token=pad_token, none_token=none_token)
+        tokens.attach_additional_tags(additional_tags=additional_tags, additional_tok2tags=additional_tok2tags)
+        return tokens
+        
+        
+    @classmethod
+    def from_raw_text(cls, raw_text: str, tokenize_callback=None, additional_tok2tags=None, 
+                      token_sep=" ", pad_token="<pad>", none_token="<none>", **kwargs):
+        """Build `ColumnarTokenSequence` from raw text. 
+        
+        See `TokenSequence.from_raw_text`. 
+        """
+        if tokenize_callback is None or (isinstance(tokenize_callback, str) and tokenize_callback.lower().startswith('space')):
+            tokenized_text, additional_tags = raw_text.split(), None
+        elif isinstance(tokenize_callback, str) and tokenize_callback.lower().startswith('char'):
+            tokenized_text = list(raw_text)
+            additional_tags = {'start': numpy.arange(len(raw_text)), 'end': numpy.arange(1, len(raw_text)+1)}
+        else:
+            raise ValueError(f"Invalid `tokenize_callback`: {tokenize_callback}")
+        
+        return cls.from_tokenized_text(tokenized_text, additional_tags=additional_tags, additional_tok2tags=additional_tok2tags, 
+                                       token_sep=token_sep, pad_token=pad_token, none_token=none_token, **kwargs)
+        
+    @classmethod
+    def from_raw_texts(cls, raw_texts: List[str], tokenize_callback=None, **kwargs):
+        """Build a list of `ColumnarTokenSequence` from a batch of raw text. 
+        """
+        return [cls.from_raw_text(raw_text, tokenize_callback=tokenize_callback, **kwargs) for raw_text in raw_texts]
 
 
 
 class LexiconTokenizer(object):
+    """A tokenizer matching all the lexicon words in text. 
+    
+    The lexicon is compiled into a character trie, so that the matching of each start position stops as soon as 
+    the prefix is not in the lexicon, without allocating substrings for failed candidates. The trie is built lazily, 
+    and cleared once `lexicon` is assigned; invoke `rebuild` after modifying `lexicon` in place. 
+    
+    Parameters
+    ----------
+    lexicon: Iterable[str]
+        The lexicon words. 
+    max_len: int
+        The maximum length of a matched word. 
+    return_singleton: bool
+        If True, every single character is returned as a word. 
+    """
+    _end_of_word = ''
+    
     def __init__(self, lexicon: Iterable[str], max_len: int=10, return_singleton: bool=False):
-        self.lexicon = set(lexicon)
+        self.lexicon = lexicon
         self.max_len = max_len
         self.return_singleton = return_singleton
         
-    def tokenize(self, text: str):
+    @property
+    def lexicon(self):
+        return self._lexicon
+        
+    @lexicon.setter
+    def lexicon(self, lexicon: Iterable[str]):
+        self._lexicon = set(lexicon)
+        self._trie = None
+        
+    def __getstate__(self):
+        # The trie is rebuilt after unpickling
+        state = self.__dict__.copy()
+        state['_trie'] = None
+        return state
+        
+    def __setstate__(self, state: dict):
+        # Tokenizers pickled by early versions
+        if 'lexicon' in state:
+            state['_lexicon'] = state.pop('lexicon')
+        state.setdefault('_trie', None)
+        self.__dict__.update(state)
+        
+    def rebuild(self):
+        """Rebuild the trie, which is required after modifying `lexicon` in place. 
+        """
+        self._trie = {}
+        for word in self._lexicon:
+            if len(word) > 0:
+                node = self._trie
+                for char in word:
+                    node = node.setdefault(char, {})
+                node[self._end_of_word] = True
+        
+        
+    def _tokenize(self, text: str, trie: dict):
+        end_of_word = self._end_of_word
+        min_len = 2 if self.return_singleton else 1
         L = len(text)
+        
+        tokenized = []
         for word_start in range(L):
+            if self.return_singleton:
+                tokenized.append((text[word_start], word_start, word_start+1))
+            
+            node = trie
             for word_end in range(word_start+1, min(word_start+self.max_len, L)+1):
-                word_text = text[word_start:word_end]
-                if (self.return_singleton and word_end-word_start==1) or (word_text in self.lexicon):
-                    yield (word_text, word_start, word_end)
+                node = node.get(text[word_end-1])
+                if node is None:
+                    break
+                if end_of_word in node and word_end-word_start >= min_len:
+                    tokenized.append((text[word_start:word_end], word_start, word_end))
+        return tokenized
+        
+        
+    def tokenize(self, text: str):
+        """Yield the matched words as `(word_text, word_start, word_end)`, ordered by `word_start` and then by `word_end`. 
+        """
+        if self._trie is None:
+            self.rebuild()
+        yield from self._tokenize(text, self._trie)
+        
+        
+    def tokenize_many(self, texts: Iterable[str]):
+        """Tokenize a collection of text, returning a list of `(word_text, word_start, word_end)` for each text. 
+        
+        The trie is built (if necessary) once and shared by all the texts; the results are identical to those of `tokenize`. 
+        """
+        if self._trie is None:
+            self.rebuild()
+        trie = self._trie
+        return [self._tokenize(text, trie) for text in texts]
 
 
 
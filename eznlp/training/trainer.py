@@ -112,10 +112,19 @@ class Trainer(object):
             self.scheduler.step()
         
         
-    def predict(self, dataset: Dataset, batch_size: int=32, beam_size: int=1):
+    def predict(self, dataset: Dataset, batch_size: int=32, beam_size: int=1, batch_sampler=None):
+        """Predict on `dataset`. 
+        
+        If `batch_sampler` is specified (e.g., a `BucketBatchSampler` grouping sequences of similar lengths), 
+        the predictions are restored to the original order of `dataset`. 
+        """
         assert self.num_metrics == 1 or beam_size <= 1
         
-        dataloader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False, collate_fn=dataset.collate)
+        if batch_sampler is None:
+            dataloader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False, collate_fn=dataset.collate)
+        else:
+            batches = list(batch_sampler)
+            dataloader = torch.utils.data.DataLoader(dataset, batch_sampler=batches, collate_fn=dataset.collate)
         
         self.model.eval()
         set_y_pred = [[] for k in range(self.num_metrics)]
@@ -134,6 +143,14 @@ class Trainer(object):
                     batch_y_pred = self.model.beam_search(beam_size, batch)
                     set_y_pred[0].extend(batch_y_pred)
         
+        if batch_sampler is not None:
+            indexes = [idx for batch in batches for idx in batch]
+            for k in range(len(set_y_pred)):
+                y_pred = [None] * len(indexes)
+                for idx, curr_y_pred in zip(indexes, set_y_pred[k]):
+                    y_pred[idx] = curr_y_pred
+                set_y_pred[k] = y_pred
+        
         if self.num_metrics == 1:
             return set_y_pred[0]
         else:
@@ -237,7 +254,10 @@ class Trainer(object):
             Whether to save by loss or other metrics. The metric must hold that it is better if higher, e.g., accuracy or F1. 
         """
         max_steps = numpy.inf if max_steps is None else max_steps
-        disp_every_steps = len(train_loader) if disp_every_steps is None else disp_every_steps
+        if disp_every_steps is None:
+            if isinstance(train_loader.dataset, torch.utils.data.IterableDataset):
+                raise ValueError(f"`disp_every_steps` should be specified for iterable-style datasets, whose length is unknown")
+            disp_every_steps = len(train_loader)
         eval_every_steps = disp_every_steps  if eval_every_steps is None else eval_every_steps
         if eval_every_steps % disp_every_steps != 0:
             raise ValueError(f"`eval_every_steps` {eval_every_steps} should be multiples of `disp_every_steps` {disp_every_steps}")
@@ -250,12 +270,21 @@ class Trainer(object):
         train_losses = []
         train_y_gold = [[] for k in range(self.num_metrics)]
         train_y_pred = [[] for k in range(self.num_metrics)]
+        # The real and padded costs of sequences, for monitoring the padding efficiency; 
+        # the cost follows the batch sampler if it defines one (e.g., quadratic in lengths for `BucketBatchSampler`)
+        cost = getattr(train_loader.batch_sampler, 'cost', lambda seq_lens: seq_lens)
+        train_real_cost, train_padded_cost = 0, 0
         eidx, sidx = 0, 0
         done_training = False
         t0 = time.time()
         
         while eidx < num_epochs:
             for batch in train_loader:
+                if hasattr(batch, 'seq_lens'):
+                    seq_costs = cost(batch.seq_lens)
+                    train_real_cost += seq_costs.sum().item()
+                    train_padded_cost += seq_costs.size(0) * seq_costs.max().item()
+                
                 batch = batch.to(self.device, non_blocking=self.non_blocking)
                 with torch.cuda.amp.autocast(enabled=self.use_amp):
                     loss_with_possible_y_pred = self.forward_batch(batch)
@@ -277,6 +306,7 @@ class Trainer(object):
                     elapsed_secs = int(time.time() - t0)
                     lrs = [group['lr'] for group in self.optimizer.param_groups]
                     disp_running_info(eidx=eidx, sidx=sidx, lrs=lrs, 
+                                      padding_efficiency=train_real_cost/train_padded_cost if train_padded_cost>0 else None, 
                                       elapsed_secs=elapsed_secs, 
                                       loss=numpy.mean(train_losses),
                                       metric=self.model.decoder._unsqueezed_evaluate(train_y_gold, train_y_pred) if self.num_metrics>0 else None,
@@ -284,6 +314,7 @@ class Trainer(object):
                     train_losses = []
                     train_y_gold = [[] for k in range(self.num_metrics)]
                     train_y_pred = [[] for k in range(self.num_metrics)]
+                    train_real_cost, train_padded_cost = 0, 0
                     t0 = time.time()
                 
                 if (sidx+1) % eval_every_steps == 0 and dev_loader is not None:
@@ -340,7 +371,7 @@ class Trainer(object):
 
 
 
-def disp_running_info(eidx=None, sidx=None, lrs=None, elapsed_secs=None, loss=None, metric=None, partition='train'):
+def disp_running_info(eidx=None, sidx=None, lrs=None, padding_efficiency=None, elapsed_secs=None, loss=None, metric=None, partition='train'):
     disp_text = []
     if eidx is not None:
         disp_text.append(f"Epoch: {eidx+1}")
@@ -348,6 +379,8 @@ def disp_running_info(eidx=None, sidx=None, lrs=None, elapsed_secs=None, loss=No
         disp_text.append(f"Step: {sidx+1}")
     if lrs is not None:
         disp_text.append("LR: (" + "/".join(f"{lr:.6f}" for lr in lrs) + ")")
+    if padding_efficiency is not None:
+        disp_text.append(f"Padding Efficiency: {padding_efficiency*100:.2f}%")
     if len(disp_text) > 0:
         logger.info(" | ".join(disp_text))
     
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
-from .algorithms import find_ascending
+from .algorithms import find_ascending, assign_intervals_to_spans
 from .transition import ChunksTagsTranslator
 from .chunk import TextChunksTranslator
+from .parallel import map_in_forked_workers
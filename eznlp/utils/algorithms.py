@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+from typing import List
+import bisect
 
 
 def find_ascending(sequence: list, value, start: int=None, end: int=None):
@@ -44,3 +46,38 @@ def find_ascending(sequence: list, value, start: int=None, end: int=None):
         return find_ascending(sequence, value, start=mid, end=end)
     else:
         return find_ascending(sequence, value, start=start, end=mid)
+
+
+
+def assign_intervals_to_spans(intervals: List[tuple], spans: List[tuple]):
+    """
+    Find the intervals contained by each span, based on a sorted index of interval starts. 
+    
+    Parameters
+    ----------
+    intervals : list of tuples
+        Each interval follows the format of (start, end). 
+    spans : list of tuples
+        Each span follows the format of (start, end). 
+        
+    Returns
+    -------
+    span_interval_ids: List[List[int]]
+        For each span, the indexes of intervals such that `span_start <= start` and `end <= span_end`, in ascending order. 
+    
+    Notes
+    -----
+    The time complexity is O((S + C) log C), where S and C are the numbers of spans and intervals, respectively, 
+    provided that the spans do not overlap with each other. 
+    """
+    sorted_ids = sorted(range(len(intervals)), key=lambda i: intervals[i][0])
+    sorted_starts = [intervals[i][0] for i in sorted_ids]
+    
+    span_interval_ids = []
+    for span_start, span_end in spans:
+        lo = bisect.bisect_left(sorted_starts, span_start)
+        hi = bisect.bisect_right(sorted_starts, span_end, lo=lo)
+        curr_ids = [i for i in sorted_ids[lo:hi] if intervals[i][1] <= span_end]
+        curr_ids.sort()
+        span_interval_ids.append(curr_ids)
+    return span_interval_ids
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from typing import Callable, Iterable
+import multiprocessing
+
+
+# The function shared with forked workers in `map_in_forked_workers`
+_forked_func = None
+
+
+def _apply_forked_func(arg):
+    return _forked_func(arg)
+
+
+def map_in_forked_workers(func: Callable, args: Iterable, num_workers: int=0):
+    """Lazily map `func` over `args`, in order. 
+    
+    If `num_workers` is positive, `func` is applied in parallel by forked processes, which inherit `func` (including 
+    the objects it is bound to, e.g., the partitions or datasets), instead of receiving it pickled. Fall back to mapping 
+    in this process if `fork` is unavailable. 
+    """
+    global _forked_func
+    if num_workers > 0 and 'fork' in multiprocessing.get_all_start_methods():
+        # The workers are forked on creating the pool, so restoring the previous function does not affect them
+        prev_func, _forked_func = _forked_func, func
+        try:
+            with multiprocessing.get_context('fork').Pool(num_workers) as pool:
+                yield from pool.imap(_apply_forked_func, args)
+        finally:
+            _forked_func = prev_func
+    else:
+        yield from map(func, args)
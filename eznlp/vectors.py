@@ -1,8 +1,14 @@
 # -*- coding: utf-8 -*-
-from typing import Union, List
+from typing import Union, List, Tuple, Iterable
 import os
+import shutil
+import itertools
+import multiprocessing
+import hashlib
+import json
 import tqdm
 import logging
+import numpy
 import torch
 
 logger = logging.getLogger(__name__)
@@ -13,60 +19,291 @@ def _parse_line(line: bytes):
     return w, [float(v) for v in vector]
 
 
-def _infer_shape(path: str, skiprows: List[int]):
-    vec_dim = None
-    with open(path, 'rb') as f:
-        for i, line in enumerate(f):
-            if i in skiprows:
-                continue
-            if vec_dim is None:
-                w, vector = _parse_line(line)
-                vec_dim = len(vector)
+def _parse_lines(lines: List[bytes], vec_dim: int, encoding: str):
+    """Parse lines into words and a float32 matrix, skipping (and returning) the bad lines. 
+    """
+    words, rests = [], []
+    for line in lines:
+        w, _, rest = line.rstrip().partition(b" ")
+        words.append(w)
+        rests.append(rest)
     
-    return i+1, vec_dim
+    if len(lines) > 0:
+        try:
+            # `numpy.loadtxt` parses in C, and raises errors for any bad line (note that blank lines are ignored)
+            vectors = numpy.loadtxt(rests, dtype=numpy.float32, delimiter=" ", comments=None, ndmin=2)
+            if vectors.shape == (len(lines), vec_dim):
+                return [w.decode(encoding) for w in words], vectors, []
+        except (ValueError, UnicodeDecodeError):
+            pass
+    
+    # Fall back to line-by-line parsing, to locate the bad lines
+    words, vectors, bad_lines = [], [], []
+    for line in lines:
+        try:
+            w, vector = _parse_line(line)
+            assert len(vector) == vec_dim
+            words.append(w.decode(encoding))
+            vectors.append(vector)
+        except (ValueError, UnicodeDecodeError, AssertionError):
+            bad_lines.append(line)
+    return words, numpy.array(vectors, dtype=numpy.float32).reshape(-1, vec_dim), bad_lines
+
 
+def _parse_range(path: str, start: int, end: int, vec_dim: int, encoding: str):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).split(b"\n")
+    # The range ends with a newline, except at the end of the file
+    if len(lines[-1]) == 0:
+        lines.pop()
+    return _parse_lines(lines, vec_dim, encoding)
 
-def _load_from_file(path: str, encoding=None, skiprows: Union[int, List[int]]=None, verbose=False):
+
+def _parse_range_star(args):
+    return _parse_range(*args)
+
+
+def _iter_load_from_file(path: str, encoding=None, skiprows: Union[int, List[int]]=None, verbose=False, num_workers: int=0, chunk_bytes: int=2**24):
+    """Parse a text file of vectors in a single pass, yielding the words and float32 matrices chunk by chunk. 
+    
+    Parameters
+    ----------
+    skiprows: int or List[int]
+        The line numbers to skip (e.g., 0 for the header line). 
+    num_workers: int
+        If positive, the byte ranges (split at line boundaries) are parsed by a pool of `num_workers` processes. 
+        The output follows the order of lines regardless of `num_workers`. 
+    chunk_bytes: int
+        The approximate number of bytes of each range. 
+    """
     logger.info(f"Loading vectors from {path}")
+    if encoding is None:
+        encoding = 'utf-8'
     if skiprows is None:
         skiprows = []
     elif isinstance(skiprows, int):
         skiprows = [skiprows]
     assert all(isinstance(row, int) for row in skiprows)
+    max_skiprow = max(skiprows, default=-1)
     
-    words, vectors = [], []
-    num_lines, vec_dim = _infer_shape(path, skiprows)
     with open(path, 'rb') as f:
+        # The lines until the last skipped row (and the first non-skipped row, which determines `vec_dim`) are read sequentially
+        head_lines, vec_dim, i = [], None, 0
+        while vec_dim is None or i <= max_skiprow:
+            line = f.readline()
+            if len(line) == 0:
+                break
+            if i not in skiprows:
+                if vec_dim is None:
+                    w, vector = _parse_line(line)
+                    vec_dim = len(vector)
+                head_lines.append(line)
+            i += 1
+        
+        # The other lines are split into byte ranges starting at line boundaries
+        boundaries = [f.tell()]
+        file_size = os.fstat(f.fileno()).st_size
+        while boundaries[-1] < file_size:
+            f.seek(min(boundaries[-1] + chunk_bytes, file_size))
+            f.readline()
+            boundaries.append(f.tell())
+    
+    if vec_dim is None:
+        raise ValueError(f"No vectors found in {path}")
+    
+    tasks = [(path, start, end, vec_dim, encoding) for start, end in zip(boundaries[:-1], boundaries[1:])]
+    num_bytes = [boundaries[0]] + [end - start for start, end in zip(boundaries[:-1], boundaries[1:])]
+    pool = multiprocessing.Pool(num_workers) if num_workers > 0 else None
+    try:
+        results = pool.imap(_parse_range_star, tasks) if pool is not None else map(_parse_range_star, tasks)
+        results = itertools.chain([_parse_lines(head_lines, vec_dim, encoding)], results)
+        
         num_bad_lines = 0
-        for i, line in tqdm.tqdm(enumerate(f), total=num_lines, disable=not verbose, ncols=100, desc="Loading vectors"):
-            if i in skiprows:
-                continue
-            try:
-                w, vector = _parse_line(line)
-                words.append(w.decode(encoding))
-                assert len(vector) == vec_dim
-                vectors.append(vector)
-            except KeyboardInterrupt as e:
-                raise e
-            except:
-                num_bad_lines += 1
-                logger.warning(f"Bad line detected: {line.rstrip()}")
+        with tqdm.tqdm(total=file_size, disable=not verbose, ncols=100, desc="Loading vectors") as pbar:
+            for (words, vectors, bad_lines), curr_num_bytes in zip(results, num_bytes):
+                for line in bad_lines:
+                    logger.warning(f"Bad line detected: {line.rstrip()}")
+                num_bad_lines += len(bad_lines)
+                pbar.update(curr_num_bytes)
+                yield words, vectors
+    finally:
+        if pool is not None:
+            pool.terminate()
     
     if num_bad_lines > 0:
         logger.warning(f"Totally {num_bad_lines} bad lines exist and were skipped")
+
+
+def _load_from_file(path: str, encoding=None, **kwargs):
+    words, vectors = [], []
+    for curr_words, curr_vectors in _iter_load_from_file(path, encoding, **kwargs):
+        words.extend(curr_words)
+        vectors.append(curr_vectors)
+    return words, torch.from_numpy(numpy.concatenate(vectors))
+
+
+
+_storage_dtypes = {'float32': torch.float32, 'float16': torch.float16, 'bfloat16': torch.bfloat16, 'int8': torch.int8}
+# `numpy` has no bfloat16, so bfloat16 vectors are saved as their int16 bit patterns
+_numpy_storage_dtypes = {'float32': numpy.float32, 'float16': numpy.float16, 'bfloat16': numpy.int16, 'int8': numpy.int8}
+
+
+def _quantize(vectors: torch.FloatTensor, dtype: str):
+    """Convert float vectors to the storage `dtype`, returning the converted vectors and the row-wise scales (only for int8). 
+    """
+    if dtype not in _storage_dtypes:
+        raise ValueError(f"Invalid storage dtype {dtype}")
+    if dtype != 'int8':
+        return vectors.to(_storage_dtypes[dtype]), None
+    
+    # Symmetric row-wise quantization, i.e., `vectors ~= int8_vectors * scales`
+    vectors = vectors.float()
+    scales = vectors.abs().amax(dim=1) / 127
+    scales = torch.where(scales > 0, scales, torch.ones_like(scales))
+    return torch.round(vectors / scales.unsqueeze(1)).to(torch.int8), scales
+
+
+def _hash_word(word: bytes):
+    # A stable 64-bit hash (the builtin `hash` is randomized across processes)
+    return int.from_bytes(hashlib.blake2b(word, digest_size=8).digest(), 'little')
+
+
+
+class IndexedVocab(object):
+    """A memory-mapped vocabulary of pretrained vectors, built by `IndexedVocab.build`. 
     
-    vectors = torch.tensor(vectors)
-    return words, vectors
+    The words are stored as a flat UTF-8 byte array with offsets, and are located by binary search over their 
+    sorted 64-bit hashes. Hence, neither a list nor a dict of all the words is built in memory. 
+    
+    It behaves as both `itos` (a sequence of words) and `stoi` (via `get` and `in`). 
+    
+    Parameters
+    ----------
+    path: str
+        The folder of the vocabulary files. 
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+        
+    def _open(self):
+        # Viewing as `numpy.ndarray` avoids the overhead of slicing `numpy.memmap`, while the mapping is retained by the view
+        self.offsets = numpy.load(f"{self.path}/word_offsets.npy", mmap_mode='r').view(numpy.ndarray)
+        self.hashes = numpy.load(f"{self.path}/word_hashes.npy", mmap_mode='r').view(numpy.ndarray)
+        self.ids = numpy.load(f"{self.path}/word_ids.npy", mmap_mode='r').view(numpy.ndarray)
+        # `numpy.memmap` fails to map empty files
+        if self.offsets[-1] > 0:
+            self.words = numpy.memmap(f"{self.path}/words.bin", dtype=numpy.uint8, mode='r').view(numpy.ndarray)
+        else:
+            self.words = numpy.zeros(0, dtype=numpy.uint8)
+        
+    def __getstate__(self):
+        # Re-open the memory maps instead of pickling the arrays
+        return {'path': self.path}
+        
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._open()
+        
+    def __len__(self):
+        return len(self.offsets) - 1
+        
+    def __getitem__(self, i: int):
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"Word index {i} out of range")
+        i = i % len(self)
+        return self.words[self.offsets[i]:self.offsets[i+1]].tobytes().decode('utf-8')
+        
+    def __iter__(self):
+        words = self.words.tobytes()
+        offsets = self.offsets.tolist()
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield words[start:end].decode('utf-8')
+        
+    def __contains__(self, word: str):
+        return self.get(word) is not None
+        
+    def _match(self, word_bytes: bytes, lo: int, hi: int, default=None):
+        # Check the candidates with equal hashes; for duplicated words, the last index is returned, 
+        # consistent with a dict built by `{w: i for i, w in enumerate(itos)}`
+        idx = default
+        for k in range(lo, hi):
+            i = self.ids[k]
+            if self.words[self.offsets[i]:self.offsets[i+1]].tobytes() == word_bytes:
+                idx = int(i)
+        return idx
+        
+    def get(self, word: str, default=None):
+        """Return the index of `word`, or `default` if `word` is absent. 
+        """
+        word_bytes = word.encode('utf-8')
+        h = numpy.uint64(_hash_word(word_bytes))
+        return self._match(word_bytes, numpy.searchsorted(self.hashes, h, side='left'), numpy.searchsorted(self.hashes, h, side='right'), default=default)
+        
+    def get_indexes(self, words: List[str]):
+        """Return the indexes of `words` as an array, with -1 for absent words. 
+        
+        The binary search is vectorized over all the words. 
+        """
+        words_bytes = [w.encode('utf-8') for w in words]
+        hashes = numpy.fromiter((_hash_word(w) for w in words_bytes), dtype=numpy.uint64, count=len(words_bytes))
+        los = numpy.searchsorted(self.hashes, hashes, side='left')
+        his = numpy.searchsorted(self.hashes, hashes, side='right')
+        
+        indexes = numpy.full(len(words_bytes), -1, dtype=numpy.int64)
+        for k in numpy.flatnonzero(his > los).tolist():
+            indexes[k] = self._match(words_bytes[k], los[k], his[k], default=-1)
+        return indexes
+        
+    @staticmethod
+    def build(itos: List[str], path: str):
+        """Write the vocabulary files of `itos` into the (existing) folder `path`. 
+        """
+        words = [w.encode('utf-8') for w in itos]
+        offsets = numpy.zeros(len(words)+1, dtype=numpy.int64)
+        numpy.cumsum(numpy.fromiter((len(w) for w in words), dtype=numpy.int64, count=len(words)), out=offsets[1:])
+        hashes = numpy.fromiter((_hash_word(w) for w in words), dtype=numpy.uint64, count=len(words))
+        # Stable sorting keeps duplicated words in the order of indexes
+        ids = numpy.argsort(hashes, kind='stable')
+        
+        with open(f"{path}/words.bin", 'wb') as f:
+            f.write(b"".join(words))
+        numpy.save(f"{path}/word_offsets.npy", offsets)
+        numpy.save(f"{path}/word_hashes.npy", hashes[ids])
+        numpy.save(f"{path}/word_ids.npy", ids.astype(numpy.int64))
 
 
 
 class Vectors(object):
-    def __init__(self, itos: List[str], vectors: torch.FloatTensor, unk_init=None):
+    """Pretrained word vectors. 
+    
+    Parameters
+    ----------
+    itos: List[str] or IndexedVocab
+        The words, corresponding to the rows of `vectors`. 
+    vectors: torch.Tensor
+        The vector matrix of shape (voc_dim, emb_dim), stored in float32, float16, bfloat16 or int8. 
+    unk_init: callable
+        The function returning the vector of unknown words, given `emb_dim`. 
+    scales: torch.FloatTensor, optional
+        The row-wise scales of int8 `vectors`, of shape (voc_dim, ). 
+    
+    Notes
+    -----
+    The vectors accessed by `__getitem__`, `lookup` and `get_rows` are always dequantized to float32. 
+    """
+    _cache_format_version = 1
+    
+    def __init__(self, itos: Union[List[str], IndexedVocab], vectors: torch.Tensor, unk_init=None, scales: torch.FloatTensor=None):
         if len(itos) != vectors.size(0):
             raise ValueError(f"Vocaburaly size {len(itos)} does not match vector size {vectors.size(0)}")
+        if (vectors.dtype == torch.int8) != (scales is not None):
+            raise ValueError("`scales` should be provided if and only if `vectors` are int8")
         
         self.itos = itos
         self.vectors = vectors
+        self.scales = scales
         self.unk_init = torch.zeros if unk_init is None else unk_init
         
         
@@ -75,13 +312,48 @@ class Vectors(object):
         return self._itos
         
     @itos.setter
-    def itos(self, itos: List[str]):
+    def itos(self, itos: Union[List[str], IndexedVocab]):
         self._itos = itos
-        self.stoi = {w: i for i, w in enumerate(itos)}
+        # `IndexedVocab` maps words to indexes by itself, without building a dict
+        self.stoi = itos if isinstance(itos, IndexedVocab) else {w: i for i, w in enumerate(itos)}
+        
+    @property
+    def storage_dtype(self):
+        return str(self.vectors.dtype).replace('torch.', '')
+        
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if isinstance(self._itos, IndexedVocab) and os.path.exists(self._vectors_file(self._itos.path, self.storage_dtype)):
+            # Re-open the memory-mapped matrix instead of pickling it
+            state['vectors'] = None
+            state['scales'] = None
+            state['mmap_dtype'] = self.storage_dtype
+        return state
+        
+    def __setstate__(self, state: dict):
+        mmap_dtype = state.pop('mmap_dtype', 'float32')
+        self.__dict__.update(state)
+        if self.vectors is None:
+            self.vectors, self.scales = self._open_vectors(self._itos.path, dtype=mmap_dtype)
+        
+    def astype(self, dtype: str):
+        """Return the vectors in the storage `dtype` (`float32`, `float16`, `bfloat16` or `int8`), sharing the vocabulary. 
+        """
+        vectors, scales = _quantize(self.get_rows(slice(None)), dtype)
+        return Vectors(self.itos, vectors, unk_init=self.unk_init, scales=scales)
+        
+    def get_rows(self, indexes):
+        """Return the float32 (dequantized) vectors at the row `indexes`. 
+        """
+        rows = self.vectors[indexes].float()
+        if self.scales is not None:
+            rows = rows * self.scales[indexes].unsqueeze(-1)
+        return rows
         
     def __getitem__(self, token: str):
-        if token in self.stoi:
-            return self.vectors[self.stoi[token]]
+        idx = self.stoi.get(token)
+        if idx is not None:
+            return self.get_rows(idx)
         else:
             return self.unk_init(self.emb_dim)
         
@@ -91,12 +363,48 @@ class Vectors(object):
         for possible_token in [token, token.lower(), token.title(), token.upper()]:
             if possible_token in tried_set:
                 continue
-            if possible_token in self.stoi:
-                return self.vectors[self.stoi[possible_token]]
+            idx = self.stoi.get(possible_token)
+            if idx is not None:
+                return self.get_rows(idx)
             else:
                 tried_set.add(possible_token)
         return None
         
+    def align(self, itos: List[str]):
+        """Align the words to the rows of vectors in bulk, with the same backup tokens as `lookup`. 
+        
+        Parameters
+        ----------
+        itos: List[str]
+            The words to align (e.g., `Vocab.itos`). 
+        
+        Returns
+        -------
+        indexes: torch.LongTensor
+            (len(itos), ) The row indexes of the words, with -1 for the words without vectors. 
+        found: torch.BoolTensor
+            (len(itos), ) Whether each word has a vector. 
+        """
+        indexes = numpy.full(len(itos), -1, dtype=numpy.int64)
+        missing = numpy.arange(len(itos))
+        # Backup tokens, each queried only for the words still missing
+        for transform in [None, str.lower, str.title, str.upper]:
+            if len(missing) == 0:
+                break
+            words = [itos[i] for i in missing.tolist()]
+            if transform is not None:
+                words = [transform(w) for w in words]
+            
+            if isinstance(self.stoi, IndexedVocab):
+                curr_indexes = self.stoi.get_indexes(words)
+            else:
+                curr_indexes = numpy.array([self.stoi.get(w, -1) for w in words], dtype=numpy.int64)
+            indexes[missing] = curr_indexes
+            missing = missing[curr_indexes < 0]
+        
+        indexes = torch.from_numpy(indexes)
+        return indexes, indexes >= 0
+        
     def __repr__(self):
         return f"{self.__class__.__name__}({self.voc_dim}, {self.emb_dim})"
         
@@ -112,24 +420,122 @@ class Vectors(object):
         return self.vectors.size(1)
         
     @staticmethod
-    def save_to_cache(path: str, itos: List[str], vectors: torch.FloatTensor):
-        logger.info(f"Saving vectors to {path}.pt")
-        torch.save((itos, vectors), f"{path}.pt")
+    def cache_exists(path: str):
+        return os.path.exists(f"{path}.cache/meta.json") or os.path.exists(f"{path}.pt")
+        
+    @classmethod
+    def save_to_cache(cls, path: str, itos: List[str], vectors: torch.FloatTensor):
+        """Save the vectors to the folder `{path}.cache`, which consists of the matrix in `.npy` format 
+        and an `IndexedVocab`, so that both can be memory-mapped by `load_from_cache`. 
+        """
+        cls._save_chunks_to_cache(path, [(itos, vectors.float().numpy())])
+        
+    @classmethod
+    def _save_chunks_to_cache(cls, path: str, chunks: Iterable[Tuple[List[str], numpy.ndarray]]):
+        # The chunks are streamed to disk, without holding the whole matrix in memory
+        logger.info(f"Saving vectors to {path}.cache")
+        cache_path = f"{path}.cache"
+        tmp_path = f"{cache_path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        try:
+            itos, emb_dim = [], None
+            with open(f"{tmp_path}/vectors.bin", 'wb') as f:
+                for words, vectors in chunks:
+                    itos.extend(words)
+                    emb_dim = vectors.shape[1]
+                    f.write(numpy.ascontiguousarray(vectors, dtype=numpy.float32).tobytes())
+            
+            # Prepend the `.npy` header, as the shape is known only after parsing
+            with open(f"{tmp_path}/vectors.npy", 'wb') as f, open(f"{tmp_path}/vectors.bin", 'rb') as bin_f:
+                numpy.lib.format.write_array_header_1_0(f, {'descr': numpy.lib.format.dtype_to_descr(numpy.dtype(numpy.float32)), 
+                                                            'fortran_order': False, 
+                                                            'shape': (len(itos), emb_dim)})
+                shutil.copyfileobj(bin_f, f, length=2**24)
+            os.remove(f"{tmp_path}/vectors.bin")
+            
+            IndexedVocab.build(itos, tmp_path)
+            with open(f"{tmp_path}/meta.json", 'w') as f:
+                json.dump({'format_version': cls._cache_format_version, 
+                           'voc_dim': len(itos), 
+                           'emb_dim': emb_dim}, f, indent=4)
+                
+            if os.path.exists(cache_path):
+                shutil.rmtree(cache_path)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
         
     @staticmethod
-    def load_from_cache(path: str):
-        logger.info(f"Loading vectors from {path}.pt")
-        itos, vectors = torch.load(f"{path}.pt")
-        return itos, vectors
+    def _save_quantized_to_cache(cache_path: str, dtype: str, block_size: int=2**16):
+        # Convert the float32 matrix block by block, without loading it into memory
+        vectors = numpy.load(f"{cache_path}/vectors.npy", mmap_mode='r')
+        tmp_suffix = f"tmp-{os.getpid()}.npy"
+        q_vectors = numpy.lib.format.open_memmap(f"{cache_path}/vectors.{dtype}.{tmp_suffix}", mode='w+', dtype=_numpy_storage_dtypes[dtype], shape=vectors.shape)
+        if dtype == 'int8':
+            scales = numpy.lib.format.open_memmap(f"{cache_path}/scales.int8.{tmp_suffix}", mode='w+', dtype=numpy.float32, shape=vectors.shape[:1])
+        
+        for start in range(0, vectors.shape[0], block_size):
+            curr_vectors, curr_scales = _quantize(torch.from_numpy(numpy.array(vectors[start:start+block_size])), dtype)
+            if dtype == 'bfloat16':
+                curr_vectors = curr_vectors.view(torch.int16)
+            q_vectors[start:start+block_size] = curr_vectors.numpy()
+            if dtype == 'int8':
+                scales[start:start+block_size] = curr_scales.numpy()
+        
+        q_vectors.flush()
+        del q_vectors
+        if dtype == 'int8':
+            scales.flush()
+            del scales
+            os.replace(f"{cache_path}/scales.int8.{tmp_suffix}", f"{cache_path}/scales.int8.npy")
+        os.replace(f"{cache_path}/vectors.{dtype}.{tmp_suffix}", f"{cache_path}/vectors.{dtype}.npy")
+        
+    @staticmethod
+    def _vectors_file(cache_path: str, dtype: str):
+        return f"{cache_path}/vectors.npy" if dtype == 'float32' else f"{cache_path}/vectors.{dtype}.npy"
         
     @classmethod
-    def load(cls, path: str, encoding=None, **kwargs):
-        if os.path.exists(f"{path}.pt"):
-            itos, vectors = cls.load_from_cache(path)
+    def _open_vectors(cls, cache_path: str, dtype: str='float32'):
+        # The copy-on-write mapping shares the physical pages across processes, and only the accessed rows are read from disk
+        vectors = torch.from_numpy(numpy.load(cls._vectors_file(cache_path, dtype), mmap_mode='c').view(numpy.ndarray))
+        if dtype == 'bfloat16':
+            vectors = vectors.view(torch.bfloat16)
+        if dtype == 'int8':
+            scales = torch.from_numpy(numpy.load(f"{cache_path}/scales.int8.npy", mmap_mode='c').view(numpy.ndarray))
         else:
-            itos, vectors = _load_from_file(path, encoding, **kwargs)
+            scales = None
+        return vectors, scales
+        
+    @classmethod
+    def load_from_cache(cls, path: str, dtype: str='float32'):
+        """Load the memory-mapped vocabulary, vectors (in the storage `dtype`) and scales (only for int8) from the cache. 
+        
+        The cache of a non-float32 `dtype` is converted from the float32 one on first use. 
+        """
+        if dtype not in _storage_dtypes:
+            raise ValueError(f"Invalid storage dtype {dtype}")
+        if not os.path.exists(f"{path}.cache/meta.json"):
+            # Convert the legacy cache saved by `torch.save`
+            logger.info(f"Loading vectors from {path}.pt")
+            itos, vectors = torch.load(f"{path}.pt")
             cls.save_to_cache(path, itos, vectors)
-        return cls(itos, vectors)
+            
+        logger.info(f"Loading vectors from {path}.cache")
+        with open(f"{path}.cache/meta.json") as f:
+            meta = json.load(f)
+        if meta['format_version'] != cls._cache_format_version:
+            raise ValueError(f"Incompatible cache format version {meta['format_version']} at {path}.cache")
+        if not os.path.exists(cls._vectors_file(f"{path}.cache", dtype)):
+            cls._save_quantized_to_cache(f"{path}.cache", dtype)
+        return (IndexedVocab(f"{path}.cache"), *cls._open_vectors(f"{path}.cache", dtype=dtype))
+        
+    @classmethod
+    def load(cls, path: str, encoding=None, dtype: str='float32', **kwargs):
+        if not cls.cache_exists(path):
+            cls._save_chunks_to_cache(path, _iter_load_from_file(path, encoding, **kwargs))
+        itos, vectors, scales = cls.load_from_cache(path, dtype=dtype)
+        return cls(itos, vectors, scales=scales)
 
 
 
@@ -137,21 +543,17 @@ class GloVe(Vectors):
     """
     https://nlp.stanford.edu/projects/glove/
     """
-    def __init__(self, path: str, encoding=None, **kwargs):
-        if os.path.exists(f"{path}.pt"):
-            itos, vectors = self.load_from_cache(path)
-        else:
-            itos, vectors = _load_from_file(path, encoding)
-            self.save_to_cache(path, itos, vectors)
+    def __init__(self, path: str, encoding=None, num_workers: int=0, dtype: str='float32', **kwargs):
+        if not self.cache_exists(path):
+            self._save_chunks_to_cache(path, _iter_load_from_file(path, encoding, num_workers=num_workers))
+        itos, vectors, scales = self.load_from_cache(path, dtype=dtype)
         
-        super().__init__(itos, vectors, **kwargs)
+        super().__init__(itos, vectors, scales=scales, **kwargs)
 
 
 class Senna(Vectors):
-    def __init__(self, path: str, **kwargs):
-        if os.path.exists(f"{path}.pt"):
-            itos, vectors = self.load_from_cache(path)
-        else:
+    def __init__(self, path: str, dtype: str='float32', **kwargs):
+        if not self.cache_exists(path):
             with open(f"{path}/hash/words.lst", 'r') as f:
                 itos = [w.strip() for w in f.readlines()]
             with open(f"{path}/embeddings/embeddings.txt", 'r') as f:
@@ -159,5 +561,6 @@ class Senna(Vectors):
                 
             vectors = torch.tensor(vectors)
             self.save_to_cache(path, itos, vectors)
+        itos, vectors, scales = self.load_from_cache(path, dtype=dtype)
         
-        super().__init__(itos, vectors, **kwargs)
+        super().__init__(itos, vectors, scales=scales, **kwargs)
@@ -1,6 +1,69 @@
 # -*- coding: utf-8 -*-
-from typing import List
+from typing import List, Tuple, Callable
 from collections import Counter
+import itertools
+import functools
+import numpy
+
+from .utils import map_in_forked_workers
+
+
+def _count_shard(partitions: List[list], get_tokens_and_len: Callable, shard: Tuple[int, int, int]):
+    k, start, end = shard
+    data = partitions[k]
+    if isinstance(data, (list, tuple)):
+        entries = data[start:end]
+    elif end is not None:
+        # Other sized data (e.g., datasets) support indexing only
+        entries = (data[i] for i in range(start, end))
+    else:
+        # Iterable data is counted as a whole
+        entries = data
+    
+    counter, max_len = Counter(), None
+    for entry in entries:
+        seq, seq_len = get_tokens_and_len(entry)
+        counter.update(seq)
+        if seq_len is not None and (max_len is None or seq_len > max_len):
+            max_len = seq_len
+    return counter, max_len
+
+
+def count_tokens(partitions: List[list], get_tokens_and_len: Callable, num_workers: int=0, shard_size: int=10000):
+    """Count the tokens over all data entries, in a map-reduce manner over shards of entries. 
+    
+    Parameters
+    ----------
+    partitions: List[list]
+        The data partitions. 
+    get_tokens_and_len: Callable
+        Map a data entry to its tokens to count, and a length (e.g., of the sequence) to maximize. 
+    num_workers: int
+        If positive, the shards are counted in parallel by forked processes, which inherit the partitions 
+        instead of receiving them pickled. Fall back to counting in this process if `fork` is unavailable. 
+    
+    Returns
+    -------
+    counter: Counter
+    max_len: int
+        The maximum length, or `None` if there are no data entries. 
+    """
+    shards = []
+    for k, data in enumerate(partitions):
+        if hasattr(data, '__len__'):
+            shards.extend((k, start, min(start+shard_size, len(data))) for start in range(0, len(data), shard_size))
+        else:
+            # Iterable data (e.g., streaming from disk) is counted as a whole
+            shards.append((k, 0, None))
+    
+    results = list(map_in_forked_workers(functools.partial(_count_shard, partitions, get_tokens_and_len), shards, num_workers=num_workers))
+    
+    counter = Counter()
+    for shard_counter, _ in results:
+        counter.update(shard_counter)
+    max_len = max((shard_max_len for _, shard_max_len in results if shard_max_len is not None), default=None)
+    return counter, max_len
+
 
 
 class Vocab(object):
@@ -55,4 +118,23 @@ class Vocab(object):
         return len(self.itos)
         
     def lookup_indices(self, tokens):
-        return [self.__getitem__(token) for token in tokens]
+        return list(map(self.stoi.get, tokens, itertools.repeat(self.stoi.get('<unk>'))))
+        
+    def encode(self, sequences: List[List[str]]):
+        """Map sequences of tokens to a flat array of indices, plus the offsets of each sequence. 
+        
+        The indices of `sequences[i]` are `ids[offsets[i]:offsets[i+1]]`. 
+        """
+        seq_lens = [len(seq) for seq in sequences]
+        offsets = numpy.zeros(len(seq_lens)+1, dtype=numpy.int64)
+        numpy.cumsum(seq_lens, out=offsets[1:])
+        
+        tokens = itertools.chain.from_iterable(sequences)
+        unk_idx = self.stoi.get('<unk>')
+        if unk_idx is None:
+            # Raise `KeyError` for out-of-vocabulary tokens
+            ids = map(self.stoi.__getitem__, tokens)
+        else:
+            ids = map(self.stoi.get, tokens, itertools.repeat(unk_idx))
+        ids = numpy.fromiter(ids, dtype=numpy.int64, count=offsets[-1])
+        return ids, offsets
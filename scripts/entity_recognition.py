@@ -22,7 +22,7 @@ from eznlp.model.bert_like import segment_uniformly_for_bert_like
 from eznlp.training import Trainer, count_params, evaluate_entity_recognition
 
 from utils import add_base_arguments, parse_to_args
-from utils import load_data, dataset2language, load_pretrained, load_vectors, build_trainer, header_format, profile
+from utils import load_data, dataset2language, load_pretrained, load_vectors, build_train_loader, build_trainer, header_format, profile
 
 
 def parse_arguments(parser: argparse.ArgumentParser):
@@ -228,7 +228,9 @@ def collect_IE_assembly_config(args: argparse.Namespace):
             arch=args.bert_arch,
             freeze=False,
             use_truecase='cased'
-            in os.path.basename(bert_like.name_or_path).split('-'))
+            in os.path.basename(bert_like.name_or_path).split('-'),
+            sliding_window=args.bert_sliding_window,
+            packing=args.bert_packing)
     else:
         bert_like_config = None
 
@@ -288,22 +290,29 @@ def build_ER_config(args: argparse.Namespace):
 
 
 def process_IE_data(train_data, dev_data, test_data, args, config):
-    if (config.bert_like is not None and
+    # Overlong sequences are encoded by sliding windows, without being segmented
+    if (config.bert_like is not None and not config.bert_like.sliding_window and
         ((args.dataset in ('SIGHAN2006', 'yidu_s4k', 'cmeee')) or
          (args.dataset in ('conll2003', 'conll2012') and args.doc_level))):
         train_data = segment_uniformly_for_bert_like(
             train_data,
             config.bert_like.tokenizer,
             update_raw_idx=True,
-            verbose=args.log_terminal)
+            verbose=args.log_terminal,
+            sub_tok_cache=config.bert_like.sub_tok_cache,
+            max_len=config.bert_like.max_len)
         dev_data = segment_uniformly_for_bert_like(dev_data,
                                                    config.bert_like.tokenizer,
                                                    update_raw_idx=True,
-                                                   verbose=args.log_terminal)
+                                                   verbose=args.log_terminal,
+                                                   sub_tok_cache=config.bert_like.sub_tok_cache,
+                                                   max_len=config.bert_like.max_len)
         test_data = segment_uniformly_for_bert_like(test_data,
                                                     config.bert_like.tokenizer,
                                                     update_raw_idx=True,
-                                                    verbose=args.log_terminal)
+                                                    verbose=args.log_terminal,
+                                                    sub_tok_cache=config.bert_like.sub_tok_cache,
+                                                    max_len=config.bert_like.max_len)
 
     if args.use_softword or args.use_softlexicon:
         if config.nested_ohots is not None and 'softlexicon' in config.nested_ohots.keys(
@@ -355,6 +364,9 @@ if __name__ == '__main__':
     train_data, dev_data, test_data = load_data(args)
     args.language = dataset2language[args.dataset]
     config = build_ER_config(args)
+    if args.prepare_only:
+        logger.info("Shared resources prepared, exiting...")
+        sys.exit(0)
     train_data, dev_data, test_data = process_IE_data(train_data, dev_data,
                                                       test_data, args, config)
 
@@ -364,11 +376,7 @@ if __name__ == '__main__':
         dev_set = Dataset(dev_data, train_set.config, training=False)
         test_set = Dataset(test_data, train_set.config, training=False)
 
-        train_loader = torch.utils.data.DataLoader(
-            train_set,
-            batch_size=args.batch_size,
-            shuffle=True,
-            collate_fn=train_set.collate)
+        train_loader = build_train_loader(train_set, args)
         dev_loader = torch.utils.data.DataLoader(dev_set,
                                                  batch_size=args.batch_size,
                                                  shuffle=False,
@@ -379,11 +387,7 @@ if __name__ == '__main__':
         dev_set = Dataset([], train_set.config, training=False)
         test_set = Dataset(test_data, train_set.config, training=False)
 
-        train_loader = torch.utils.data.DataLoader(
-            train_set,
-            batch_size=args.batch_size,
-            shuffle=True,
-            collate_fn=train_set.collate)
+        train_loader = build_train_loader(train_set, args)
         dev_loader = None
 
     logger.info(train_set.summary)
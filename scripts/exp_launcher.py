@@ -31,6 +31,10 @@ if __name__ == '__main__':
                         help="number of experiments to run")
     parser.add_argument('--num_workers', type=int ,default=0, 
                         help="number of processes to run")
+    parser.add_argument('--data_cache_dir', type=str, default=None, 
+                        help="directory of the on-disk dataset caches, passed to all experiments, e.g., /dev/shm/eznlp (no caching if not specified)")
+    parser.add_argument('--num_prepares', type=int, default=1, 
+                        help="number of experiments to prepare resources for before running (-1 for all)")
     args = parser.parse_args()
     args.language = dataset2language[args.dataset]
     args.num_exps = None if args.num_exps < 0 else args.num_exps
@@ -43,6 +47,8 @@ if __name__ == '__main__':
     COMMAND = f"python scripts/{args.task}.py --dataset {args.dataset} --seed {args.seed}"
     if args.num_workers > 0:
         COMMAND = " ".join([COMMAND, "--no_log_terminal"])
+    if args.data_cache_dir is not None:
+        COMMAND = " ".join([COMMAND, f"--data_cache_dir {args.data_cache_dir}"])
     if args.use_bert:
         COMMAND = " ".join([COMMAND, "@scripts/options/with_bert.opt"])
     else:
@@ -240,6 +246,14 @@ if __name__ == '__main__':
     commands = [" ".join([COMMAND, *option]) for option in options]
     logger.warning(f"There are {len(commands)} experiments to run...")
     
+    if args.data_cache_dir is not None:
+        # Parse the datasets and vectors once, before any worker starts; the workers then load the caches, 
+        # where the vectors are memory-mapped and thus physically shared via the page cache. 
+        num_prepares = len(commands) if args.num_prepares < 0 else args.num_prepares
+        logger.warning(f"Preparing shared resources for {min(num_prepares, len(commands))} experiments...")
+        for curr_command in commands[:num_prepares]:
+            call_command(" ".join([curr_command, "--prepare_only"]))
+    
     if args.num_workers <= 0:
         logger.warning("Starting a single process to run...")
         for curr_command in commands:
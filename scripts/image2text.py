@@ -130,6 +130,9 @@ if __name__ == '__main__':
     args.language = dataset2language[args.dataset]
     # train_data, dev_data, test_data = train_data[:100], dev_data[:100], test_data[:100]
     config = build_I2T_config(args)
+    if args.prepare_only:
+        logger.info("Shared resources prepared, exiting...")
+        sys.exit(0)
     
     train_set = GenerationDataset(train_data, config, training=True)
     train_set.build_vocabs_and_dims()
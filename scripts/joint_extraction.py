@@ -20,7 +20,7 @@ from eznlp.model import ExtractorConfig
 from eznlp.training import Trainer, count_params, evaluate_joint_extraction
 
 from utils import add_base_arguments, parse_to_args
-from utils import load_data, dataset2language, load_pretrained, build_trainer, header_format
+from utils import load_data, dataset2language, load_pretrained, build_train_loader, build_trainer, header_format
 from entity_recognition import collect_IE_assembly_config, process_IE_data
 
 
@@ -167,6 +167,9 @@ if __name__ == '__main__':
     train_data, dev_data, test_data = load_data(args)
     args.language = dataset2language[args.dataset]
     config = build_joint_config(args)
+    if args.prepare_only:
+        logger.info("Shared resources prepared, exiting...")
+        sys.exit(0)
     train_data, dev_data, test_data = process_IE_data(train_data, dev_data, test_data, args, config)
     
     if not args.train_with_dev:
@@ -175,7 +178,7 @@ if __name__ == '__main__':
         dev_set   = Dataset(dev_data,  train_set.config, training=False)
         test_set  = Dataset(test_data, train_set.config, training=False)
         
-        train_loader = torch.utils.data.DataLoader(train_set, batch_size=args.batch_size, shuffle=True,  collate_fn=train_set.collate)
+        train_loader = build_train_loader(train_set, args)
         dev_loader   = torch.utils.data.DataLoader(dev_set,   batch_size=args.batch_size, shuffle=False, collate_fn=dev_set.collate)
     else:
         train_set = Dataset(train_data + dev_data, config, training=True)
@@ -183,7 +186,7 @@ if __name__ == '__main__':
         dev_set   = Dataset([],        train_set.config, training=False)
         test_set  = Dataset(test_data, train_set.config, training=False)
         
-        train_loader = torch.utils.data.DataLoader(train_set, batch_size=args.batch_size, shuffle=True,  collate_fn=train_set.collate)
+        train_loader = build_train_loader(train_set, args)
         dev_loader   = None
     
     logger.info(train_set.summary)
@@ -12,7 +12,7 @@ import torch
 import transformers
 
 from eznlp import auto_device
-from eznlp.io import RawTextIO
+from eznlp.io import RawTextIO, IndexedRawText
 from eznlp.dataset import PreTrainingDataset
 from eznlp.plm import MaskedLMConfig
 from eznlp.training import MaskedLMTrainer, LRLambda, count_params
@@ -36,6 +36,8 @@ def parse_arguments(parser: argparse.ArgumentParser):
                             help="dataset name")
     group_data.add_argument('--file_path', type=str, default='data/Wikipedia/text-zh/AA/wiki_00.cache', 
                             help="prepared pretraining data file path(s); accept patterns like '**/*.cache', if enclosed in quotes")
+    group_data.add_argument('--index_path', type=str, default=None, 
+                            help="memory-mapped index of the pretraining data; built from `file_path` if not existing")
     
     group_pretrain = parser.add_argument_group('pretrain')
     group_pretrain.add_argument('--vocab_fix', default=False, action='store_true', 
@@ -117,14 +119,28 @@ if __name__ == '__main__':
         bert4pt = transformers.BertForPreTraining.from_pretrained(PATH, hidden_dropout_prob=args.bert_drop_rate, attention_probs_dropout_prob=args.bert_drop_rate)
     tokenizer = transformers.BertTokenizer.from_pretrained(PATH, model_max_length=512, do_lower_case=True)
     
-    file_paths = glob.glob(args.file_path)
-    assert len(file_paths) > 0
-    logger.info(f"Text data files: {len(file_paths)}")
-    
     io = RawTextIO(encoding='utf-8', verbose=args.log_terminal)
-    train_data = []
-    for fn in file_paths:
-        train_data += io.read(fn)
+    file_paths = sorted(glob.glob(args.file_path))
+    if args.index_path is not None and os.path.exists(args.index_path) and len(file_paths) == 0:
+        logger.warning(f"No text data files found; the existing index {args.index_path} is used without checking")
+        train_data = IndexedRawText(args.index_path)
+    else:
+        assert len(file_paths) > 0
+        logger.info(f"Text data files: {len(file_paths)}")
+        
+        if args.index_path is not None:
+            # Only the main process builds the index, which is rebuilt if the data files or IO options change
+            if is_main_rank and not io.is_index_up_to_date(file_paths, args.index_path):
+                if os.path.exists(args.index_path):
+                    logger.info(f"Rebuilding the outdated index {args.index_path}")
+                io.build_index(file_paths, args.index_path)
+            if use_ddp:
+                torch.distributed.barrier()
+            train_data = IndexedRawText(args.index_path)
+        else:
+            train_data = []
+            for fn in file_paths:
+                train_data += io.read(fn)
     
     config = MaskedLMConfig(bert_like=bert4pt, tokenizer=tokenizer, 
                             masking_rate=args.masking_rate, masking_rate_dev=args.masking_rate_dev, 
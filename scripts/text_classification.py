@@ -21,7 +21,7 @@ from eznlp.model.bert_like import truncate_for_bert_like
 from eznlp.training import Trainer, count_params, evaluate_text_classification
 
 from utils import add_base_arguments, parse_to_args
-from utils import load_data, dataset2language, load_pretrained, load_vectors, build_trainer, header_format
+from utils import load_data, dataset2language, load_pretrained, load_vectors, build_train_loader, build_trainer, header_format
 
 
 def parse_arguments(parser: argparse.ArgumentParser):
@@ -78,6 +78,7 @@ def collect_TC_assembly_config(args: argparse.Namespace):
         bert_like, tokenizer = load_pretrained(args.bert_arch, args, cased=False)
         bert_like_config = BertLikeConfig(tokenizer=tokenizer, bert_like=bert_like, arch=args.bert_arch, freeze=False, 
                                           paired_inputs=args.paired_inputs, 
+                                          packing=args.bert_packing, 
                                           use_truecase='cased' in os.path.basename(bert_like.name_or_path).split('-'))
     else:
         bert_like_config = None
@@ -100,9 +101,9 @@ def build_TC_config(args: argparse.Namespace):
 def process_TC_data(train_data, dev_data, test_data, args, config):
     # Truncate too long sentences
     if config.bert_like is not None:
-        train_data = truncate_for_bert_like(train_data, config.bert_like.tokenizer, verbose=args.log_terminal)
-        dev_data   = truncate_for_bert_like(dev_data,   config.bert_like.tokenizer, verbose=args.log_terminal)
-        test_data  = truncate_for_bert_like(test_data,  config.bert_like.tokenizer, verbose=args.log_terminal)
+        train_data = truncate_for_bert_like(train_data, config.bert_like.tokenizer, verbose=args.log_terminal, sub_tok_cache=config.bert_like.sub_tok_cache, max_len=config.bert_like.max_len)
+        dev_data   = truncate_for_bert_like(dev_data,   config.bert_like.tokenizer, verbose=args.log_terminal, sub_tok_cache=config.bert_like.sub_tok_cache, max_len=config.bert_like.max_len)
+        test_data  = truncate_for_bert_like(test_data,  config.bert_like.tokenizer, verbose=args.log_terminal, sub_tok_cache=config.bert_like.sub_tok_cache, max_len=config.bert_like.max_len)
         
     elif args.dataset in ('ChnSentiCorp', 'THUCNews_10'):
         # Too long sentences even for RNN
@@ -158,6 +159,9 @@ if __name__ == '__main__':
     
     # train_data, dev_data, test_data = train_data[:1000], dev_data[:1000], test_data[:1000]
     config = build_TC_config(args)
+    if args.prepare_only:
+        logger.info("Shared resources prepared, exiting...")
+        sys.exit(0)
     train_data, dev_data, test_data = process_TC_data(train_data, dev_data, test_data, args, config)
     
     train_set = Dataset(train_data, config, training=True)
@@ -166,7 +170,7 @@ if __name__ == '__main__':
     test_set  = Dataset(test_data, train_set.config, training=False)
     
     logger.info(train_set.summary)
-    train_loader = torch.utils.data.DataLoader(train_set, batch_size=args.batch_size, shuffle=True,  collate_fn=train_set.collate)
+    train_loader = build_train_loader(train_set, args)
     dev_loader   = torch.utils.data.DataLoader(dev_set,   batch_size=args.batch_size, shuffle=False, collate_fn=dev_set.collate)
     
     
@@ -17,6 +17,7 @@ import transformers
 
 from eznlp.io import TabularIO, CategoryFolderIO, ConllIO, JsonIO, TextClsIO, KarpathyIO, BratIO, Src2TrgIO
 from eznlp.io import PostIO
+from eznlp.dataset import BucketBatchSampler
 from eznlp.vectors import Vectors, GloVe
 from eznlp.training import Trainer, LRLambda, collect_params, check_param_groups
 from eznlp.metrics import precision_recall_f1_report
@@ -32,6 +33,10 @@ def add_base_arguments(parser: argparse.ArgumentParser):
                              help="whether to profile")
     group_debug.add_argument('--no_log_terminal', dest='log_terminal', default=True, action='store_false', 
                              help="whether log to terminal")
+    group_debug.add_argument('--data_cache_dir', type=str, default=None, 
+                             help="directory to cache the parsed datasets (no caching if not specified)")
+    group_debug.add_argument('--prepare_only', default=False, action='store_true', 
+                             help="whether to only prepare the parsed datasets and vectors (i.e., build the caches) and exit")
     
     group_train = parser.add_argument_group('training hyper-parameters')
     group_train.add_argument('--seed', type=int, default=515, 
@@ -46,6 +51,12 @@ def add_base_arguments(parser: argparse.ArgumentParser):
                              help="number of epochs")
     group_train.add_argument('--batch_size', type=int, default=64, 
                              help="batch size")
+    group_train.add_argument('--bucket_batch', default=False, action='store_true', 
+                             help="whether to batch training sequences of similar lengths by `BucketBatchSampler`")
+    group_train.add_argument('--bucket_max_tokens', type=int, default=None, 
+                             help="budget of the padded cost per batch in bucket batching (no budget if not specified)")
+    group_train.add_argument('--bucket_cost', type=str, default='linear', choices=['linear', 'quadratic'], 
+                             help="cost of a sequence in bucket batching, i.e., linear or quadratic in its length")
     group_train.add_argument('--grad_clip', type=float, default=5.0, 
                              help="gradient clip (negative values are set to `None`)")
     
@@ -95,6 +106,10 @@ def add_base_arguments(parser: argparse.ArgumentParser):
                              help="bert-like architecture (None for w/o bert-like)")
     group_model.add_argument('--bert_drop_rate', type=float, default=0.2, 
                              help="dropout rate for BERT")
+    group_model.add_argument('--bert_sliding_window', default=False, action='store_true', 
+                             help="whether to encode overlong sequences by sliding windows in BERT")
+    group_model.add_argument('--bert_packing', default=False, action='store_true', 
+                             help="whether to pack several sequences into one row in BERT")
     group_model.add_argument('--use_interm2', default=False, action='store_true', 
                              help="whether to use intermediate2")
     return parser
@@ -155,9 +170,9 @@ dataset2language.update({f'HwaMei_{s}': 'Chinese' for s in range(500, 1201, 100)
 def load_data(args: argparse.Namespace):
     if args.dataset == 'conll2003':
         if args.doc_level:
-            io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', document_sep_starts=["-DOCSTART-"], document_level=True, case_mode='None', number_mode='Zeros')
+            io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', document_sep_starts=["-DOCSTART-"], document_level=True, case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         else:
-            io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', case_mode='None', number_mode='Zeros')
+            io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         train_data = io.read("data/conll2003/eng.train")
         dev_data   = io.read("data/conll2003/eng.testa")
         test_data  = io.read("data/conll2003/eng.testb")
@@ -165,7 +180,7 @@ def load_data(args: argparse.Namespace):
         if args.corrupt_rate > 0 and args.doc_level:
             set_chunks_gold = [ex['chunks'] for ex in train_data]
             
-            json_io = JsonIO(is_tokenized=True, case_mode='None', number_mode='Zeros')
+            json_io = JsonIO(is_tokenized=True, case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
             train_data = json_io.read(f"data/conll2003/eng.train.corrupted({args.corrupt_rate:.1f}, 1).json")
             # train_data = json_io.read(f"data/conll2003/eng.train.sys.corrupted({args.corrupt_rate:.1f}, 1).json")
             set_chunks_corr = [ex['chunks'] for ex in train_data]
@@ -176,9 +191,9 @@ def load_data(args: argparse.Namespace):
         
     elif args.dataset == 'conll2012':
         if args.doc_level:
-            io = ConllIO(text_col_id=3, tag_col_id=10, scheme='OntoNotes', sentence_sep_starts=["#end", "pt/"], document_sep_starts=["#begin"], document_level=True, encoding='utf-8', case_mode='None', number_mode='Zeros')
+            io = ConllIO(text_col_id=3, tag_col_id=10, scheme='OntoNotes', sentence_sep_starts=["#end", "pt/"], document_sep_starts=["#begin"], document_level=True, encoding='utf-8', case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         else:
-            io = ConllIO(text_col_id=3, tag_col_id=10, scheme='OntoNotes', sentence_sep_starts=["#end", "pt/"], document_sep_starts=["#begin"], encoding='utf-8', case_mode='None', number_mode='Zeros')
+            io = ConllIO(text_col_id=3, tag_col_id=10, scheme='OntoNotes', sentence_sep_starts=["#end", "pt/"], document_sep_starts=["#begin"], encoding='utf-8', case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         train_data = io.read("data/conll2012/train.english.v4_gold_conll")
         dev_data   = io.read("data/conll2012/dev.english.v4_gold_conll")
         test_data  = io.read("data/conll2012/test.english.v4_gold_conll")
@@ -186,7 +201,7 @@ def load_data(args: argparse.Namespace):
     elif args.dataset == 'ace2004':
         io = JsonIO(text_key='tokens', 
                     chunk_key='entities', chunk_type_key='type', chunk_start_key='start', chunk_end_key='end', 
-                    case_mode='None', number_mode='Zeros')
+                    case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         train_data = io.read("data/ace-lu2015emnlp/ACE2004/train.json")
         dev_data   = io.read("data/ace-lu2015emnlp/ACE2004/dev.json")
         test_data  = io.read("data/ace-lu2015emnlp/ACE2004/test.json")
@@ -194,7 +209,7 @@ def load_data(args: argparse.Namespace):
     elif args.dataset == 'ace2005':
         io = JsonIO(text_key='tokens', 
                     chunk_key='entities', chunk_type_key='type', chunk_start_key='start', chunk_end_key='end', 
-                    case_mode='None', number_mode='Zeros')
+                    case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         train_data = io.read("data/ace-lu2015emnlp/ACE2005/train.json")
         dev_data   = io.read("data/ace-lu2015emnlp/ACE2005/dev.json")
         test_data  = io.read("data/ace-lu2015emnlp/ACE2005/test.json")
@@ -211,7 +226,7 @@ def load_data(args: argparse.Namespace):
     elif args.dataset == 'genia':
         io = JsonIO(text_key='tokens', 
                     chunk_key='entities', chunk_type_key='type', chunk_start_key='start', chunk_end_key='end', 
-                    case_mode='None', number_mode='Zeros')
+                    case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         train_data = io.read("data/genia/term.train.json")
         dev_data   = []
         test_data  = io.read("data/genia/term.test.json")
@@ -220,7 +235,7 @@ def load_data(args: argparse.Namespace):
         io = JsonIO(text_key='tokens', 
                     chunk_key='entities', chunk_type_key='type', chunk_start_key='start', chunk_end_key='end', 
                     relation_key='relations', relation_type_key='type', relation_head_key='head', relation_tail_key='tail', 
-                    case_mode='None', number_mode='Zeros')
+                    case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         train_data = io.read("data/conll2004/conll04_train.json")
         dev_data   = io.read("data/conll2004/conll04_dev.json")
         test_data  = io.read("data/conll2004/conll04_test.json")
@@ -229,7 +244,7 @@ def load_data(args: argparse.Namespace):
         io = JsonIO(text_key='tokens', 
                     chunk_key='entities', chunk_type_key='type', chunk_start_key='start', chunk_end_key='end', 
                     relation_key='relations', relation_type_key='type', relation_head_key='head', relation_tail_key='tail', 
-                    case_mode='None', number_mode='Zeros')
+                    case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         train_data = io.read("data/SciERC/scierc_train.json")
         dev_data   = io.read("data/SciERC/scierc_dev.json")
         test_data  = io.read("data/SciERC/scierc_test.json")
@@ -238,7 +253,7 @@ def load_data(args: argparse.Namespace):
         io = JsonIO(text_key='tokens', 
                     chunk_key='entities', chunk_type_key='type', chunk_start_key='start', chunk_end_key='end', 
                     relation_key='relations', relation_type_key='type', relation_head_key='head', relation_tail_key='tail', 
-                    case_mode='None', number_mode='Zeros')
+                    case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         k = int(args.dataset.replace('ADE_cv', ''))
         train_data = io.read(f"data/ADE/ade_split_{k}_train.json")
         dev_data   = []
@@ -247,7 +262,7 @@ def load_data(args: argparse.Namespace):
         
     elif args.dataset.startswith('ace2004_rel_cv'):
         io = JsonIO(relation_key='relations', relation_type_key='type', relation_head_key='head', relation_tail_key='tail', 
-                    case_mode='None', number_mode='Zeros')
+                    case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         k = int(args.dataset.replace('ace2004_rel_cv', ''))
         train_data = io.read(f"data/ace-luan2019naacl/ace04/cv{k}.train.json")
         dev_data   = []
@@ -256,32 +271,32 @@ def load_data(args: argparse.Namespace):
         
     elif args.dataset == 'ace2005_rel':
         io = JsonIO(relation_key='relations', relation_type_key='type', relation_head_key='head', relation_tail_key='tail', 
-                    case_mode='None', number_mode='Zeros')
+                    case_mode='None', number_mode='Zeros', cache_dir=args.data_cache_dir)
         train_data = io.read("data/ace-luan2019naacl/ace05/train.json")
         dev_data   = io.read("data/ace-luan2019naacl/ace05/dev.json")
         test_data  = io.read("data/ace-luan2019naacl/ace05/test.json")
         
     elif args.dataset == 'ResumeNER':
-        conll_io = ConllIO(text_col_id=0, tag_col_id=1, scheme='BMES', encoding='utf-8', token_sep="", pad_token="")
+        conll_io = ConllIO(text_col_id=0, tag_col_id=1, scheme='BMES', encoding='utf-8', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = conll_io.read("data/ResumeNER/train.char.bmes")
         dev_data   = conll_io.read("data/ResumeNER/dev.char.bmes")
         test_data  = conll_io.read("data/ResumeNER/test.char.bmes")
         
     elif args.dataset == 'WeiboNER':
-        conll_io = ConllIO(text_col_id=0, tag_col_id=1, scheme='BIO2', encoding='utf-8', token_sep="", pad_token="", pre_text_normalizer=lambda x: x[0])
+        conll_io = ConllIO(text_col_id=0, tag_col_id=1, scheme='BIO2', encoding='utf-8', token_sep="", pad_token="", pre_text_normalizer=lambda x: x[0], cache_dir=args.data_cache_dir)
         train_data = conll_io.read("data/WeiboNER/weiboNER_2nd_conll.train")
         dev_data   = conll_io.read("data/WeiboNER/weiboNER_2nd_conll.dev")
         test_data  = conll_io.read("data/WeiboNER/weiboNER_2nd_conll.test")
         
     elif args.dataset == 'SIGHAN2006':
         # https://github.com/v-mipeng/LexiconAugmentedNER/issues/3#issuecomment-634563407
-        conll_io = ConllIO(text_col_id=0, tag_col_id=1, scheme='BIO2', encoding='utf-8', token_sep="", pad_token="")
+        conll_io = ConllIO(text_col_id=0, tag_col_id=1, scheme='BIO2', encoding='utf-8', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = conll_io.read("data/SIGHAN2006/train.txt")
         dev_data   = conll_io.read("data/SIGHAN2006/test.txt")
         test_data  = conll_io.read("data/SIGHAN2006/test.txt")
         
     elif args.dataset == 'conll2012_zh':
-        conll_io = ConllIO(text_col_id=3, tag_col_id=10, scheme='OntoNotes', sentence_sep_starts=["#end"], document_sep_starts=["#begin"], encoding='utf-8', token_sep="", pad_token="")
+        conll_io = ConllIO(text_col_id=3, tag_col_id=10, scheme='OntoNotes', sentence_sep_starts=["#end"], document_sep_starts=["#begin"], encoding='utf-8', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = conll_io.read("data/conll2012/train.chinese.v4_gold_conll")
         dev_data   = conll_io.read("data/conll2012/dev.chinese.v4_gold_conll")
         test_data  = conll_io.read("data/conll2012/test.chinese.v4_gold_conll")
@@ -290,7 +305,7 @@ def load_data(args: argparse.Namespace):
         test_data  = conll_io.flatten_to_characters(test_data)
         
     elif args.dataset == 'ontonotesv4_zh':
-        io = ConllIO(text_col_id=2, tag_col_id=3, scheme='OntoNotes', sentence_sep_starts=["#end"], document_sep_starts=["#begin"], encoding='utf-8', token_sep="", pad_token="")
+        io = ConllIO(text_col_id=2, tag_col_id=3, scheme='OntoNotes', sentence_sep_starts=["#end"], document_sep_starts=["#begin"], encoding='utf-8', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = io.read("data/ontonotesv4/train.chinese.vz_gold_conll")
         dev_data   = io.read("data/ontonotesv4/dev.chinese.vz_gold_conll")
         test_data  = io.read("data/ontonotesv4/test.chinese.vz_gold_conll")
@@ -307,7 +322,7 @@ def load_data(args: argparse.Namespace):
     elif args.dataset == 'yidu_s4k':
         io = JsonIO(is_tokenized=False, tokenize_callback='char', 
                     text_key='originalText', chunk_key='entities', chunk_type_key='label_type', chunk_start_key='start_pos', chunk_end_key='end_pos', 
-                    is_whole_piece=False, encoding='utf-8-sig', token_sep="", pad_token="")
+                    is_whole_piece=False, encoding='utf-8-sig', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = io.read("data/yidu_s4k/subtask1_training_part1.txt") + io.read("data/yidu_s4k/subtask1_training_part2.txt")
         # train_data, dev_data = sklearn.model_selection.train_test_split(train_data, test_size=0.2, random_state=args.seed)
         dev_data   = []
@@ -317,7 +332,7 @@ def load_data(args: argparse.Namespace):
     elif args.dataset == 'cmeee':
         io = JsonIO(is_tokenized=False, tokenize_callback='char', text_key='text', 
                     chunk_key='entities', chunk_type_key='type', chunk_start_key='start_idx', chunk_end_key='end_idx', 
-                    encoding='utf-8', token_sep="", pad_token="")
+                    encoding='utf-8', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = io.read("data/cblue/CMeEE/CMeEE_train_vz.json")
         dev_data   = io.read("data/cblue/CMeEE/CMeEE_dev_vz.json")
         test_data  = io.read("data/cblue/CMeEE/CMeEE_test_vz.json")
@@ -326,7 +341,7 @@ def load_data(args: argparse.Namespace):
         io = JsonIO(is_tokenized=False, tokenize_callback='char', text_key='text', 
                     chunk_key='entities', chunk_type_key='type', chunk_start_key='start', chunk_end_key='end', 
                     relation_key='relations', relation_type_key='type', relation_head_key='head', relation_tail_key='tail', 
-                    encoding='utf-8', token_sep="", pad_token="")
+                    encoding='utf-8', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = io.read("data/cblue/CMeIE/CMeIE_train_vz.json")
         dev_data   = io.read("data/cblue/CMeIE/CMeIE_dev_vz.json")
         test_data  = io.read("data/cblue/CMeIE/CMeIE_test_vz.json")
@@ -335,7 +350,7 @@ def load_data(args: argparse.Namespace):
     elif args.dataset == 'CLERD':
         io = BratIO(tokenize_callback='char', has_ins_space=False, parse_attrs=False, parse_relations=True, 
                     max_len=500, line_sep="\n", allow_broken_chunk_text=True, consistency_mapping={'[・;é]': '、'}, 
-                    encoding='utf-8', token_sep="", pad_token="")
+                    encoding='utf-8', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = io.read_folder("data/CLERD/relation_extraction/Training")
         dev_data   = io.read_folder("data/CLERD/relation_extraction/Validation")
         test_data  = io.read_folder("data/CLERD/relation_extraction/Testing")
@@ -353,7 +368,7 @@ def load_data(args: argparse.Namespace):
         io = JsonIO(text_key='tokens', chunk_key='entities', chunk_type_key='type', chunk_start_key='start', chunk_end_key='end', chunk_text_key=None, 
                     attribute_key='attributes', attribute_type_key='type', attribute_chunk_key='entity', 
                     relation_key='relations', relation_type_key='type', relation_head_key='head', relation_tail_key='tail', 
-                    is_whole_piece=False, retain_meta=True, encoding='utf-8', token_sep="", pad_token="")
+                    is_whole_piece=False, retain_meta=True, encoding='utf-8', token_sep="", pad_token="", cache_dir=args.data_cache_dir)
         train_data = io.read("data/HwaMei/v20211230/train.json")
         dev_data   = io.read("data/HwaMei/v20211230/dev.json")
         test_data  = io.read("data/HwaMei/v20211230/test.json")
@@ -371,7 +386,7 @@ def load_data(args: argparse.Namespace):
         
     elif args.dataset == 'yelp2013':
         tabular_io = TabularIO(text_col_id=3, label_col_id=2, sep="\t\t", mapping={"<sssss>": "\n"}, encoding='utf-8', verbose=args.log_terminal, 
-                               case_mode='Lower', number_mode='None')
+                               case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = tabular_io.read("data/Tang2015/yelp-2013-seg-20-20.train.ss")
         dev_data   = tabular_io.read("data/Tang2015/yelp-2013-seg-20-20.dev.ss")
         test_data  = tabular_io.read("data/Tang2015/yelp-2013-seg-20-20.test.ss")
@@ -392,49 +407,49 @@ def load_data(args: argparse.Namespace):
         
     elif args.dataset == 'ChnSentiCorp':
         tabular_io = TabularIO(text_col_id=1, label_col_id=0, sep='\t', header=0, tokenize_callback=jieba.cut, encoding='utf-8', verbose=args.log_terminal, 
-                               case_mode='Lower', number_mode='None')
+                               case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = tabular_io.read("data/ChnSentiCorp/train.tsv")
         dev_data   = tabular_io.read("data/ChnSentiCorp/dev.tsv")
         test_data  = tabular_io.read("data/ChnSentiCorp/test.tsv")
         
     elif args.dataset == 'THUCNews_10':
         tabular_io = TabularIO(text_col_id=1, label_col_id=0, sep='\t', tokenize_callback=jieba.cut, encoding='utf-8', verbose=args.log_terminal, 
-                               case_mode='Lower', number_mode='None')
+                               case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = tabular_io.read("data/THUCNews-10/cnews.train.txt")
         dev_data   = tabular_io.read("data/THUCNews-10/cnews.val.txt")
         test_data  = tabular_io.read("data/THUCNews-10/cnews.test.txt")
         
     elif args.dataset == 'chip_ctc':
         io = TextClsIO(is_tokenized=False, tokenize_callback=jieba.tokenize, text_key='text', mapping={" ": ""}, encoding='utf-8', verbose=args.log_terminal, 
-                       case_mode='Lower', number_mode='None')
+                       case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = io.read("data/cblue/CHIP-CTC/CHIP-CTC_train.json")
         dev_data   = io.read("data/cblue/CHIP-CTC/CHIP-CTC_dev.json")
         test_data  = io.read("data/cblue/CHIP-CTC/CHIP-CTC_test.json")
         
     elif args.dataset == 'chip_sts':
         io = TextClsIO(is_tokenized=False, tokenize_callback=jieba.tokenize, text_key='text1', paired_text_key='text2', mapping={" ": ""}, encoding='utf-8', verbose=args.log_terminal, 
-                       case_mode='Lower', number_mode='None')
+                       case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = io.read("data/cblue/CHIP-STS/CHIP-STS_train.json")
         dev_data   = io.read("data/cblue/CHIP-STS/CHIP-STS_dev.json")
         test_data  = io.read("data/cblue/CHIP-STS/CHIP-STS_test.json")
         
     elif args.dataset == 'kuake_qic':
         io = TextClsIO(is_tokenized=False, tokenize_callback=jieba.tokenize, text_key='query', mapping={" ": ""}, encoding='utf-8', verbose=args.log_terminal, 
-                       case_mode='Lower', number_mode='None')
+                       case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = io.read("data/cblue/KUAKE-QIC/KUAKE-QIC_train.json")
         dev_data   = io.read("data/cblue/KUAKE-QIC/KUAKE-QIC_dev.json")
         test_data  = io.read("data/cblue/KUAKE-QIC/KUAKE-QIC_test.json")
         
     elif args.dataset == 'kuake_qtr':
         io = TextClsIO(is_tokenized=False, tokenize_callback=jieba.tokenize, text_key='query', paired_text_key='title', mapping={" ": ""}, encoding='utf-8', verbose=args.log_terminal, 
-                       case_mode='Lower', number_mode='None')
+                       case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = io.read("data/cblue/KUAKE-QTR/KUAKE-QTR_train.json")
         dev_data   = io.read("data/cblue/KUAKE-QTR/KUAKE-QTR_dev.json")
         test_data  = io.read("data/cblue/KUAKE-QTR/KUAKE-QTR_test.json")
         
     elif args.dataset == 'kuake_qqr':
         io = TextClsIO(is_tokenized=False, tokenize_callback=jieba.tokenize, text_key='query1', paired_text_key='query2', mapping={" ": ""}, encoding='utf-8', verbose=args.log_terminal, 
-                       case_mode='Lower', number_mode='None')
+                       case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = io.read("data/cblue/KUAKE-QQR/KUAKE-QQR_train.json")
         dev_data   = io.read("data/cblue/KUAKE-QQR/KUAKE-QQR_dev.json")
         test_data  = io.read("data/cblue/KUAKE-QQR/KUAKE-QQR_test.json")
@@ -448,21 +463,21 @@ def load_data(args: argparse.Namespace):
     #     test_data  = io.read("data/multi30k/test2016.en", "data/multi30k/test2016.de")
         
     elif args.dataset == 'iwslt14':
-        io = Src2TrgIO(tokenize_callback=None, trg_tokenize_callback=None, encoding='utf-8', case_mode='Lower', number_mode='None')
+        io = Src2TrgIO(tokenize_callback=None, trg_tokenize_callback=None, encoding='utf-8', case_mode='Lower', number_mode='None', cache_dir=args.data_cache_dir)
         train_data = io.read("data/iwslt14.tokenized.de-en/train.en", "data/iwslt14.tokenized.de-en/train.de")
         dev_data   = io.read("data/iwslt14.tokenized.de-en/valid.en", "data/iwslt14.tokenized.de-en/valid.de")
         test_data  = io.read("data/iwslt14.tokenized.de-en/test.en", "data/iwslt14.tokenized.de-en/test.de")
         
     elif args.dataset == 'flickr8k':
-        io = KarpathyIO(img_folder="data/flickr8k/Flicker8k_Dataset", check_img_path=True)
+        io = KarpathyIO(img_folder="data/flickr8k/Flicker8k_Dataset", check_img_path=True, cache_dir=args.data_cache_dir)
         train_data, dev_data, test_data = io.read("data/flickr8k/flickr8k-karpathy2015cvpr.json")
         
     elif args.dataset == 'flickr30k':
-        io = KarpathyIO(img_folder="data/flickr30k/flickr30k-images", check_img_path=True)
+        io = KarpathyIO(img_folder="data/flickr30k/flickr30k-images", check_img_path=True, cache_dir=args.data_cache_dir)
         train_data, dev_data, test_data = io.read("data/flickr30k/flickr30k-karpathy2015cvpr.json")
         
     elif args.dataset == 'mscoco':
-        io = KarpathyIO(img_folder="data/mscoco/data2014", check_img_path=True)
+        io = KarpathyIO(img_folder="data/mscoco/data2014", check_img_path=True, cache_dir=args.data_cache_dir)
         train_data, dev_data, test_data = io.read("data/mscoco/mscoco-karpathy2015cvpr.json")
         
     else:
@@ -613,6 +628,19 @@ def header_format(content: str, sep='=', width=100):
 
 
 
+def build_train_loader(train_set, args: argparse.Namespace):
+    if args.bucket_batch:
+        sampler = BucketBatchSampler([len(entry['tokens']) for entry in train_set.data], 
+                                     batch_size=args.batch_size, 
+                                     max_tokens=args.bucket_max_tokens, 
+                                     quadratic=(args.bucket_cost == 'quadratic'), 
+                                     seed=args.seed)
+        return torch.utils.data.DataLoader(train_set, batch_sampler=sampler, collate_fn=train_set.collate)
+    else:
+        return torch.utils.data.DataLoader(train_set, batch_size=args.batch_size, shuffle=True, collate_fn=train_set.collate)
+
+
+
 def build_trainer(model, device, num_train_batches: int, args: argparse.Namespace):
     param_groups = [{'params': model.pretrained_parameters(), 'lr': args.finetune_lr}]
     param_groups.append({'params': collect_params(model, param_groups), 'lr': args.lr})
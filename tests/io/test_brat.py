@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 from collections import Counter
+import shutil
+import random
 import jieba
 import pytest
 
@@ -89,3 +91,81 @@ def test_read_write_consistency(has_ins_space):
     gold_chunk_anns = [line.split("\t", 1)[1] for line in gold_ann_lines if line.startswith('T')]
     retr_chunk_anns = [line.split("\t", 1)[1] for line in retr_ann_lines if line.startswith('T')]
     assert sorted(retr_chunk_anns) == sorted(gold_chunk_anns)
+
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_read_files_in_parallel(num_workers, tmp_path):
+    brat_io = BratIO(tokenize_callback='char', parse_attrs=True, parse_relations=True, allow_broken_chunk_text=True, encoding='utf-8', verbose=False)
+    
+    file_paths = []
+    for k in range(10):
+        src_fn = "data/HwaMei/demo.txt" if k % 2 == 0 else "data/HwaMei/demo.ChaFangJiLu.txt"
+        trg_fn = f"{tmp_path}/doc-{k}.txt"
+        shutil.copy(src_fn, trg_fn)
+        with open(src_fn.replace('.txt', '.ann'), encoding='utf-8') as f:
+            anns = f.readlines()
+        # Corrupt the chunk text of the `k`-th annotation to produce an error
+        i = [i for i, ann in enumerate(anns) if ann.startswith('T')][k]
+        chunk_id, chunk_type_pos, chunk_text = anns[i].split("\t")
+        anns[i] = "\t".join([chunk_id, chunk_type_pos, f"ERROR-{k}\n"])
+        with open(trg_fn.replace('.txt', '.ann'), 'w', encoding='utf-8') as f:
+            f.writelines(anns)
+        file_paths.append(trg_fn)
+    
+    gold_data, gold_errors, gold_mismatches = [], [], []
+    for file_path in file_paths:
+        curr_data, curr_errors, curr_mismatches = brat_io.read(file_path, return_errors=True)
+        gold_data.extend(curr_data)
+        gold_errors.extend(curr_errors)
+        gold_mismatches.extend(curr_mismatches)
+    assert [chunk_text for chunk_text, _ in gold_errors] == [f"ERROR-{k}" for k in range(10)]
+    
+    data, errors, mismatches = brat_io.read_files(file_paths, return_errors=True, num_workers=num_workers, chunksize=3)
+    assert len(data) == len(gold_data)
+    for entry, gold_entry in zip(data, gold_data):
+        assert entry['tokens'] == gold_entry['tokens']
+        assert entry['chunks'] == gold_entry['chunks']
+        assert entry['attributes'] == gold_entry['attributes']
+        assert entry['relations'] == gold_entry['relations']
+    assert errors == gold_errors
+    assert mismatches == gold_mismatches
+
+
+
+@pytest.mark.slow
+def test_read_long_document(tmp_path):
+    # A synthetic long document with thousands of chunks, attributes and relations
+    rng = random.Random(0)
+    chars = "患者缘于周前无明显诱因下出现右侧胸痛吸气时加重伴轻度胸闷偶有咳嗽咳痰"
+    lines, anns = [], []
+    offset, num_chunks, num_attrs, num_rels = 0, 0, 0, 0
+    for _ in range(20_000):
+        line = "".join(rng.choice(chars) for _ in range(rng.randint(40, 120))) + "。"
+        for _ in range(rng.randint(1, 4)):
+            start = rng.randint(0, len(line)-6)
+            end = start + rng.randint(1, 5)
+            num_chunks += 1
+            anns.append(f"T{num_chunks}\tSymptom {offset+start} {offset+end}\t{line[start:end]}")
+            if rng.random() < 0.3:
+                num_attrs += 1
+                anns.append(f"A{num_attrs}\tNegated T{num_chunks}")
+            if start > 0 and rng.random() < 0.3:
+                num_rels += 1
+                anns.append(f"R{num_rels}\tRelated Arg1:T{num_chunks-1} Arg2:T{num_chunks}\t")
+        lines.append(line)
+        offset += len(line) + 1
+    
+    with open(f"{tmp_path}/long.txt", 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+    with open(f"{tmp_path}/long.ann", 'w', encoding='utf-8') as f:
+        f.write("\n".join(anns))
+    
+    brat_io = BratIO(tokenize_callback='char', parse_attrs=True, parse_relations=True, max_len=150, line_sep="\n", encoding='utf-8', verbose=False)
+    data = brat_io.read(f"{tmp_path}/long.txt")
+    
+    # Lines are never broken by segmentation, so no chunk crosses segments
+    assert sum(len(entry['chunks']) for entry in data) == num_chunks
+    assert sum(len(entry['attributes']) for entry in data) == num_attrs
+    # Relations across segments are dropped
+    assert 0 < sum(len(entry['relations']) for entry in data) <= num_rels
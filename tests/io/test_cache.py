@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import pytest
+
+from eznlp.io import ConllIO, BratIO, DatasetCache
+from eznlp.io.cache import _fingerprint
+from eznlp.token import TokenSequence, ColumnarTokenSequence, LexiconTokenizer
+
+
+def _assert_data_equal(data1, data2):
+    assert len(data1) == len(data2)
+    for entry1, entry2 in zip(data1, data2):
+        assert entry1.keys() == entry2.keys()
+        assert type(entry1['tokens']) == type(entry2['tokens'])
+        assert entry1['tokens'] == entry2['tokens']
+        assert entry1['tokens'].token_attr_names == entry2['tokens'].token_attr_names
+        for name in entry1['tokens'].token_attr_names:
+            assert getattr(entry1['tokens'], name) == getattr(entry2['tokens'], name)
+        for key in entry1.keys():
+            if key != 'tokens':
+                assert entry1[key] == entry2[key]
+
+
+class _Lower(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+        
+    def __call__(self, text: str):
+        return text.lower().split()
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+@pytest.mark.parametrize("number_mode", ['None', 'Zeros'])
+def test_conll_cache(columnar, number_mode, tmp_path):
+    io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', additional_col_id2name={1: 'pos_tag'}, number_mode=number_mode, columnar=columnar, verbose=False)
+    data = io.read("data/conll2003/demo.eng.train")
+    
+    io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', additional_col_id2name={1: 'pos_tag'}, number_mode=number_mode, columnar=columnar, verbose=False, cache_dir=str(tmp_path))
+    data_read = io.read("data/conll2003/demo.eng.train")
+    assert len(os.listdir(tmp_path)) == 1
+    data_loaded = io.read("data/conll2003/demo.eng.train")
+    
+    _assert_data_equal(data_read, data)
+    _assert_data_equal(data_loaded, data)
+    assert isinstance(data_loaded[0]['tokens'], ColumnarTokenSequence) == columnar
+    
+    
+def test_cache_invalidation(tmp_path):
+    src_path = str(tmp_path / "demo.eng.train")
+    shutil.copy("data/conll2003/demo.eng.train", src_path)
+    cache_dir = str(tmp_path / "cache")
+    
+    io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', verbose=False, cache_dir=cache_dir)
+    data = io.read(src_path)
+    key = DatasetCache(cache_dir).build_key(io, 'read', (src_path, ), {})
+    assert os.listdir(cache_dir) == [key]
+    
+    # Changing the IO options
+    io_lower = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', case_mode='Lower', verbose=False, cache_dir=cache_dir)
+    assert DatasetCache(cache_dir).build_key(io_lower, 'read', (src_path, ), {}) != key
+    data_lower = io_lower.read(src_path)
+    assert data_lower[0]['tokens'].text == [t.lower() for t in data[0]['tokens'].raw_text]
+    key_lower = DatasetCache(cache_dir).build_key(io_lower, 'read', (src_path, ), {})
+    assert sorted(os.listdir(cache_dir)) == sorted([key, key_lower])
+    
+    # Changing the source file
+    with open(src_path, 'r') as f:
+        lines = f.readlines()
+    with open(src_path, 'w') as f:
+        f.writelines(lines[:len(lines)//2])
+    assert DatasetCache(cache_dir).build_key(io, 'read', (src_path, ), {}) != key
+    data_modified = io.read(src_path)
+    assert len(data_modified) < len(data)
+    
+    # The stale cache with the same options has been removed, while the cache with other options is kept
+    key_modified = DatasetCache(cache_dir).build_key(io, 'read', (src_path, ), {})
+    assert sorted(os.listdir(cache_dir)) == sorted([key_modified, key_lower])
+
+
+def test_cache_with_option_sets(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', verbose=False, cache_dir=cache_dir)
+    io_lower = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', case_mode='Lower', verbose=False, cache_dir=cache_dir)
+    data = io.read("data/conll2003/demo.eng.train")
+    data_lower = io_lower.read("data/conll2003/demo.eng.train")
+    assert len(os.listdir(cache_dir)) == 2
+    
+    # Reading with either option set alternately hits its own cache
+    for _ in range(2):
+        _assert_data_equal(io.read("data/conll2003/demo.eng.train"), data)
+        _assert_data_equal(io_lower.read("data/conll2003/demo.eng.train"), data_lower)
+        assert len(os.listdir(cache_dir)) == 2
+    
+    # A folder removed by another process is a cache miss
+    key = DatasetCache(cache_dir).build_key(io, 'read', ("data/conll2003/demo.eng.train", ), {})
+    os.remove(f"{cache_dir}/{key}/tokens.token_offsets.npy")
+    assert DatasetCache(cache_dir).load(key) is None
+    
+    
+def test_brat_cache_with_errors(tmp_path):
+    src_folder = tmp_path / "brat"
+    src_folder.mkdir()
+    for fn in ["demo.txt", "demo.ann"]:
+        shutil.copy(f"data/HwaMei/{fn}", src_folder / fn)
+    
+    io = BratIO(tokenize_callback='char', has_ins_space=False, parse_attrs=True, parse_relations=True, encoding='utf-8', verbose=False)
+    data, errors, mismatches = io.read_folder(str(src_folder), return_errors=True)
+    
+    io = BratIO(tokenize_callback='char', has_ins_space=False, parse_attrs=True, parse_relations=True, encoding='utf-8', verbose=False, cache_dir=str(tmp_path / "cache"))
+    io.read_folder(str(src_folder), return_errors=True)
+    data_loaded, errors_loaded, mismatches_loaded = io.read_folder(str(src_folder), return_errors=True)
+    
+    _assert_data_equal(data_loaded, data)
+    assert errors_loaded == errors
+    assert mismatches_loaded == mismatches
+
+
+def test_fingerprint():
+    # Bound methods are identified by the bound objects
+    tokenizer = LexiconTokenizer(["中山", "西路"])
+    fingerprint = _fingerprint(tokenizer.tokenize)
+    assert _fingerprint(LexiconTokenizer(["中山", "西路"]).tokenize) == fingerprint
+    assert _fingerprint(LexiconTokenizer(["中山", "山西"]).tokenize) != fingerprint
+    # ... but not by the derived attributes
+    list(tokenizer.tokenize("中山西路"))
+    assert _fingerprint(tokenizer.tokenize) == fingerprint
+    
+    # Callable objects are identified by their attributes
+    assert _fingerprint(_Lower(prefix="a")) == _fingerprint(_Lower(prefix="a"))
+    assert _fingerprint(_Lower(prefix="a")) != _fingerprint(_Lower(prefix="b"))
+    
+    # Cycles are fully covered, at any depth
+    nested, nested_other = [], []
+    for _ in range(10):
+        nested, nested_other = [nested], [nested_other]
+    nested[0].append(nested)
+    nested_other[0].append(0)
+    assert _fingerprint(nested) != _fingerprint(nested_other)
+    
+    # Unfingerprintable objects are refused
+    with pytest.raises(TypeError):
+        _fingerprint({'callback': _Lower(generator=(x for x in "ab"))})
+
+
+def test_cache_refused_for_unfingerprintable_options(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', verbose=False, cache_dir=cache_dir)
+    io.unfingerprintable = (x for x in "ab")
+    data = io.read("data/conll2003/demo.eng.train")
+    assert len(data) > 0
+    assert not os.path.exists(cache_dir) or len(os.listdir(cache_dir)) == 0
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_cache_with_mixed_attributes(columnar, tmp_path):
+    token_seq_cls = ColumnarTokenSequence if columnar else TokenSequence
+    data = [{'tokens': token_seq_cls.from_tokenized_text([])}, 
+            {'tokens': token_seq_cls.from_tokenized_text(["a", "b"], additional_tags={'pos_tag': ["N", "V"]})}, 
+            {'tokens': token_seq_cls.from_tokenized_text(["c"])}, 
+            {'tokens': token_seq_cls.from_tokenized_text(["d", "e"], additional_tags={'pos_tag': ["V", "N"]})}]
+    cache = DatasetCache(str(tmp_path), verbose=False)
+    cache.save("mixed", data)
+    _assert_data_equal(cache.load("mixed"), data)
@@ -55,6 +55,33 @@ class TestConllIO(object):
         self._assert_flatten_consistency(test_data)
         
 
+    def test_conll2003_columnar(self):
+        self.io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', additional_col_id2name={1: 'pos_tag'}, case_mode='None', number_mode='Zeros')
+        data = self.io.read("data/conll2003/demo.eng.train")
+        self.io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', additional_col_id2name={1: 'pos_tag'}, case_mode='None', number_mode='Zeros', columnar=True)
+        columnar_data = self.io.read("data/conll2003/demo.eng.train")
+        
+        assert len(columnar_data) == len(data)
+        for entry, c_entry in zip(data, columnar_data):
+            assert c_entry['tokens'] == entry['tokens']
+            assert c_entry['tokens'].pos_tag == entry['tokens'].pos_tag
+            assert c_entry['tokens'].en_pattern == entry['tokens'].en_pattern
+            assert c_entry['chunks'] == entry['chunks']
+        self._assert_flatten_consistency(columnar_data)
+        
+        
+    @pytest.mark.parametrize("document_level", [False, True])
+    def test_conll2003_iter_read(self, document_level):
+        self.io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', document_sep_starts=["-DOCSTART-"], document_level=document_level)
+        data = self.io.read("data/conll2003/demo.eng.train")
+        
+        data_iter = self.io.iter_read("data/conll2003/demo.eng.train")
+        assert not isinstance(data_iter, list)
+        for entry, it_entry in zip(data, data_iter, strict=True):
+            assert it_entry['tokens'] == entry['tokens']
+            assert it_entry['chunks'] == entry['chunks']
+        
+        
     def test_conll2003_at_doc_level(self):
         self.io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1', document_sep_starts=["-DOCSTART-"], document_level=True)
         train_data = self.io.read("data/conll2003/eng.train")
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+import io
+import json
 import pytest
 import jieba
 
 from eznlp.io import JsonIO, SQuADIO, KarpathyIO, TextClsIO, BratIO
+from eznlp.io.json import _iter_json_array
 from eznlp.utils.chunk import detect_nested, filter_clashed_by_priority
 
 
@@ -261,6 +264,54 @@ def test_read_write_consistency(is_whole_piece):
 
 
 
+@pytest.mark.parametrize("buffer_size", [1, 7, 1024])
+def test_iter_json_array(buffer_size):
+    raw_data = [{'text': "a [bracketed], \"quoted\" text", 'nums': [1, -2.5e3, 12345678]}, 
+                12345, -0.5, "]", [], {}, None, True, [[1, 2], {'a': [3]}], 
+                {'text': "中文" * 50}]
+    for dumped in [json.dumps(raw_data), json.dumps(raw_data, indent=4, ensure_ascii=False), "[]", " [ ] \n"]:
+        raw_data_retr = list(_iter_json_array(io.StringIO(dumped), buffer_size=buffer_size))
+        assert raw_data_retr == json.loads(dumped)
+    
+    for invalid in ["", "{}", "[1, 2", "[1 2]", "[1, {]"]:
+        with pytest.raises(ValueError):
+            list(_iter_json_array(io.StringIO(invalid), buffer_size=buffer_size))
+
+
+
+@pytest.mark.parametrize("is_whole_piece", [False, True])
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_iter_read(is_whole_piece, num_workers, tmp_path):
+    brat_io = BratIO(tokenize_callback='char', max_len=100, encoding='utf-8', verbose=False)
+    data = brat_io.read("data/HwaMei/demo.txt") + brat_io.read("data/HwaMei/demo.ChaFangJiLu.txt")
+    # Raw-text records, with one chunk of wrong text per record to produce errors
+    raw_data = [{'text': "".join(entry['tokens'].raw_text), 
+                 'entities': [{'type': 'Error', 'start': 0, 'end': 1, 'text': "ERROR"}] + 
+                             [{'type': label, 'start': start, 'end': end, 'text': "".join(entry['tokens'].raw_text[start:end])} for label, start, end in entry['chunks']]} 
+                    for entry in data]
+    with open(f"{tmp_path}/data.json", 'w', encoding='utf-8') as f:
+        if is_whole_piece:
+            json.dump(raw_data, f, ensure_ascii=False, indent=2)
+        else:
+            f.write("\n".join(json.dumps(raw_entry, ensure_ascii=False) for raw_entry in raw_data))
+    
+    json_io = JsonIO(is_tokenized=False, tokenize_callback='char', text_key='text', chunk_text_key='text', is_whole_piece=is_whole_piece, encoding='utf-8', verbose=False)
+    data_iter = json_io.iter_read(f"{tmp_path}/data.json", return_errors=True, num_workers=num_workers, chunksize=3)
+    assert not isinstance(data_iter, list)
+    
+    data_retr, errors, mismatches = [], [], []
+    for entry, curr_errors, curr_mismatches in data_iter:
+        data_retr.append(entry)
+        errors.extend(curr_errors)
+        mismatches.extend(curr_mismatches)
+    assert data_retr == data
+    assert len(errors) == len(data)
+    assert len(mismatches) == 0
+    
+    assert json_io.read(f"{tmp_path}/data.json", num_workers=num_workers) == data
+
+
+
 class TestSQuADIO(object):
     def test_squad_v2(self, spacy_nlp_en):
         io = SQuADIO(tokenize_callback=spacy_nlp_en, verbose=False)
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
+import random
+import pickle
+import pytest
 import jieba
 import transformers
 
-from eznlp.io import RawTextIO
+from eznlp.io import RawTextIO, IndexedRawText
 
 
 class TestRawTextIO(object):
@@ -15,3 +18,92 @@ class TestRawTextIO(object):
         io = RawTextIO(encoding='utf-8')
         reloaded = io.read("data/Wikipedia/text-zh/AA/wiki_00.cache")
         assert reloaded == data
+
+
+
+@pytest.mark.parametrize("from_parsed", [False, True])
+def test_indexed_raw_text(from_parsed, tmp_path):
+    rng = random.Random(0)
+    zh_chars = "我爱北京天安门患者缘于周前无明显诱因下出现右侧胸痛"
+    en_words = ["hello", "world", "2021", "-", "the", "of", "NLP", "，", "。"]
+    lines = []
+    for k in range(200):
+        if k % 20 == 0:
+            lines.append("<doc id=1>")
+        words = [rng.choice(zh_chars) if rng.random() < 0.5 else rng.choice(en_words) for _ in range(rng.randint(0, 30))]
+        lines.append(" ".join(words))
+        if k % 20 == 19:
+            lines.append("</doc>")
+    with open(f"{tmp_path}/raw.txt", 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+    
+    io = RawTextIO(str.split, max_len=50, document_sep_starts=["<doc", "</doc"], encoding='utf-8', verbose=False)
+    data = io.read(f"{tmp_path}/raw.txt")
+    assert len(data) > 0
+    
+    if from_parsed:
+        io.write(data, f"{tmp_path}/raw.cache")
+        io = RawTextIO(encoding='utf-8', verbose=False)
+        indexed = io.build_index([f"{tmp_path}/raw.cache"], f"{tmp_path}/index")
+    else:
+        indexed = io.build_index([f"{tmp_path}/raw.txt", f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+        data = data + data
+    
+    assert isinstance(indexed, IndexedRawText)
+    assert len(indexed) == len(data)
+    assert list(indexed) == data
+    for i in rng.sample(range(len(data)), 20) + [-1]:
+        assert indexed[i] == data[i]
+    with pytest.raises(IndexError):
+        indexed[len(data)]
+    
+    indexed = pickle.loads(pickle.dumps(IndexedRawText(f"{tmp_path}/index")))
+    assert list(indexed) == data
+
+
+
+def test_index_up_to_date(tmp_path):
+    with open(f"{tmp_path}/raw.txt", 'w', encoding='utf-8') as f:
+        f.write("\n".join(["<doc id=1>"] + [" ".join(["hello", "world"] * 10)] * 5 + ["</doc>"]))
+    
+    io = RawTextIO(str.split, max_len=10, document_sep_starts=["<doc", "</doc"], encoding='utf-8', verbose=False)
+    assert not io.is_index_up_to_date([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    io.build_index([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    assert io.is_index_up_to_date([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    
+    # Changing the IO options or the files
+    io_longer = RawTextIO(str.split, max_len=20, document_sep_starts=["<doc", "</doc"], encoding='utf-8', verbose=False)
+    assert not io_longer.is_index_up_to_date([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    assert not io.is_index_up_to_date([f"{tmp_path}/raw.txt", f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    with open(f"{tmp_path}/raw.txt", 'a', encoding='utf-8') as f:
+        f.write("\n" + " ".join(["hello"] * 20))
+    assert not io.is_index_up_to_date([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    
+    io_longer.build_index([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    assert io_longer.is_index_up_to_date([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    assert len(IndexedRawText(f"{tmp_path}/index")) == len(io_longer.read(f"{tmp_path}/raw.txt"))
+
+
+
+class _Splitter(object):
+    def __init__(self, lower: bool):
+        self.lower = lower
+        
+    def split(self, text: str):
+        return (text.lower() if self.lower else text).split()
+
+
+def test_index_up_to_date_with_bound_callbacks(tmp_path):
+    with open(f"{tmp_path}/raw.txt", 'w', encoding='utf-8') as f:
+        f.write("\n".join([" ".join(["Hello", "World"] * 10)] * 5))
+    
+    io = RawTextIO(_Splitter(lower=False).split, max_len=10, encoding='utf-8', verbose=False)
+    io.build_index([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    assert RawTextIO(_Splitter(lower=False).split, max_len=10, encoding='utf-8', verbose=False).is_index_up_to_date([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    # The bound object of the callback changes
+    assert not RawTextIO(_Splitter(lower=True).split, max_len=10, encoding='utf-8', verbose=False).is_index_up_to_date([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    
+    # An index with unfingerprintable options is never up to date
+    io.unfingerprintable = (x for x in "ab")
+    io.build_index([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
+    assert not io.is_index_up_to_date([f"{tmp_path}/raw.txt"], f"{tmp_path}/index")
@@ -13,6 +13,23 @@ class TestTabularIO(object):
     [2] Tang et al. 2015. Document modeling with gated recurrent neural network for sentiment classification. EMNLP 2015.
     [2] Chen et al. 2016. Neural sentiment classification with user and product attention. EMNLP 2016.
     """
+    def test_iter_chunks(self, tmp_path):
+        file_path = tmp_path / "demo.csv"
+        with open(file_path, 'w', encoding='utf-8') as f:
+            for k in range(25):
+                f.write(f'"{k % 5}"," This is the {k}-th review.\\nIt is NOT a bad one. "\n')
+            
+        tabular_io = TabularIO(text_col_id=1, label_col_id=0, sep=",", mapping={"\\n": "\n", '\\"': '"'}, encoding='utf-8', case_mode='lower')
+        data = tabular_io.read(file_path)
+        chunks = list(tabular_io.iter_chunks(file_path, chunksize=10))
+        
+        assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+        assert [entry for chunk in chunks for entry in chunk] == data
+        assert data[3]['label'] == "3"
+        assert data[3]['tokens'].raw_text == ["This", "is", "the", "3-th", "review.", "It", "is", "NOT", "a", "bad", "one."]
+        assert data[3]['tokens'].text == ["this", "is", "the", "3-th", "review.", "it", "is", "not", "a", "bad", "one."]
+        
+        
     @pytest.mark.skip(reason="too slow and memory-consuming")
     def test_yelp_full(self, spacy_nlp_en):
         tabular_io = TabularIO(text_col_id=1, label_col_id=0, sep=",", mapping={"\\n": "\n", '\\"': '"'}, tokenize_callback=spacy_nlp_en, case_mode='lower')
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import pytest
 import os
+import pickle
 import string
 import random
 import numpy
@@ -8,8 +9,10 @@ import pandas
 import torch
 
 from eznlp.token import TokenSequence
-from eznlp.model import BertLikeConfig
+from eznlp.dataset import Dataset
+from eznlp.model import BertLikeConfig, ExtractorConfig
 from eznlp.model.bert_like import truncate_for_bert_like, segment_uniformly_for_bert_like, _tokenized2nested
+from eznlp.nn.functional import seq_lens2mask
 from eznlp.training import count_params
 from eznlp.io import TabularIO
 
@@ -104,3 +107,307 @@ def test_segment_uniformly_for_bert_like(bert_with_tokenizer, token_len, max_len
     span_starts = [0] + numpy.cumsum([len(entry['tokens']) for entry in new_data]).tolist()
     chunks_retr = [(label, span_start+start, span_start+end) for entry, span_start in zip(new_data, span_starts) for label, start, end in entry['chunks']]
     assert chunks_retr == chunks
+
+
+
+@pytest.fixture(params=['wordpiece', 'byte_level_bpe'])
+def tiny_bert_with_fast_tokenizer(request, tmp_path, conll2003_demo):
+    import tokenizers
+    import transformers
+    corpus_path = f"{tmp_path}/corpus.txt"
+    with open(corpus_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(" ".join(entry['tokens'].raw_text) for entry in conll2003_demo))
+    
+    if request.param == 'wordpiece':
+        trainer = tokenizers.BertWordPieceTokenizer(lowercase=False)
+        trainer.train([corpus_path], vocab_size=200)
+        trainer.save_model(str(tmp_path))
+        tokenizer = transformers.BertTokenizerFast.from_pretrained(str(tmp_path))
+    else:
+        trainer = tokenizers.ByteLevelBPETokenizer()
+        trainer.train([corpus_path], vocab_size=300, special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"])
+        trainer.save_model(str(tmp_path))
+        tokenizer = transformers.RobertaTokenizerFast.from_pretrained(str(tmp_path))
+    
+    if request.param == 'wordpiece':
+        bert_like = transformers.BertModel(transformers.BertConfig(vocab_size=len(tokenizer), hidden_size=16, num_hidden_layers=1, 
+                                                                   num_attention_heads=2, intermediate_size=32))
+    else:
+        bert_like = transformers.RobertaModel(transformers.RobertaConfig(vocab_size=len(tokenizer), hidden_size=16, num_hidden_layers=1, 
+                                                                         num_attention_heads=2, intermediate_size=32, 
+                                                                         pad_token_id=tokenizer.pad_token_id, max_position_embeddings=514))
+    return bert_like, tokenizer
+
+
+@pytest.mark.parametrize("from_tokenized", [True, False])
+@pytest.mark.parametrize("paired_inputs", [True, False])
+def test_precompute(from_tokenized, paired_inputs, tiny_bert_with_fast_tokenizer, conll2003_demo):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    bert_like_config = BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer, from_tokenized=from_tokenized, paired_inputs=paired_inputs)
+    
+    # Include space-like words, long words (truncated to 5 sub-tokens) and empty sequences
+    tokens_list = [entry['tokens'] for entry in conll2003_demo]
+    tokens_list.append(TokenSequence.from_tokenized_text(["　", "http://www.eznlp.com/" + "x"*50, "Peter"]))
+    if paired_inputs:
+        sep = TokenSequence.from_tokenized_text([tokenizer.sep_token])
+        tokens_list = [tokens + sep + tokens for tokens in tokens_list]
+    elif from_tokenized:
+        tokens_list.append(TokenSequence.from_tokenized_text([]))
+    
+    examples = bert_like_config.precompute(tokens_list)
+    assert len(examples) == len(tokens_list)
+    for tokens, example in zip(tokens_list, examples):
+        expected = bert_like_config.exemplify(tokens)
+        assert example.keys() == expected.keys()
+        assert all(torch.equal(example[k], expected[k]) for k in expected)
+
+
+
+def test_dataset_precompute(tiny_bert_with_fast_tokenizer, conll2003_demo):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    config = ExtractorConfig('sequence_tagging', ohots=None, bert_like=BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer))
+    dataset = Dataset(conll2003_demo, config)
+    dataset.build_vocabs_and_dims()
+    dataset.precompute()
+    assert len(dataset._precomputed['bert_like']) == len(conll2003_demo)
+    
+    for i, entry in enumerate(conll2003_demo):
+        expected = config.bert_like.exemplify(entry['tokens'])
+        assert all(torch.equal(dataset[i]['bert_like'][k], expected[k]) for k in expected)
+    
+    batch = dataset.collate([dataset[i] for i in range(4)])
+    assert batch.bert_like['sub_tok_ids'].size(0) == 4
+
+
+
+def test_sub_tok_cache(tiny_bert_with_fast_tokenizer, conll2003_demo):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    bert_like_config = BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer, sub_tok_cache_size=50)
+    sub_tok_cache = bert_like_config.sub_tok_cache
+    
+    data = [{'tokens': entry['tokens'] + TokenSequence.from_tokenized_text(["　", "http://www.eznlp.com/" + "x"*50]), 
+             'chunks': entry['chunks']} for entry in conll2003_demo]
+    for entry in data:
+        nested_sub_tok_ids = sub_tok_cache(entry['tokens'].raw_text)
+        expected = [tokenizer.convert_tokens_to_ids(tok) for tok in _tokenized2nested(entry['tokens'].raw_text, tokenizer)]
+        assert nested_sub_tok_ids == expected
+        assert len(sub_tok_cache) <= 50
+    
+    # The cache is shared by the preprocessing steps and exemplifying
+    num_lookups = sub_tok_cache.num_hits + sub_tok_cache.num_misses
+    segment_uniformly_for_bert_like(data, tokenizer, verbose=False, sub_tok_cache=sub_tok_cache)
+    truncate_for_bert_like(data, tokenizer, verbose=False, sub_tok_cache=sub_tok_cache)
+    for entry in data:
+        bert_like_config.exemplify(entry['tokens'])
+    assert sub_tok_cache.num_hits + sub_tok_cache.num_misses == num_lookups * 4
+    assert 0 < sub_tok_cache.hit_rate < 1
+    
+    # The cached entries are dropped in pickling
+    config_retr = pickle.loads(pickle.dumps(bert_like_config))
+    assert len(config_retr.sub_tok_cache) == 0 and config_retr.sub_tok_cache.hit_rate == 0
+    assert config_retr.sub_tok_cache.tokenizer is config_retr.tokenizer
+    assert all(torch.equal(config_retr.exemplify(entry['tokens'])['sub_tok_ids'], bert_like_config.exemplify(entry['tokens'])['sub_tok_ids']) for entry in data)
+
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+def test_embedding_cache(tiny_bert_with_fast_tokenizer, conll2003_demo, tmp_path, on_disk):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    config = ExtractorConfig('sequence_tagging', ohots=None, bert_like=BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer))
+    dataset = Dataset(conll2003_demo, config)
+    dataset.build_vocabs_and_dims()
+    model = config.instantiate()
+    batch = dataset.collate([dataset[i] for i in range(4)])
+    assert not hasattr(batch, 'pretrained_keys')
+    
+    model.eval()
+    expected = model.bert_like(**batch.bert_like)
+    model.enable_embedding_cache(cache_dir=str(tmp_path) if on_disk else None)
+    with pytest.raises(RuntimeError):
+        model._get_pretrained_hidden('bert_like', batch)
+    config.enable_embedding_cache_keys()
+    batch = dataset.collate([dataset[i] for i in range(4)])
+    assert len(model.embedding_caches['bert_like']) == 0
+    
+    # The cached outputs are computed in evaluation mode
+    model.train()
+    for _ in range(2):
+        bert_hidden = model._get_pretrained_hidden('bert_like', batch)
+        assert len(model.embedding_caches['bert_like']) == 4
+        assert torch.allclose(bert_hidden[~batch.mask], expected[~batch.mask], atol=1e-6)
+        model._get_full_hidden(batch)
+    assert model.training and model.bert_like.training
+    
+    # The cache is dropped once the embedder becomes trainable
+    model.bert_like.freeze = False
+    model._get_full_hidden(batch)
+    assert 'bert_like' not in model.embedding_caches
+
+
+
+@pytest.mark.parametrize("paired_inputs", [False, True])
+@pytest.mark.parametrize("window_stride", [3, 7])
+def test_sliding_window(tiny_bert_with_fast_tokenizer, conll2003_demo, paired_inputs, window_stride):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    tokenizer.model_max_length = 16
+    bert_like_config = BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer, paired_inputs=paired_inputs, 
+                                      sliding_window=True, window_stride=window_stride)
+    bert_like_embedder = bert_like_config.instantiate()
+    bert_like_embedder.eval()
+    
+    tokens_list = [entry['tokens'] for entry in conll2003_demo[:4]]
+    short_tokens_list = [tokens[:2] for tokens in tokens_list]
+    if paired_inputs:
+        sep = TokenSequence.from_tokenized_text([tokenizer.sep_token])
+        tokens_list = [tokens[:3] + sep + tokens for tokens in tokens_list]
+        short_tokens_list = [tokens[:1] + sep + tokens[1:] for tokens in short_tokens_list]
+    batch_ex = [bert_like_config.exemplify(tokens) for tokens in tokens_list]
+    batch = bert_like_config.batchify(batch_ex)
+    assert batch['sub_tok_ids'].size(1) > tokenizer.model_max_length
+    bert_hidden = bert_like_embedder._forward_sliding_windows(batch['sub_tok_ids'], batch['sub_mask'], batch.get('sub_tok_type_ids'))
+    
+    # Each sub-token is represented by the (separately encoded) window where it has the most context
+    for k, ex in enumerate(batch_ex):
+        num_sub_tokens = ex['sub_tok_ids'].size(0) - 2
+        last_start = max(num_sub_tokens - 14, 0)
+        best_context = [-1] * num_sub_tokens
+        expected = [None] * num_sub_tokens
+        for start in list(range(0, last_start, window_stride)) + [last_start]:
+            end = min(start + 14, num_sub_tokens)
+            window_indexes = [0] + list(range(start+1, end+1)) + [num_sub_tokens+1]
+            window_type_ids = ex['sub_tok_type_ids'][window_indexes].unsqueeze(0) if paired_inputs else None
+            window_hidden = bert_like_embedder._forward_hidden(ex['sub_tok_ids'][window_indexes].unsqueeze(0), 
+                                                               torch.zeros(1, len(window_indexes), dtype=torch.bool), 
+                                                               window_type_ids)
+            for i in range(start, end):
+                context = min(i - start, end - 1 - i)
+                if context > best_context[i]:
+                    best_context[i] = context
+                    expected[i] = window_hidden[0, i-start]
+        assert torch.allclose(bert_hidden[k, :num_sub_tokens], torch.stack(expected), atol=1e-5)
+    
+    # Aggregated to the original tokens
+    full_hidden = bert_like_embedder(**batch)
+    assert full_hidden.size()[:2] == (len(tokens_list), max(len(tokens) for tokens in tokens_list))
+    
+    # Short sequences are encoded as usual
+    batch = bert_like_config.batchify([bert_like_config.exemplify(tokens) for tokens in short_tokens_list])
+    assert batch['sub_tok_ids'].size(1) <= tokenizer.model_max_length
+    bert_like_config.sliding_window = False
+    assert torch.allclose(bert_like_embedder(**batch), bert_like_config.instantiate().eval()(**batch), atol=1e-6)
+
+
+
+def test_sliding_window_max_len(tiny_bert_with_fast_tokenizer):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    # The tokenizer has no real limit
+    tokenizer.model_max_length = int(1e30)
+    bert_like_config = BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer, sliding_window=True)
+    assert bert_like_config.max_len == 512
+    assert bert_like_config.window_stride == 255
+    assert bert_like_config.instantiate().max_len == 512
+    
+    tokenizer.model_max_length = 128
+    assert BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer, sliding_window=True).window_stride == 63
+    for window_stride in [0, 127]:
+        with pytest.raises(ValueError):
+            BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer, sliding_window=True, window_stride=window_stride)
+
+
+
+def test_max_len_without_tokenizer_limit(tiny_bert_with_fast_tokenizer):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    tokenizer.model_max_length = int(1e30)
+    bert_like_config = BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer)
+    assert bert_like_config.max_len == 512
+    
+    tokens = TokenSequence.from_tokenized_text(random.choices(string.ascii_lowercase, k=600))
+    with pytest.raises(AssertionError):
+        bert_like_config.exemplify(tokens)
+    
+    data = [{'tokens': tokens, 'chunks': [('EntA', k*10, k*10+5) for k in range(60)]}]
+    new_data = segment_uniformly_for_bert_like(data, tokenizer, verbose=False, max_len=bert_like_config.max_len)
+    assert len(new_data) > 1
+    assert all(len(entry['tokens']) <= 510 for entry in new_data)
+    for entry in new_data:
+        bert_like_config.exemplify(entry['tokens'])
+    
+    data = [{'tokens': tokens, 'label': 'pos'}]
+    new_data = truncate_for_bert_like(data, tokenizer, verbose=False, max_len=bert_like_config.max_len)
+    assert len(new_data[0]['tokens']) == 510
+    bert_like_config.exemplify(new_data[0]['tokens'])
+
+
+
+@pytest.mark.parametrize("from_tokenized", [True, False])
+@pytest.mark.parametrize("paired_inputs", [False, True])
+@pytest.mark.parametrize("max_len", [48, 128])
+def test_packing(tiny_bert_with_fast_tokenizer, conll2003_demo, from_tokenized, paired_inputs, max_len):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    tokenizer.model_max_length = max_len
+    bert_like_config = BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer, from_tokenized=from_tokenized, paired_inputs=paired_inputs)
+    bert_like_embedder = bert_like_config.instantiate()
+    bert_like_embedder.eval()
+    
+    tokens_list = [entry['tokens'][:6] for entry in conll2003_demo[:16]]
+    if paired_inputs:
+        sep = TokenSequence.from_tokenized_text([tokenizer.sep_token])
+        tokens_list = [tokens[:3] + sep + tokens[3:] for tokens in tokens_list]
+    batch_ex = [bert_like_config.exemplify(tokens) for tokens in tokens_list]
+    batch = bert_like_config.batchify(batch_ex)
+    expected = bert_like_embedder(**batch)
+    
+    bert_like_config.packing = True
+    packed_batch = bert_like_config.batchify(batch_ex)
+    assert packed_batch['sub_tok_ids'].size(1) <= max_len
+    assert packed_batch['sub_tok_ids'].size(0) < len(batch_ex)
+    assert packed_batch['sub_tok_ids'].numel() < batch['sub_tok_ids'].numel()
+    assert torch.equal(packed_batch['sub_mask'], batch['sub_mask'])
+    
+    # Each example is packed once, with its `[CLS]` and `[SEP]`
+    num_sub_tokens = (~batch['sub_mask']).sum().item()
+    assert (packed_batch['segment_ids'] >= 0).sum().item() == num_sub_tokens
+    assert (packed_batch['sub_tok_ids'] == tokenizer.cls_token_id).sum().item() == len(batch_ex)
+    
+    # The unpacked hidden states equal those encoded separately
+    packed_hidden = bert_like_embedder(**packed_batch)
+    assert packed_hidden.size() == expected.size()
+    if from_tokenized:
+        mask = seq_lens2mask(torch.tensor([len(tokens) for tokens in tokens_list]))
+    else:
+        mask = batch['sub_mask'][:, 2:]
+    assert torch.allclose(packed_hidden[~mask], expected[~mask], atol=1e-5)
+
+
+
+def test_packing_with_3d_attention_mask(tiny_bert_with_fast_tokenizer, conll2003_demo, monkeypatch):
+    bert_like, tokenizer = tiny_bert_with_fast_tokenizer
+    bert_like_config = BertLikeConfig(bert_like=bert_like, tokenizer=tokenizer)
+    bert_like_embedder = bert_like_config.instantiate()
+    bert_like_embedder.eval()
+    
+    tokens_list = [entry['tokens'][:6] for entry in conll2003_demo[:16]]
+    batch_ex = [bert_like_config.exemplify(tokens) for tokens in tokens_list]
+    expected = bert_like_embedder(**bert_like_config.batchify(batch_ex))
+    
+    # Emulate the `transformers` 4.x interface, which extends 3D masks by `get_extended_attention_mask`
+    def get_extended_attention_mask(attention_mask, input_shape=None, device=None):
+        assert attention_mask.dim() == 3
+        extended_attention_mask = attention_mask[:, None, :, :].float()
+        return (1.0 - extended_attention_mask) * -10000.0
+    
+    forward = bert_like_embedder.bert_like.forward
+    def forward_4x(input_ids=None, attention_mask=None, **kwargs):
+        if attention_mask.dim() == 3:
+            attention_mask = bert_like_embedder.bert_like.get_extended_attention_mask(attention_mask)
+        return forward(input_ids=input_ids, attention_mask=attention_mask, **kwargs)
+    
+    monkeypatch.setattr(bert_like_embedder.bert_like, 'get_extended_attention_mask', get_extended_attention_mask, raising=False)
+    monkeypatch.setattr(bert_like_embedder.bert_like, 'forward', forward_4x)
+    
+    bert_like_config.packing = True
+    packed_batch = bert_like_config.batchify(batch_ex)
+    assert packed_batch['sub_tok_ids'].size(0) < len(batch_ex)
+    packed_hidden = bert_like_embedder(**packed_batch)
+    mask = seq_lens2mask(torch.tensor([len(tokens) for tokens in tokens_list]))
+    assert torch.allclose(packed_hidden[~mask], expected[~mask], atol=1e-5)
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import pytest
+import pickle
+import torch
+
+from eznlp.model.embedding_cache import EmbeddingCache, _content_key
+
+
+@pytest.mark.parametrize("on_disk", [False, True])
+@pytest.mark.parametrize("dtype, atol", [('float32', 0), ('float16', 1e-2), ('bfloat16', 1e-1)])
+def test_embedding_cache(tmp_path, on_disk, dtype, atol):
+    cache_dir = str(tmp_path) if on_disk else None
+    cache = EmbeddingCache("demo", cache_dir=cache_dir, dtype=dtype)
+    outputs = [torch.randn(seq_len, 8) for seq_len in [5, 1, 3]]
+    keys = [_content_key({'sub_tok_ids': torch.arange(seq_len)}) for seq_len in [5, 1, 3]]
+    assert len(set(keys)) == 3
+    assert cache.get(keys[0]) is None
+    
+    cache.put_batch(keys[:2], outputs[:2])
+    cache.put_batch(keys, outputs)
+    assert len(cache) == 3
+    for key, x in zip(keys, outputs):
+        assert cache.get(key).dtype == getattr(torch, dtype)
+        assert torch.allclose(cache.get(key).float(), x, rtol=0, atol=atol)
+    
+    # The file cache is re-opened, while the outputs in RAM are dropped in pickling
+    cache_retr = pickle.loads(pickle.dumps(cache))
+    if on_disk:
+        assert len(cache_retr) == 3
+        assert all(torch.equal(cache_retr.get(key), cache.get(key)) for key in keys)
+        # Shared by another cache of the same identity
+        cache_retr.put_batch([_content_key({'tokenized_raw_text': ["a", "b"]})], [torch.randn(2, 8)])
+        assert len(EmbeddingCache("demo", cache_dir=cache_dir, dtype=dtype)) == 4
+    else:
+        assert len(cache_retr) == 0
+    
+    with pytest.raises(ValueError):
+        EmbeddingCache("demo", dtype='int8')
@@ -61,4 +61,50 @@ class TestNestedOneHotEmbedder(object):
         self.embedder = self.config.instantiate()
         self._assert_batch_consistency()
         
-        
\ No newline at end of file
+                
+        
+    def test_softlexicon_csr_consistency(self, ResumeNER_demo):
+        lexicon = ["".join(data_entry['tokens'].raw_text[s:e]) for data_entry in ResumeNER_demo for _, s, e in data_entry['chunks']]
+        tokenizer = LexiconTokenizer(lexicon)
+        for data_entry in ResumeNER_demo:
+            data_entry['tokens'].build_softlexicons(tokenizer.tokenize)
+        
+        self.config = SoftLexiconConfig(emb_dim=50)
+        self.config.build_vocab(ResumeNER_demo)
+        self.config.build_freqs(ResumeNER_demo, num_workers=2)
+        freqs = self.config.freqs
+        self.config.build_freqs(ResumeNER_demo)
+        assert self.config.freqs == freqs
+        
+        for data_entry in ResumeNER_demo[:10]:
+            tokens = data_entry['tokens']
+            example = self.config.exemplify(tokens)
+            
+            # The nested-list structure of the same features
+            tokens.softlexicon = tokens.softlexicon.tolist()
+            example_from_list = self.config.exemplify(tokens)
+            assert all((ids1 == ids2).all() for ids1, ids2 in zip(example['inner_ids'], example_from_list['inner_ids']))
+            assert all((freqs1 == freqs2).all() for freqs1, freqs2 in zip(example['inner_freqs'], example_from_list['inner_freqs']))
+            assert len(example['inner_ids']) == len(tokens) * self.config.num_channels
+        
+        
+    @pytest.mark.parametrize("csr", [True, False])
+    def test_softlexicon_precompute(self, ResumeNER_demo, csr):
+        lexicon = ["".join(data_entry['tokens'].raw_text[s:e]) for data_entry in ResumeNER_demo for _, s, e in data_entry['chunks']]
+        tokenizer = LexiconTokenizer(lexicon)
+        for data_entry in ResumeNER_demo:
+            data_entry['tokens'].build_softlexicons(tokenizer.tokenize)
+            if not csr:
+                data_entry['tokens'].softlexicon = data_entry['tokens'].softlexicon.tolist()
+        
+        self.config = SoftLexiconConfig(emb_dim=50)
+        self.config.build_vocab(ResumeNER_demo)
+        self.config.build_freqs(ResumeNER_demo)
+        
+        precomputed = self.config.precompute([data_entry['tokens'] for data_entry in ResumeNER_demo])
+        assert len(precomputed) == len(ResumeNER_demo)
+        for data_entry, example in zip(ResumeNER_demo, precomputed):
+            expected = self.config.exemplify(data_entry['tokens'])
+            for name in ['inner_ids', 'inner_freqs']:
+                assert len(example[name]) == len(expected[name])
+                assert all(torch.equal(x1, x2) for x1, x2 in zip(example[name], expected[name]))
@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
+import functools
+import random
 import pytest
 import torch
 
 from eznlp.token import Token
-from eznlp.dataset import Dataset
+from eznlp.io import ConllIO
+from eznlp.dataset import Dataset, StreamingDataset, BucketBatchSampler
 from eznlp.config import ConfigDict
-from eznlp.model import OneHotConfig, MultiHotConfig, ExtractorConfig
+from eznlp.model import OneHotConfig, MultiHotConfig, CharConfig, ExtractorConfig
+from eznlp.model.embedder import SparseFlatSequences
 
 
 def test_batch_to_cuda(conll2003_demo, device):
@@ -42,4 +46,264 @@ def test_batches(conll2003_demo, device):
     dataloader = torch.utils.data.DataLoader(dataset, batch_size=4, shuffle=True, collate_fn=dataset.collate)
     for batch in dataloader:
         batch.to(device)
-        
\ No newline at end of file
+        
+
+
+
+def test_precompute(conll2003_demo):
+    config = ExtractorConfig('sequence_tagging', 
+                             ohots=ConfigDict({f: OneHotConfig(field=f, emb_dim=20) for f in Token._basic_ohot_fields}), 
+                             mhots=ConfigDict({f: MultiHotConfig(field=f, emb_dim=20) for f in Token._basic_mhot_fields}), 
+                             nested_ohots=ConfigDict({'char': CharConfig()}))
+    train_set = Dataset(conll2003_demo[:6], config)
+    train_set.build_vocabs_and_dims(conll2003_demo[6:])
+    dev_set = Dataset(conll2003_demo[6:], config, training=False)
+    
+    for dataset in [train_set, dev_set]:
+        # The ids are precomputed lazily
+        assert dataset._precomputed is None
+        dataset[0]
+        assert set(dataset._precomputed.keys()) == {'ohots', 'mhots', 'nested_ohots'}
+        # The multi-hot features are stored sparsely
+        assert all(isinstance(values, SparseFlatSequences) for values in dataset._precomputed['mhots'].values())
+        for i, entry in enumerate(dataset.data):
+            example = dataset[i]
+            expected = config.exemplify(entry, training=dataset.training)
+            for name in ['ohots', 'mhots']:
+                assert all(torch.equal(example[name][f], expected[name][f]) for f in expected[name])
+            assert all(torch.equal(x1, x2) for x1, x2 in zip(example['nested_ohots']['char']['inner_ids'], expected['nested_ohots']['char']['inner_ids']))
+            assert len(example['nested_ohots']['char']['inner_ids']) == len(entry['tokens'])
+        
+        batch = dataset.collate([dataset[i] for i in range(4)])
+        assert batch.ohots['text'].size(0) == 4
+
+
+
+class OneHotConfigWithoutPrecompute(OneHotConfig):
+    @property
+    def precompute(self):
+        raise AttributeError("`precompute` is not implemented")
+
+
+def test_precompute_partially(conll2003_demo):
+    config = ExtractorConfig('sequence_tagging', 
+                             ohots=ConfigDict({'text': OneHotConfig(field='text', emb_dim=20), 
+                                               'en_pattern': OneHotConfigWithoutPrecompute(field='en_pattern', emb_dim=20)}))
+    dataset = Dataset(conll2003_demo, config)
+    dataset.build_vocabs_and_dims()
+    dataset.precompute()
+    assert set(dataset._precomputed['ohots'].keys()) == {'text'}
+    
+    for i, entry in enumerate(conll2003_demo):
+        example = dataset[i]
+        expected = config.exemplify(entry)
+        assert all(torch.equal(example['ohots'][f], expected['ohots'][f]) for f in ['text', 'en_pattern'])
+
+
+
+class ReversedDataset(Dataset):
+    def _get_entry(self, i):
+        return len(self.data)-1-i, self.data[len(self.data)-1-i]
+
+
+def test_precompute_with_remapped_indexes(conll2003_demo):
+    config = ExtractorConfig('sequence_tagging', 
+                             ohots=ConfigDict({f: OneHotConfig(field=f, emb_dim=20) for f in ['text', 'en_pattern']}), 
+                             nested_ohots=ConfigDict({'char': CharConfig()}))
+    dataset = ReversedDataset(conll2003_demo, config)
+    dataset.build_vocabs_and_dims()
+    dataset.precompute()
+    assert dataset._precomputed is not None
+    
+    # The precomputed parts are indexed by the remapped entry
+    for i in range(len(dataset)):
+        example = dataset[i]
+        expected = config.exemplify(conll2003_demo[len(conll2003_demo)-1-i])
+        assert example['tokenized_text'] == conll2003_demo[len(conll2003_demo)-1-i]['tokens'].text
+        assert all(torch.equal(example['ohots'][f], expected['ohots'][f]) for f in expected['ohots'])
+        assert all(torch.equal(x1, x2) for x1, x2 in zip(example['nested_ohots']['char']['inner_ids'], expected['nested_ohots']['char']['inner_ids']))
+
+
+
+def _assert_examples_equal(example, expected):
+    assert example['tokenized_text'] == expected['tokenized_text']
+    assert all(torch.equal(example['ohots'][f], expected['ohots'][f]) for f in expected['ohots'])
+    assert all(torch.equal(x1, x2) for x1, x2 in zip(example['nested_ohots']['char']['inner_ids'], expected['nested_ohots']['char']['inner_ids']))
+    assert torch.equal(example['tags_obj'].tag_ids, expected['tags_obj'].tag_ids)
+
+
+@pytest.mark.parametrize("num_workers", [None, 0, 2])
+def test_exemplify_cache(conll2003_demo, num_workers):
+    config = ExtractorConfig('sequence_tagging', 
+                             ohots=ConfigDict({f: OneHotConfig(field=f, emb_dim=20) for f in ['text', 'en_pattern']}), 
+                             nested_ohots=ConfigDict({'char': CharConfig()}))
+    train_set = Dataset(conll2003_demo, config)
+    train_set.build_vocabs_and_dims()
+    with pytest.raises(ValueError):
+        Dataset(conll2003_demo, config, max_cache_bytes=2**20)
+    
+    dev_set = Dataset(conll2003_demo, config, training=False, max_cache_bytes=2**20)
+    uncached_set = Dataset(conll2003_demo, config, training=False)
+    if num_workers is not None:
+        dev_set.build_cache(num_workers=num_workers, shard_size=3)
+        assert len(dev_set._cache) == len(dev_set)
+    
+    for _ in range(2):
+        for i in range(len(dev_set)):
+            _assert_examples_equal(dev_set[i], uncached_set[i])
+    assert len(dev_set._cache) == len(dev_set)
+    assert dev_set[0] is dev_set[0]
+    
+    # The cache is invalidated once the config changes
+    example = dev_set[0]
+    config.ohots['text'].vocab = None
+    train_set.build_vocabs_and_dims()
+    assert dev_set[0] is not example
+    assert len(dev_set._cache) == 1
+    _assert_examples_equal(dev_set[0], uncached_set[0])
+
+
+def test_config_version(conll2003_demo, monkeypatch):
+    config = ExtractorConfig('sequence_tagging', ohots=ConfigDict({'text': OneHotConfig(field='text', emb_dim=20)}))
+    dataset = Dataset(conll2003_demo, config, training=False, max_cache_bytes=2**20)
+    dataset.build_vocabs_and_dims()
+    version = config.version
+    example = dataset[0]
+    
+    # Changes of other configs neither invalidate the cache, nor does checking an unchanged config walk it
+    OneHotConfig(field='text', emb_dim=20)
+    assert dataset[0] is example
+    monkeypatch.setattr(ExtractorConfig, 'version', property(lambda self: pytest.fail("Config walked")))
+    assert dataset[0] is example
+    monkeypatch.undo()
+    
+    # Nested changes, including the replacement of sub-configs
+    config.ohots['text'].min_freq = 2
+    assert config.version > version
+    config.ohots['text'].build_vocab(conll2003_demo)
+    assert dataset[0] is not example
+    
+    version = config.version
+    config.ohots['text'] = OneHotConfig(field='text', emb_dim=20, vocab=config.ohots['text'].vocab)
+    assert config.version > version
+    
+    # The precomputed parts are re-built on the next access
+    precomputed = dataset._precomputed
+    assert precomputed is not None
+    config.ohots['text'].build_vocab(conll2003_demo[:5])
+    expected = config.exemplify(conll2003_demo[-1])
+    assert torch.equal(dataset[len(dataset)-1]['ohots']['text'], expected['ohots']['text'])
+    assert dataset._precomputed is not precomputed
+
+
+def test_exemplify_cache_eviction(conll2003_demo):
+    config = ExtractorConfig('sequence_tagging', ohots=ConfigDict({'text': OneHotConfig(field='text', emb_dim=20)}))
+    Dataset(conll2003_demo, config).build_vocabs_and_dims()
+    
+    dev_set = Dataset(conll2003_demo, config, training=False, max_cache_bytes=2**30)
+    dev_set.build_cache()
+    nbytes = [nb for _, nb in dev_set._cache.values()]
+    
+    budget = sum(nbytes[-3:])
+    dev_set = Dataset(conll2003_demo, config, training=False, max_cache_bytes=budget)
+    for i in range(len(dev_set)):
+        dev_set[i]
+        assert dev_set._cache_bytes <= budget
+    assert list(dev_set._cache.keys()) == list(range(len(dev_set)-3, len(dev_set)))
+    
+    # Hits are moved to the most recently used end
+    dev_set[len(dev_set)-3]
+    dev_set[0]
+    assert list(dev_set._cache.keys())[-2:] == [len(dev_set)-3, 0]
+    assert len(dev_set)-2 not in dev_set._cache
+
+
+
+@pytest.mark.parametrize("batch_size, max_tokens, quadratic", [(8, None, False), (None, 200, False), (None, 2000, True), (8, 200, False)])
+def test_bucket_batch_sampler(batch_size, max_tokens, quadratic):
+    rng = random.Random(0)
+    seq_lens = [rng.randint(1, 40) for _ in range(1000)]
+    cost = (lambda L: L**2) if quadratic else (lambda L: L)
+    sampler = BucketBatchSampler(seq_lens, batch_size=batch_size, max_tokens=max_tokens, quadratic=quadratic, pool_size=200, seed=0)
+    
+    epoch1 = list(sampler)
+    assert sorted(idx for batch in epoch1 for idx in batch) == list(range(len(seq_lens)))
+    for batch in epoch1:
+        assert batch_size is None or len(batch) <= batch_size
+        assert max_tokens is None or len(batch) == 1 or len(batch) * max(cost(seq_lens[idx]) for idx in batch) <= max_tokens
+    
+    # Randomized over epochs, but reproducible with the same seed
+    assert len(sampler) == len(sampler.batches)
+    epoch2 = list(sampler)
+    assert epoch1 != epoch2
+    assert list(BucketBatchSampler(seq_lens, batch_size=batch_size, max_tokens=max_tokens, quadratic=quadratic, pool_size=200, seed=0)) == epoch1
+    
+    # Much less padding than random batches of the same sizes
+    indexes = list(range(len(seq_lens)))
+    rng.shuffle(indexes)
+    random_batches, start = [], 0
+    for batch in epoch1:
+        random_batches.append(indexes[start:start+len(batch)])
+        start += len(batch)
+    assert sampler.padding_efficiency(epoch1) > 0.9
+    assert sampler.padding_efficiency(random_batches) < 0.8
+    
+    sampler = BucketBatchSampler(seq_lens, batch_size=batch_size, max_tokens=max_tokens, quadratic=quadratic, shuffle=False)
+    assert list(sampler) == list(sampler)
+
+
+def test_bucket_batch_sampler_with_loader(conll2003_demo):
+    dataset = Dataset(conll2003_demo, ExtractorConfig('sequence_tagging'))
+    dataset.build_vocabs_and_dims()
+    sampler = BucketBatchSampler([len(entry['tokens']) for entry in conll2003_demo], max_tokens=100)
+    dataloader = torch.utils.data.DataLoader(dataset, batch_sampler=sampler, collate_fn=dataset.collate)
+    
+    num_seqs = 0
+    for batch in dataloader:
+        assert batch.seq_lens.size(0) * batch.seq_lens.max().item() <= 100 or batch.seq_lens.size(0) == 1
+        num_seqs += batch.seq_lens.size(0)
+    assert num_seqs == len(conll2003_demo)
+
+
+
+@pytest.mark.parametrize("buffer_size", [1, 10, 100000])
+def test_streaming_dataset(buffer_size):
+    io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1')
+    data = io.read("data/conll2003/demo.eng.train")
+    config = ExtractorConfig('sequence_tagging')
+    dataset = Dataset(data, config)
+    dataset.build_vocabs_and_dims()
+    
+    stream_config = ExtractorConfig('sequence_tagging')
+    stream_dataset = StreamingDataset(functools.partial(io.iter_read, "data/conll2003/demo.eng.train"), stream_config, buffer_size=buffer_size, seed=0)
+    stream_dataset.build_vocabs_and_dims()
+    assert stream_config.ohots['text'].vocab.itos == config.ohots['text'].vocab.itos
+    assert stream_config.decoder.idx2tag == config.decoder.idx2tag
+    assert stream_dataset.summary.split("\n") == dataset.summary.split("\n")[:3]
+    
+    # Every entry is yielded exactly once per epoch; the order varies over epochs unless the buffer holds a single entry
+    epoch1 = [tuple(ex['tokenized_text']) for ex in stream_dataset]
+    epoch2 = [tuple(ex['tokenized_text']) for ex in stream_dataset]
+    expected = [tuple(entry['tokens'].text) for entry in data]
+    assert sorted(epoch1) == sorted(epoch2) == sorted(expected)
+    assert (epoch1 == expected) == (buffer_size == 1)
+    assert (epoch1 == epoch2) == (buffer_size == 1)
+    
+    dataloader = torch.utils.data.DataLoader(stream_dataset, batch_size=4, collate_fn=stream_dataset.collate)
+    num_seqs = 0
+    for batch in dataloader:
+        assert batch.ohots['text'].size(0) == batch.seq_lens.size(0)
+        num_seqs += batch.seq_lens.size(0)
+    assert num_seqs == len(data)
+
+
+
+def test_streaming_dataset_multi_workers():
+    io = ConllIO(text_col_id=0, tag_col_id=3, scheme='BIO1')
+    data = io.read("data/conll2003/demo.eng.train")
+    stream_dataset = StreamingDataset(functools.partial(io.iter_read, "data/conll2003/demo.eng.train"), ExtractorConfig('sequence_tagging'), training=False)
+    stream_dataset.build_vocabs_and_dims()
+    
+    dataloader = torch.utils.data.DataLoader(stream_dataset, batch_size=4, num_workers=2, collate_fn=stream_dataset.collate)
+    tokenized_text = [tuple(text) for batch in dataloader for text in batch.tokenized_text]
+    assert sorted(tokenized_text) == sorted(tuple(entry['tokens'].text) for entry in data)
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 import pytest
 import pickle
+import tracemalloc
+import numpy
 
 from eznlp.token import Full2Half
 from eznlp.token import zh_punct_re, zh_char_re
-from eznlp.token import Token, TokenSequence, LexiconTokenizer
+from eznlp.token import Token, TokenSequence, ColumnarTokenSequence, LexiconTokenizer, _StringColumn
+from eznlp.token import TokenFeatureEngine, token_feature_engine
 
 
 def test_full2half():
@@ -181,6 +184,40 @@ class TestToken(object):
 
 
 
+class TestTokenFeatureEngine(object):
+    def test_consistency(self):
+        engine = TokenFeatureEngine(maxsize=16)
+        for raw_text in ["Jack", "-3.14", "ＷＡＴＥＲ", "is_1!!_IRR_demo", "0是another@DEMO's"] * 3:
+            tok = Token(raw_text, case_mode='Lower', number_mode='Marks')
+            assert engine.normalize(raw_text, 'Lower', 'Marks', True) == tok.text
+            assert engine.num_mark(raw_text) == tok.num_mark
+            assert engine.en_pattern(raw_text) == tok.en_pattern
+            assert engine.en_pattern_sum(raw_text) == tok.en_pattern_sum
+            assert (engine.en_shape_features(raw_text) == tok.en_shape_features).all()
+        
+        cache_info = engine.cache_info()
+        assert cache_info['normalize'].misses == 5
+        assert cache_info['normalize'].hits == 10
+        assert cache_info['en_shape_features'].currsize == 5
+        
+        engine.cache_clear()
+        assert engine.cache_info()['normalize'].currsize == 0
+        
+        
+    def test_bounded_cache(self):
+        engine = TokenFeatureEngine(maxsize=4)
+        for k in range(100):
+            engine.en_pattern(f"Word{k}")
+        assert engine.cache_info()['en_pattern'].currsize == 4
+        
+        
+    def test_shared_features(self):
+        tokens = TokenSequence.from_tokenized_text("The cat and the CAT .".split())
+        assert tokens[1].en_shape_features is token_feature_engine.en_shape_features("cat")
+        assert not tokens[1].en_shape_features.flags.writeable
+
+
+
 class TestTokenSequence(object):
     def test_text(self):
         token_list = [Token(tok, case_mode='Lower', number_mode='Marks') for tok in "This is a -3.14 demo .".split()]
@@ -201,6 +238,58 @@ class TestTokenSequence(object):
         assert tokens.trigram == ["this is a", "is a <-real1>", "a <-real1> demo", "<-real1> demo .", "demo . <pad>", ". <pad> <pad>"]
         
         
+    def test_pickle(self):
+        tokens = TokenSequence.from_tokenized_text("This is a -3.14 demo .".split(), additional_tags={'pos_tag': ['DT', 'VBZ', 'DT', 'CD', 'NN', '.']}, 
+                                                   case_mode='Lower', number_mode='Marks')
+        tokens_retr = pickle.loads(pickle.dumps(tokens))
+        assert tokens_retr == tokens
+        assert tokens_retr.pos_tag == tokens.pos_tag
+        assert all(isinstance(tok, Token) for tok in tokens_retr.token_list)
+        
+        # Tokens with different attributes
+        tokens.token_list[0].extra = 'extra'
+        tokens_retr = pickle.loads(pickle.dumps(tokens))
+        assert tokens_retr == tokens
+        assert tokens_retr.token_list[0].extra == 'extra'
+        
+        
+    @pytest.mark.parametrize("raw_texts, tokenize_callback, token_sep", 
+                             [(["This is a -3.14 demo .", "This demo is NOT a demo .", ""], None, " "), 
+                              (["李明住在中山西路。", "李明住在ＡＢＣ路１２号。", ""], "char", ""), 
+                              (["This is a -3.14 demo .", "This demo is NOT a demo ."], "space_only", " ")])
+    def test_from_raw_texts(self, raw_texts, tokenize_callback, token_sep):
+        tokens_list = TokenSequence.from_raw_texts(raw_texts, tokenize_callback, token_sep=token_sep, case_mode='Lower', number_mode='Marks')
+        expected_tokens_list = [TokenSequence.from_raw_text(raw_text, tokenize_callback, token_sep=token_sep, case_mode='Lower', number_mode='Marks') for raw_text in raw_texts]
+        
+        assert tokens_list == expected_tokens_list
+        for tokens, expected_tokens in zip(tokens_list, expected_tokens_list):
+            assert tokens.token_attr_names == expected_tokens.token_attr_names
+            for field in tokens.token_attr_names:
+                assert getattr(tokens, field) == getattr(expected_tokens, field)
+        
+        
+    def test_softwords(self):
+        tokenizer = LexiconTokenizer(["李明", "中山", "中山西路", "山西", "山西路", "西路", "住"])
+        tokens = TokenSequence.from_tokenized_text(list("李明住在中山西路。"), token_sep="")
+        tokens.build_softwords(tokenizer.tokenize)
+        tokens.build_softlexicons(tokenizer.tokenize)
+        
+        # Columns: B, M, E, S
+        assert tokens.softword.shape == (9, 4)
+        assert tokens.softword.tolist() == [[True, False, False, False], 
+                                            [False, False, True, False], 
+                                            [False, False, False, True], 
+                                            [False, False, False, False], 
+                                            [True, False, False, False], 
+                                            [True, True, True, False], 
+                                            [True, True, True, False], 
+                                            [False, False, True, False], 
+                                            [False, False, False, False]]
+        assert tokens.softlexicon[5] == [["山西", "山西路"], ["中山西路"], ["中山"], ["<none>"]]
+        assert tokens.softlexicon[8] == [["<none>"]] * 4
+        assert len(tokens.softlexicon.words) == tokens.softlexicon.offsets[-1]
+        
+        
     @pytest.mark.parametrize("text, softlexicon", 
                              [("李明住在中山西路。",
                                [[["李明"], ["<none>"], ["<none>"], ["李"]], 
@@ -247,6 +336,113 @@ class TestTokenSequence(object):
 
 
 
+class TestColumnarTokenSequence(object):
+    @pytest.mark.parametrize("raw_text, tokenize_callback, token_sep", 
+                             [("This is a -3.14 demo .", None, " "), 
+                              ("李明住在中山西路。", "char", "")])
+    def test_consistency(self, raw_text, tokenize_callback, token_sep):
+        tokens = TokenSequence.from_raw_text(raw_text, tokenize_callback, token_sep=token_sep, case_mode='Lower', number_mode='Marks')
+        c_tokens = ColumnarTokenSequence.from_raw_text(raw_text, tokenize_callback, token_sep=token_sep, case_mode='Lower', number_mode='Marks')
+        
+        assert c_tokens == tokens
+        assert c_tokens.token_attr_names == tokens.token_attr_names
+        for field in c_tokens.token_attr_names + Token._basic_ohot_fields:
+            assert getattr(c_tokens, field) == getattr(tokens, field)
+        assert (numpy.array(c_tokens.en_shape_features) == numpy.array(tokens.en_shape_features)).all()
+        assert c_tokens.bigram == tokens.bigram
+        assert c_tokens.trigram == tokens.trigram
+        
+        assert c_tokens[2] == tokens[2]
+        assert c_tokens[-1] == tokens[-1]
+        assert c_tokens[1:4] == tokens[1:4]
+        assert c_tokens[::2] == tokens[::2]
+        assert c_tokens[:3] + c_tokens[3:] == tokens
+        assert c_tokens[:3] + tokens[3:] == tokens
+        
+        
+    def test_attach_and_assign(self):
+        c_tokens = ColumnarTokenSequence.from_tokenized_text("This is a demo .".split(), additional_tags={'pos_tag': ['DT', 'VBZ', 'DT', 'NN', '.']})
+        assert c_tokens.pos_tag == ['DT', 'VBZ', 'DT', 'NN', '.']
+        assert c_tokens[3].pos_tag == 'NN'
+        
+        c_tokens[3].pos_tag = 'NNP'
+        assert c_tokens.pos_tag == ['DT', 'VBZ', 'DT', 'NNP', '.']
+        
+        with pytest.raises(AttributeError):
+            c_tokens.not_a_field
+        assert ColumnarTokenSequence.from_tokenized_text([]).not_a_field == []
+        
+        
+    def test_per_token_writes(self):
+        tokenized_text = "This is a -3.14 Demo sentence , with 12 tokens .".split() * 500
+        c_tokens = ColumnarTokenSequence.from_tokenized_text(tokenized_text, additional_tags={'idx': list(range(len(tokenized_text)))})
+        tokens = TokenSequence.from_tokenized_text(tokenized_text, additional_tags={'idx': list(range(len(tokenized_text)))})
+        
+        for seq in [c_tokens, tokens]:
+            for i, tok in enumerate(seq):
+                tok.idx = -i
+                tok.text = tok.text.upper()
+                tok.new_field = i % 3
+            seq[0].raw_text = "That"
+        
+        # The columns are updated in place, rather than rebuilt on each write
+        columns = dict(c_tokens._columns)
+        c_tokens[1].text = "IS"
+        c_tokens[1].new_field = [1]
+        assert all(c_tokens._columns[name] is column for name, column in columns.items())
+        tokens[1].new_field = [1]
+        
+        for name in ['raw_text', 'text', 'idx', 'new_field']:
+            assert getattr(c_tokens, name) == getattr(tokens, name)
+        assert c_tokens.raw_text[0] == "That" and c_tokens.text[0] == "THIS"
+        
+        # Compactly re-encoded on pickling
+        c_tokens_loaded = pickle.loads(pickle.dumps(c_tokens))
+        assert isinstance(c_tokens._columns['idx'], numpy.ndarray)
+        assert isinstance(c_tokens._columns['text'], _StringColumn)
+        for name in ['raw_text', 'text', 'idx', 'new_field']:
+            assert getattr(c_tokens_loaded, name) == getattr(tokens, name)
+        
+        
+    def test_softwords(self):
+        tokenizer = LexiconTokenizer(["李明", "中山", "中山西路", "山西", "山西路", "西路"])
+        tokens = TokenSequence.from_raw_text("李明住在中山西路。", "char", token_sep="")
+        c_tokens = ColumnarTokenSequence.from_raw_text("李明住在中山西路。", "char", token_sep="")
+        tokens.build_softwords(tokenizer.tokenize)
+        c_tokens.build_softwords(tokenizer.tokenize)
+        tokens.build_softlexicons(tokenizer.tokenize)
+        c_tokens.build_softlexicons(tokenizer.tokenize)
+        
+        assert (numpy.array(c_tokens.softword) == numpy.array(tokens.softword)).all()
+        assert c_tokens.softlexicon == tokens.softlexicon
+        
+        
+    def test_serialization(self):
+        c_tokens = ColumnarTokenSequence.from_tokenized_text("This is a -3.14 demo .".split(), case_mode='Lower', number_mode='Marks')
+        c_tokens_loaded = pickle.loads(pickle.dumps(c_tokens))
+        assert c_tokens_loaded == c_tokens
+        assert pickle.loads(pickle.dumps(c_tokens[3])) == c_tokens[3]
+        
+        
+    @pytest.mark.slow
+    def test_memory(self):
+        raw_text = " ".join(["This is a -3.14 Demo sentence , with 12 tokens ."] * 20)
+        
+        tracemalloc.start()
+        data = [TokenSequence.from_raw_text(raw_text, case_mode='Lower', number_mode='Marks') for _ in range(500)]
+        mem_list = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        
+        tracemalloc.start()
+        c_data = [ColumnarTokenSequence.from_raw_text(raw_text, case_mode='Lower', number_mode='Marks') for _ in range(500)]
+        mem_columnar = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        
+        assert c_data[0] == data[0]
+        assert mem_columnar < mem_list / 2
+
+
+
 class TestLexiconTokenizer(object):
     @pytest.mark.parametrize("lexicon, text", 
                              [(["李明", "中山", "中山西路", "山西", "山西路", "西路"], "李明住在中山西路。"), 
@@ -259,3 +455,54 @@ class TestLexiconTokenizer(object):
             assert text[start:end] == w
         
         assert set(lexicon) == set([w for w, *_ in tokenized])
+        
+        
+    @pytest.mark.parametrize("return_singleton", [False, True])
+    @pytest.mark.parametrize("max_len", [2, 10])
+    def test_against_brute_force(self, return_singleton, max_len):
+        lexicon = ["李明", "中山", "中山西路", "山西", "山西路", "西路", "北京", "天安门", "北京天安门", "门", "我爱北京天安门！"]
+        texts = ["李明住在中山西路。", "我爱北京天安门！", "", "北"]
+        tokenizer = LexiconTokenizer(lexicon, max_len=max_len, return_singleton=return_singleton)
+        
+        for text, tokenized_many in zip(texts, tokenizer.tokenize_many(texts)):
+            expected = [(text[start:end], start, end) for start in range(len(text)) for end in range(start+1, min(start+max_len, len(text))+1) 
+                            if (return_singleton and end-start==1) or (text[start:end] in lexicon)]
+            assert list(tokenizer.tokenize(text)) == expected
+            assert tokenized_many == expected
+        
+        
+    def test_tokenize_many(self):
+        tokenizer = LexiconTokenizer(["李明", "中山", "中山西路", "山西", "山西路", "西路", "北京", "天安门"])
+        texts = ["李明住在中山西路。", "我爱北京天安门！"] * 50
+        assert tokenizer._trie is None
+        tokenized_many = tokenizer.tokenize_many(texts)
+        trie = tokenizer._trie
+        assert trie is not None
+        assert tokenized_many == [list(tokenizer.tokenize(text)) for text in texts]
+        # The trie is built once and reused
+        assert tokenizer._trie is trie
+        assert tokenizer.tokenize_many([]) == []
+        
+        
+    def test_lexicon_changes(self):
+        tokenizer = LexiconTokenizer(["中山", "西路"])
+        assert [w for w, *_ in tokenizer.tokenize("中山西路")] == ["中山", "西路"]
+        
+        # The trie is rebuilt explicitly after in-place modifications, and cleared on replacements
+        tokenizer.lexicon.add("中山西路")
+        tokenizer.lexicon.discard("西路")
+        tokenizer.rebuild()
+        assert [w for w, *_ in tokenizer.tokenize("中山西路")] == ["中山", "中山西路"]
+        tokenizer.lexicon = {"山西"}
+        assert [w for w, *_ in tokenizer.tokenize("中山西路")] == ["山西"]
+        tokenizer.max_len = 1
+        assert list(tokenizer.tokenize("中山西路")) == []
+        
+        # Tokenizers pickled without the trie (e.g., by early versions)
+        tokenizer = LexiconTokenizer(["中山", "西路"])
+        tokenizer_retr = pickle.loads(pickle.dumps(tokenizer))
+        assert tokenizer_retr._trie is None
+        assert list(tokenizer_retr.tokenize("中山西路")) == list(tokenizer.tokenize("中山西路"))
+        legacy = LexiconTokenizer.__new__(LexiconTokenizer)
+        legacy.__setstate__(dict(lexicon={"中山", "西路"}, max_len=10, return_singleton=False))
+        assert list(legacy.tokenize("中山西路")) == list(tokenizer.tokenize("中山西路"))
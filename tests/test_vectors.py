@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+import pytest
+import os
+import pickle
+import torch
+
+from eznlp.vectors import Vectors, IndexedVocab, _load_from_file
+from eznlp.nn.init import reinit_embedding_by_pretrained_
+
+
+@pytest.fixture
+def vectors_path(tmp_path):
+    itos = ["the", "The", "中国", "é", "", "dup", "dup", "UNK"]
+    vectors = torch.arange(len(itos)*4, dtype=torch.float).view(len(itos), 4)
+    path = f"{tmp_path}/demo.vec"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"{len(itos)} 4\n")
+        for w, vec in zip(itos, vectors.tolist()):
+            f.write(" ".join([w] + [str(v) for v in vec]) + "\n")
+    return path, itos, vectors
+
+
+
+class TestIndexedVocab(object):
+    def test_indexed_vocab(self, tmp_path):
+        itos = ["the", "The", "中国", "é", "", "dup", "dup", "UNK"]
+        IndexedVocab.build(itos, tmp_path)
+        vocab = IndexedVocab(tmp_path)
+        stoi = {w: i for i, w in enumerate(itos)}
+        
+        assert len(vocab) == len(itos)
+        assert list(vocab) == itos
+        assert [vocab[i] for i in range(len(itos))] == itos
+        assert vocab[-1] == itos[-1]
+        assert all(vocab.get(w) == stoi[w] for w in itos)
+        assert "dup" in vocab
+        assert "the " not in vocab
+        assert vocab.get("THE") is None
+        assert vocab.get("THE", -1) == -1
+        with pytest.raises(IndexError):
+            vocab[len(itos)]
+            
+        vocab_retr = pickle.loads(pickle.dumps(vocab))
+        assert list(vocab_retr) == itos
+
+
+
+class TestVectors(object):
+    def test_load(self, vectors_path):
+        path, itos, expected_vectors = vectors_path
+        vectors = Vectors.load(path, encoding='utf-8', skiprows=0)
+        assert os.path.exists(f"{path}.cache/meta.json")
+        assert isinstance(vectors.itos, IndexedVocab)
+        assert list(vectors.itos) == itos
+        assert (vectors.vectors == expected_vectors).all().item()
+        
+        # Loaded from the cache
+        vectors = Vectors.load(path)
+        assert vectors.voc_dim == len(itos)
+        assert vectors.emb_dim == 4
+        assert (vectors["中国"] == expected_vectors[2]).all().item()
+        assert (vectors["dup"] == expected_vectors[6]).all().item()
+        assert (vectors["absent"] == torch.zeros(4)).all().item()
+        assert (vectors.lookup("THE") == expected_vectors[0]).all().item()
+        assert (vectors.lookup("unk") == expected_vectors[7]).all().item()
+        assert vectors.lookup("absent") is None
+        
+        
+    @pytest.mark.parametrize("num_workers", [0, 2])
+    @pytest.mark.parametrize("chunk_bytes", [1, 32, 2**20])
+    def test_load_from_file(self, tmp_path, num_workers, chunk_bytes):
+        lines = ["2 3", "a 1 2 3", "b 4 5", "c 6 7 8 9", "", "d 1 x 3", "e 1  3", "f -1.5 25e-2 inf", "a 0 0 0 "]
+        path = f"{tmp_path}/demo.vec"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines))
+        
+        itos, vectors = _load_from_file(path, encoding='utf-8', skiprows=0, num_workers=num_workers, chunk_bytes=chunk_bytes)
+        assert itos == ["a", "f", "a"]
+        assert vectors.tolist() == [[1, 2, 3], [-1.5, 0.25, float('inf')], [0, 0, 0]]
+        assert vectors.dtype == torch.float32
+        
+        
+    def test_pickle(self, vectors_path):
+        path, itos, expected_vectors = vectors_path
+        vectors = Vectors.load(path, encoding='utf-8', skiprows=0)
+        vectors_retr = pickle.loads(pickle.dumps(vectors))
+        
+        # The memory-mapped matrix is re-opened rather than pickled
+        assert vectors.__getstate__()['vectors'] is None
+        assert list(vectors_retr.itos) == itos
+        assert (vectors_retr.vectors == expected_vectors).all().item()
+        assert (vectors_retr.lookup("the") == expected_vectors[0]).all().item()
+        
+        
+    @pytest.mark.parametrize("memory_mapped", [True, False])
+    def test_align(self, vectors_path, memory_mapped):
+        path, itos, expected_vectors = vectors_path
+        vectors = Vectors.load(path, encoding='utf-8', skiprows=0)
+        if not memory_mapped:
+            vectors = Vectors(list(vectors.itos), vectors.vectors.clone())
+        
+        words = ["the", "THE", "tHE", "中国", "", "dup", "Dup", "unk", "UNK", "absent", "é", "É"]
+        indexes, found = vectors.align(words)
+        assert found.tolist() == [vectors.lookup(w) is not None for w in words]
+        assert indexes[~found].tolist() == [-1] * (~found).sum().item()
+        for w, idx, w_found in zip(words, indexes.tolist(), found.tolist()):
+            if w_found:
+                assert (vectors.vectors[idx] == vectors.lookup(w)).all().item()
+        
+        
+    @pytest.mark.parametrize("dtype, atol", [('float32', 0), ('float16', 2e-2), ('bfloat16', 2e-1), ('int8', 2e-1)])
+    def test_storage_dtype(self, vectors_path, dtype, atol):
+        path, itos, expected_vectors = vectors_path
+        Vectors.load(path, encoding='utf-8', skiprows=0)
+        vectors = Vectors.load(path, dtype=dtype)
+        assert vectors.storage_dtype == dtype
+        assert vectors.vectors.dtype == getattr(torch, dtype)
+        assert (vectors.scales is not None) == (dtype == 'int8')
+        
+        assert vectors.get_rows(slice(None)).dtype == torch.float32
+        assert torch.allclose(vectors.get_rows(slice(None)), expected_vectors, rtol=0, atol=atol)
+        assert torch.allclose(vectors.lookup("中国"), expected_vectors[2], rtol=0, atol=atol)
+        
+        # In-memory conversion is consistent with the cache
+        vectors_mem = Vectors(itos, expected_vectors).astype(dtype)
+        assert torch.equal(vectors_mem.vectors, vectors.vectors)
+        vectors_mem = Vectors.load(path).astype(dtype)
+        assert torch.equal(pickle.loads(pickle.dumps(vectors_mem)).vectors, vectors.vectors)
+        
+        vectors_retr = pickle.loads(pickle.dumps(vectors))
+        assert vectors_retr.storage_dtype == dtype
+        assert torch.equal(vectors_retr.get_rows(slice(None)), vectors.get_rows(slice(None)))
+        
+        embedding = torch.nn.Embedding(3, 4)
+        reinit_embedding_by_pretrained_(embedding, ["the", "中国", "dup"], vectors)
+        assert embedding.weight.dtype == torch.float32
+        assert torch.equal(embedding.weight.data, vectors.get_rows([0, 2, 6]))
+        
+        
+    @pytest.mark.parametrize("oov_init", ['zeros', 'uniform'])
+    def test_reinit_embedding(self, vectors_path, oov_init):
+        path, itos, expected_vectors = vectors_path
+        vectors = Vectors.load(path, encoding='utf-8', skiprows=0)
+        
+        words = ["<unk>", "<pad>", "the", "THE", "中国", "dup", "absent"]
+        embedding = torch.nn.Embedding(len(words), 4, padding_idx=1)
+        oov = reinit_embedding_by_pretrained_(embedding, words, vectors, oov_init=oov_init)
+        assert oov == ["<unk>", "<pad>", "absent"]
+        for idx, w in enumerate(words):
+            if w not in oov:
+                assert (embedding.weight[idx] == vectors.lookup(w)).all().item()
+        assert (embedding.weight[1] == 0).all().item()
+        assert (embedding.weight[-1] == 0).all().item() == (oov_init == 'zeros')
+        
+        
+    def test_legacy_cache(self, vectors_path):
+        path, itos, expected_vectors = vectors_path
+        torch.save((itos, expected_vectors), f"{path}.pt")
+        os.remove(path)
+        
+        vectors = Vectors.load(path)
+        assert os.path.exists(f"{path}.cache/meta.json")
+        assert list(vectors.itos) == itos
+        assert (vectors.vectors == expected_vectors).all().item()
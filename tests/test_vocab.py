@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import pytest
+from collections import Counter
+import numpy
+
+from eznlp.vocab import Vocab, count_tokens
+
+
+class IndexedEntries(object):
+    def __init__(self, entries: list):
+        self.entries = entries
+        
+    def __len__(self):
+        return len(self.entries)
+        
+    def __getitem__(self, i: int):
+        return self.entries[i]
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+@pytest.mark.parametrize("shard_size", [1, 3, 100])
+def test_count_tokens(num_workers, shard_size):
+    partitions = [[{'tokens': list("abcab")}, {'tokens': list("dd")}, {'tokens': []}], 
+                  [], 
+                  (entry for entry in [{'tokens': list("aeeeeee")}]), 
+                  ({'tokens': list("ff")}, {'tokens': list("g")}), 
+                  IndexedEntries([{'tokens': list("hh")}, {'tokens': list("ih")}])]
+    counter, max_len = count_tokens(partitions, lambda entry: (entry['tokens'], len(entry['tokens'])), num_workers=num_workers, shard_size=shard_size)
+    assert counter == Counter("abcabddaeeeeeeffghhih")
+    assert list(counter.keys()) == list("abcdefghi")
+    assert max_len == 7
+    
+    counter, max_len = count_tokens([[], []], lambda entry: (entry['tokens'], len(entry['tokens'])), num_workers=num_workers)
+    assert counter == Counter()
+    assert max_len is None
+
+
+class TestVocab(object):
+    def test_vocab(self):
+        vocab = Vocab(Counter("aaabbc<pad>"), min_freq=2)
+        assert vocab.itos == ['<unk>', '<pad>', 'a', 'b']
+        assert vocab.lookup_indices(list("abcd")) == [2, 3, 0, 0]
+        assert vocab.lookup_indices(list("abcd")) == [vocab[x] for x in "abcd"]
+        
+        
+    def test_encode(self):
+        vocab = Vocab(Counter("aaabbc"))
+        sequences = [list("abc"), [], list("dcba"), list("a")]
+        ids, offsets = vocab.encode(sequences)
+        assert ids.dtype == numpy.int64
+        assert offsets.tolist() == [0, 3, 3, 7, 8]
+        for k, seq in enumerate(sequences):
+            assert ids[offsets[k]:offsets[k+1]].tolist() == vocab.lookup_indices(seq)
+        
+        vocab = Vocab(Counter("aaabbc"), specials=())
+        assert vocab.encode([list("ab")])[0].tolist() == [0, 1]
+        with pytest.raises(KeyError):
+            vocab.encode([list("abd")])
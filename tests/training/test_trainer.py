@@ -3,9 +3,10 @@ import pytest
 import random
 import torch
 
-from eznlp.dataset import Dataset
+from eznlp.dataset import Dataset, BucketBatchSampler
 from eznlp.model import EncoderConfig, SequenceTaggingDecoderConfig, ExtractorConfig
 from eznlp.training import Trainer
+import eznlp.training.trainer
 
 
 @pytest.mark.parametrize("use_amp", [False, True])
@@ -58,3 +59,35 @@ def test_gradient_accumulation(conll2003_demo, device):
     assert trainer1.num_steps / trainer1.num_grad_acc_steps == trainer2.num_steps / trainer2.num_grad_acc_steps
     assert all((p1 - p2).abs().max().item() < 1e-4 for p1, p2 in zip(model1.parameters(), model2.parameters()))
     assert all((p1 - pb).abs().max().item() > 1e-4 for p1, pb in zip(model1.parameters(), params_backup))
+
+
+
+def test_predict_with_batch_sampler(conll2003_demo, device):
+    config = ExtractorConfig('sequence_tagging')
+    dataset = Dataset(conll2003_demo, config, training=False)
+    dataset.build_vocabs_and_dims()
+    model = config.instantiate().to(device)
+    
+    trainer = Trainer(model, device=device)
+    sampler = BucketBatchSampler([len(entry['tokens']) for entry in conll2003_demo], batch_size=3, seed=0)
+    # Predictions are restored to the original order
+    assert trainer.predict(dataset, batch_sampler=sampler) == trainer.predict(dataset, batch_size=3)
+
+
+
+@pytest.mark.parametrize("quadratic", [False, True])
+def test_padding_efficiency_with_batch_sampler(quadratic, conll2003_demo, device, monkeypatch):
+    config = ExtractorConfig('sequence_tagging')
+    dataset = Dataset(conll2003_demo, config)
+    dataset.build_vocabs_and_dims()
+    model = config.instantiate().to(device)
+    
+    sampler = BucketBatchSampler([len(entry['tokens']) for entry in conll2003_demo], batch_size=4, quadratic=quadratic, pool_size=8, seed=0)
+    expected = sampler.padding_efficiency()
+    dataloader = torch.utils.data.DataLoader(dataset, batch_sampler=sampler, collate_fn=dataset.collate)
+    
+    padding_efficiencies = []
+    monkeypatch.setattr(eznlp.training.trainer, 'disp_running_info', lambda padding_efficiency=None, **kwargs: padding_efficiencies.append(padding_efficiency))
+    trainer = Trainer(model, optimizer=torch.optim.AdamW(model.parameters()), device=device)
+    trainer.train_steps(train_loader=dataloader, num_epochs=1)
+    assert padding_efficiencies[0] == pytest.approx(expected)
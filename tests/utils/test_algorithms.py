@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
+import random
 import pytest
 
-from eznlp.utils import find_ascending
+from eznlp.utils import find_ascending, assign_intervals_to_spans
 
 
 @pytest.mark.parametrize("v", [-500, -3, 0, 2, 2.5, 9, 1234.56])
@@ -14,3 +15,15 @@ def test_find_ascending(v):
     assert find == (v in list(range(N)))
     assert len(sequence) == N + 1
     assert all(sequence[i] <= sequence[i+1] for i in range(N))
+
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_assign_intervals_to_spans(seed):
+    rng = random.Random(seed)
+    spans = [(0, 0)] + [(k*10, k*10+10) for k in range(20)] + [(200, 215), (50, 120)]
+    intervals = [(start, start+rng.randint(0, 30)) for start in (rng.randint(0, 210) for _ in range(300))]
+    
+    span_interval_ids = assign_intervals_to_spans(intervals, spans)
+    for (span_start, span_end), curr_ids in zip(spans, span_interval_ids):
+        assert curr_ids == [i for i, (start, end) in enumerate(intervals) if span_start <= start and end <= span_end]
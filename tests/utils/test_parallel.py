@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from eznlp.utils import map_in_forked_workers
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_map_in_forked_workers(num_workers):
+    # The (unpicklable) local function and the data it refers to are inherited by the forked workers
+    data = list(range(100))
+    def sum_shard(bounds):
+        return sum(data[bounds[0]:bounds[1]])
+    
+    shards = [(start, start+7) for start in range(0, 100, 7)]
+    results = map_in_forked_workers(sum_shard, shards, num_workers=num_workers)
+    assert list(results) == [sum(data[s:e]) for s, e in shards]
+    assert list(map_in_forked_workers(sum_shard, [], num_workers=num_workers)) == []
+    
+    # Mapping while consuming another mapping
+    results = map_in_forked_workers(sum_shard, shards, num_workers=num_workers)
+    for (s, e), result in zip(shards, results):
+        assert result == sum(map_in_forked_workers(abs, data[s:e], num_workers=num_workers))